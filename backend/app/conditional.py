@@ -0,0 +1,87 @@
+# app/conditional.py
+import hashlib
+import uuid
+from typing import Optional
+
+from fastapi import Request, Response
+
+from .compression import choose_encoding, encoded_etag
+from .services.serialize import CachedBody
+
+# Clients must revalidate every time, but may reuse the cached body on 304.
+CACHE_CONTROL = "no-cache"
+_ENCODINGS = ("gzip", "br")
+# Store versions restart at 0 with the process; mixed into version-based
+# ETags so a validator from before a restart can never match after it.
+BOOT_ID = uuid.uuid4().hex
+
+
+def make_etag(*parts: object) -> str:
+    """Strong ETag from the given version components."""
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def version_etag(*parts: object) -> str:
+    """make_etag for validators built from in-memory versions (this process only)."""
+    return make_etag(BOOT_ID, *parts)
+
+
+def matched_etag(if_none_match: Optional[str], etag: str, encoding: Optional[str] = None) -> Optional[str]:
+    """
+    The validator the client holds for `etag` (identity or one of our
+    content-encoded variants), or None. When several match, the variant
+    for `encoding` (the one a 200 would carry now) wins.
+    """
+    if not if_none_match:
+        return None
+    preferred = encoded_etag(etag, encoding) if encoding else etag
+    if if_none_match.strip() == "*":
+        return preferred
+    accepted = {etag} | {encoded_etag(etag, enc) for enc in _ENCODINGS}
+    matches = []
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in accepted:
+            matches.append(candidate)
+    if not matches:
+        return None
+    return preferred if preferred in matches else matches[0]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check that also accepts our content-encoded variants of `etag`."""
+    return matched_etag(if_none_match, etag) is not None
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    Returns a 304 response when the client already holds `etag`. The 304
+    echoes the validator that matched (e.g. the -gzip variant the client got
+    with its compressed 200), so its cached entry stays consistent.
+    """
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    matched = matched_etag(request.headers.get("if-none-match"), etag, encoding)
+    if matched is not None:
+        return Response(
+            status_code=304,
+            headers={"ETag": matched, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"},
+        )
+    return None
+
+
+def set_validators(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def cached_response(request: Request, cached: CachedBody, etag: str) -> Response:
+    """Serve pre-encoded bytes, picking the compressed variant the client accepts."""
+    body, encoding = cached.encoded(choose_encoding(request.headers.get("accept-encoding", "")))
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = encoded_etag(etag, encoding)
+    return Response(content=body, media_type=cached.media_type, headers=headers)
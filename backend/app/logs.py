@@ -0,0 +1,52 @@
+# app/logs.py
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+# Application log records are only enqueued on the event loop; a listener
+# thread does the formatting and the (possibly slow) stdout writes.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_replaced: List[logging.Handler] = []
+
+
+def start_queued_logging(level: str = LOG_LEVEL) -> None:
+    """Routes the root logger through a QueueHandler; idempotent."""
+    global _listener, _queue_handler, _replaced
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    _replaced = list(root.handlers)
+    handlers = _replaced
+    if not handlers:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers = [stream]
+    for h in _replaced:
+        root.removeHandler(h)
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_queued_logging() -> None:
+    """Flushes pending records and restores the original handlers."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    for h in _replaced:
+        root.addHandler(h)
+    _listener = None
+    _queue_handler = None
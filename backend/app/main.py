@@ -2,18 +2,38 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from .routers.ai import router as ai_router
+from .routers.metrics import router as metrics_router
+from .routers.admin import router as admin_router
+from .logs import start_queued_logging, stop_queued_logging
+from .compression import CompressionMiddleware
 from .services.jobs import job_store
+from .services.scheduler import scheduler
+from .services.postprocess import postprocessor
+from .services.webhooks import webhook_dispatcher
+from .services.windows import rolling_stats
+from .services.diagnostics import loop_monitor
 from dotenv import load_dotenv
 
 load_dotenv() 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    start_queued_logging()
+    await loop_monitor.start()
     await job_store.start_reaper()
+    rolling_stats.attach(job_store)
+    await scheduler.start()
+    await webhook_dispatcher.start()
     try:
         yield
     finally:
+        await scheduler.stop()
+        await webhook_dispatcher.stop()
+        postprocessor.shutdown()
         await job_store.stop_reaper()
+        rolling_stats.detach()
+        await loop_monitor.stop()
+        stop_queued_logging()
 
 app = FastAPI(title="AI Frontend Chat Service", version="2.0.0", lifespan=lifespan)
 
@@ -23,6 +43,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed"],
 )
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(ai_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
@@ -0,0 +1,79 @@
+# app/routers/admin.py
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+
+from ..services.diagnostics import loop_monitor, profiler
+
+# Operator endpoints (profiling, loop health). Disabled unless ADMIN_TOKEN is
+# set; callers send it as "Authorization: Bearer <token>" or X-Admin-Token.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+router = APIRouter(prefix="/api/ai/admin", tags=["admin"])
+
+
+def _presented_token(request: Request) -> Optional[str]:
+    token = request.headers.get("x-admin-token")
+    if token:
+        return token.strip()
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip()
+    return None
+
+
+def is_admin(request: Request) -> bool:
+    token = _presented_token(request)
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        # don't advertise endpoints that are switched off
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin(request):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={"status": "unauthorized"},
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@router.post("/profile", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+async def start_profile(seconds: float = 30.0) -> dict:
+    """Samples every thread for `seconds` (capped at DIAG_PROFILE_MAX_SECONDS)."""
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail={"status": "invalid_seconds"})
+    if not profiler.start(seconds):
+        raise HTTPException(status_code=409, detail={"status": "already_running", **profiler.snapshot()})
+    return profiler.snapshot()
+
+
+@router.delete("/profile", dependencies=[Depends(require_admin)])
+async def stop_profile() -> dict:
+    profiler.stop()
+    return profiler.snapshot()
+
+
+@router.get("/profile", response_class=Response, dependencies=[Depends(require_admin)])
+async def download_profile() -> Response:
+    """Last finished run in collapsed-stack format (flamegraph.pl, speedscope)."""
+    if profiler.running:
+        raise HTTPException(status_code=409, detail={"status": "running", **profiler.snapshot()})
+    if profiler.result is None:
+        raise HTTPException(status_code=404, detail={"status": "no_profile"})
+    return Response(
+        profiler.result,
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "Content-Disposition": 'attachment; filename="profile.collapsed"',
+            "X-Profile-Samples": str(profiler.result_samples),
+        },
+    )
+
+
+@router.get("/loop", dependencies=[Depends(require_admin)])
+async def loop_health() -> dict:
+    return {"loop": loop_monitor.snapshot(), "profiler": profiler.snapshot()}
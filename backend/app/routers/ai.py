@@ -1,6 +1,7 @@
 # app/routers/ai.py
-from fastapi import APIRouter, HTTPException, status
-import asyncio, os
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio, hashlib, logging, os, time
 from datetime import datetime, timezone
 
 from ..schemas import (
@@ -11,42 +12,252 @@ from ..schemas import (
     JobResult,
     JobStatus,
     JobSummary,
-    JobListResponse,)
-from ..services.runner import run_generation_job
-from ..services.jobs import job_store
+    JobListResponse,
+    BatchRequest,
+    BatchAccepted,
+    BatchProgress,)
+from ..services.jobs import TERMINAL_STATUSES, IdempotencyConflict, job_store
+from ..services.cascade import model_ladder
+from ..services.scheduler import scheduler, DEFAULT_TENANT
+from ..services.ratelimit import rate_limiter
+from ..services.llm import estimate_job_tokens
+from ..services.runner import cancel_generation_job, finish_from_similar
+from ..services.similarity import similarity_cache
+from ..services.webhooks import check_callback_url, webhook_dispatcher
+from ..services.events import job_events
+from ..services.windows import rolling_stats
+from ..services.concurrency import ollama_limiter
+from ..services.batches import BATCH_MAX_ITEMS, batch_progress, batch_registry, plan_batch
+from ..conditional import cached_response, make_etag, not_modified, set_validators, version_etag
+from .admin import is_admin, require_admin
 
 router = APIRouter(prefix="/api/ai", tags=["ai"])
+logger = logging.getLogger(__name__)
 
 @router.get("/health", response_model=HealthResponse)
 async def health() -> HealthResponse:
     return HealthResponse(status="ok", service="ai-frontend-chat-service")
 
+def client_identity(request: Request) -> str:
+    """
+    Tenant key for rate limiting, fair scheduling and Idempotency-Key scope: a
+    hash of the bearer token, else the peer address. Nothing the caller can
+    pick freely (such as an X-Client-Id header) may take part, or a fresh value
+    per request would get a fresh bucket and someone else's share.
+    """
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer ") and auth[7:].strip():
+        return "token:" + hashlib.sha256(auth[7:].strip().encode()).hexdigest()[:16]
+    if request.client and request.client.host:
+        return "ip:" + request.client.host
+    return DEFAULT_TENANT
+
+def _idempotency_conflict(exc: IdempotencyConflict) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail={"status": "idempotency_conflict", "job_id": exc.job_id,
+                "reason": "Idempotency-Key was already used with a different request body."},
+    )
+
+def _replayed(job, response: Response) -> AcceptedJob:
+    response.headers["Idempotent-Replayed"] = "true"
+    return AcceptedJob(job_id=job.job_id, status=job.status, expires_at=job.expires_at)
+
 @router.post("/generate", response_model=AcceptedJob, status_code=status.HTTP_202_ACCEPTED)
-async def generate(req: GenerateRequest) -> AcceptedJob:
-    job = await job_store.create_job(req)
-    print(f"[router] /generate -> returning job_id={job.job_id}")
-    asyncio.create_task(run_generation_job(job.job_id, req))
+async def generate(req: GenerateRequest, request: Request, response: Response) -> AcceptedJob:
+    tenant = client_identity(request)
+    if req.callback_url:
+        reason = await check_callback_url(req.callback_url)
+        if reason:
+            raise HTTPException(status_code=400, detail={"status": "invalid_callback_url", "reason": reason})
+    # retried submissions with the same key get the original job back, nothing new runs
+    idempotency_key = request.headers.get("idempotency-key", "").strip()
+    if len(idempotency_key) > 255:
+        raise HTTPException(status_code=400, detail={"status": "invalid_idempotency_key"})
+    if idempotency_key:
+        try:
+            existing = await job_store.find_idempotent(tenant, idempotency_key, req)
+        except IdempotencyConflict as exc:
+            raise _idempotency_conflict(exc)
+        if existing is not None:
+            return _replayed(existing, response)
+    decision = await rate_limiter.check(tenant, sum(estimate_job_tokens(req.message, req.previous_html)))
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"status": "rate_limited", "reason": decision.reason, "retry_after": decision.retry_after_header},
+            headers={"Retry-After": decision.retry_after_header},
+        )
+    if idempotency_key:
+        try:
+            job, created = await job_store.create_or_get_job(req, tenant, idempotency_key)
+        except IdempotencyConflict as exc:
+            raise _idempotency_conflict(exc)
+        if not created:
+            return _replayed(job, response)
+    else:
+        job = await job_store.create_job(req, tenant=tenant)
+    logger.info("[router] /generate -> returning job_id=%s", job.job_id)
+    if request.headers.get("x-profile") == "1" and is_admin(request):
+        job.profile = True
+    if similarity_cache.enabled and similarity_cache.eligible(req):
+        hit = similarity_cache.lookup(req.message)
+        if hit is not None:
+            await finish_from_similar(job.job_id, hit)
+            return AcceptedJob(job_id=job.job_id, status=job.status, expires_at=job.expires_at)
+    scheduler.submit(job.job_id, req, tenant=tenant, deadline=job.deadline)
     return AcceptedJob(job_id=job.job_id, status=job.status, expires_at=job.expires_at)
 
-@router.get("/result/{job_id}", response_model=JobResult)
-async def get_result(job_id: str) -> JobResult:
+@router.post("/generate/batch", response_model=BatchAccepted, status_code=status.HTTP_202_ACCEPTED)
+async def generate_batch(batch: BatchRequest, request: Request) -> BatchAccepted:
+    """
+    One job per item (base request + item overrides). Items sharing a prompt
+    prefix are queued back to back; all of them count against the caller's
+    fair share like any other job.
+    """
+    tenant = client_identity(request)
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail={"status": "too_many_items", "max_items": BATCH_MAX_ITEMS})
+    if batch.base.callback_url:
+        reason = await check_callback_url(batch.base.callback_url)
+        if reason:
+            raise HTTPException(status_code=400, detail={"status": "invalid_callback_url", "reason": reason})
+    plan = plan_batch(batch.base, batch.items)
+    empty = [p.index for p in plan if not p.req.message.strip()]
+    if empty:
+        raise HTTPException(status_code=400, detail={"status": "empty_message", "items": sorted(empty)})
+    # every item is a job: it pays a request token and its full token estimate,
+    # so a batch is throttled exactly like the same number of single requests
+    planned_tokens = sum(p.tokens for p in plan)
+    too_large = rate_limiter.limits.exceeds_burst(len(plan), planned_tokens) if rate_limiter.limits.enabled else None
+    if too_large:
+        limit = rate_limiter.limits.burst if too_large == "rps" else rate_limiter.limits.token_burst
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"status": "batch_too_large", "reason": too_large, "limit": limit},
+        )
+    decision = await rate_limiter.check(tenant, planned_tokens, requests=len(plan))
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"status": "rate_limited", "reason": decision.reason, "retry_after": decision.retry_after_header},
+            headers={"Retry-After": decision.retry_after_header},
+        )
+    jobs = await job_store.create_jobs([p.req for p in plan], tenant=tenant)
+    for p, job in zip(plan, jobs):
+        scheduler.submit(job.job_id, p.req, tenant=tenant, deadline=job.deadline, cost=p.cost, order=p.order)
+    by_index = sorted(zip(plan, jobs), key=lambda pj: pj[0].index)
+    created = batch_registry.add(tenant, [job for _, job in by_index], groups=len({p.group for p in plan}))
+    logger.info("[router] /generate/batch -> batch_id=%s items=%d", created.batch_id, len(jobs))
+    return BatchAccepted(batch_id=created.batch_id, job_ids=created.job_ids, expires_at=created.expires_at)
+
+@router.get("/batch/{batch_id}", response_model=BatchProgress)
+async def get_batch(batch_id: str, request: Request, response: Response) -> BatchProgress:
+    """Aggregated progress of every item of a batch in one call."""
+    batch = batch_registry.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail={"batch_id": batch_id, "status": "not_found"})
+    jobs = await job_store.get_jobs(batch.job_ids)
+    now = time.monotonic()
+    for job in jobs:
+        if job is not None:
+            job.last_polled_at = now  # polling the batch keeps its items alive
+    etag = version_etag("batch", batch.batch_id, sum(job.version for job in jobs if job is not None))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_validators(response, etag)
+    return BatchProgress(**batch_progress(batch, jobs))
+
+async def _live_job(job_id: str):
     job = await job_store.get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail={"job_id": job_id, "status": "not_found"})
     now = datetime.now(timezone.utc)
     if job.expires_at <= now:
         raise HTTPException(status_code=404, detail={"job_id": job_id, "status": "not_found"})
+    job.last_polled_at = time.monotonic()  # someone still cares (GEN_ABANDON_AFTER_SECONDS)
+    return job
+
+@router.get("/result/{job_id}", response_model=JobResult)
+async def get_result(job_id: str, request: Request, response: Response, trace: bool = False) -> JobResult:
+    job = await _live_job(job_id)
+    etag = version_etag("result", job.job_id, job.version, len(job.trace.events) if trace else "-")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    if not trace and job.cached is not None and job.cached.version == job.version:
+        # terminal job: serve the bytes encoded when it finished
+        return cached_response(request, job.cached.json, etag)
+    set_validators(response, etag)
+    timeline = job.trace.to_dict() if trace else None
 
     if job.status == JobStatus.finished and job.error is None:
-        return JobResult(job_id=job.job_id, status=job.status, result=job.result)
-    if job.status == JobStatus.failed:
-        return JobResult(job_id=job.job_id, status=job.status, error=job.error)
-    return JobResult(job_id=job.job_id, status=job.status)
+        return JobResult(job_id=job.job_id, status=job.status, result=job.result, trace=timeline)
+    if job.status in (JobStatus.failed, JobStatus.cancelled):
+        return JobResult(job_id=job.job_id, status=job.status, error=job.error, trace=timeline)
+    return JobResult(job_id=job.job_id, status=job.status, trace=timeline)
+
+@router.get("/result/{job_id}/html", response_class=Response)
+async def get_result_html(job_id: str, request: Request, download: bool = False):
+    """Raw generated page as text/html (no JSON escaping), for previews and downloads."""
+    job = await _live_job(job_id)
+    cached = job.cached
+    if job.status != JobStatus.finished or cached is None or cached.html is None:
+        raise HTTPException(status_code=409, detail={"job_id": job_id, "status": job.status.value})
+    etag = version_etag("html", job.job_id, cached.version)
+    hit = not_modified(request, etag)
+    if hit:
+        return hit
+    resp = cached_response(request, cached.html, etag)
+    # model-written HTML/JS: never let it run with the API's origin
+    resp.headers["Content-Security-Policy"] = "sandbox allow-scripts"
+    resp.headers["X-Content-Type-Options"] = "nosniff"
+    if download:
+        resp.headers["Content-Disposition"] = f'attachment; filename="{job_id}.html"'
+    return resp
 
+@router.get("/result/{job_id}/trace")
+async def get_result_trace(job_id: str):
+    """Job timeline as Chrome trace-event JSON (load in chrome://tracing or Perfetto)."""
+    job = await _live_job(job_id)
+    return job.trace.to_chrome(job.job_id)
 
+@router.get("/result/{job_id}/profile", response_class=Response, dependencies=[Depends(require_admin)])
+async def get_result_profile(job_id: str):
+    """Collapsed stacks sampled while the job ran (submitted with X-Profile: 1)."""
+    job = await _live_job(job_id)
+    if not job.profile:
+        raise HTTPException(status_code=404, detail={"job_id": job_id, "status": "not_profiled"})
+    if job.profile_result is None:
+        raise HTTPException(status_code=409, detail={"job_id": job_id, "status": job.status.value})
+    prof = job.profile_result
+    return Response(
+        prof["collapsed"],
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "Content-Disposition": f'attachment; filename="{job_id}.collapsed"',
+            "X-Profile-Samples": str(prof["samples"]),
+            "X-Profile-Wall-Samples": str(prof["wall_samples"]),
+        },
+    )
+
+
+@router.delete("/jobs/{job_id}", response_model=JobResult)
+async def cancel_job(job_id: str) -> JobResult:
+    """Cancels a queued or running job and aborts its in-flight Ollama request."""
+    job = await _live_job(job_id)
+    if job.status in TERMINAL_STATUSES or await cancel_generation_job(job_id) is None:
+        raise HTTPException(status_code=409, detail={"job_id": job_id, "status": job.status.value})
+    return JobResult(job_id=job.job_id, status=job.status, error=job.error)
 
 @router.get("/jobs", response_model=JobListResponse)
-async def list_jobs(status: JobStatus | None = None, page: int = 1, size: int = 50) -> JobListResponse:
+async def list_jobs(request: Request, response: Response, status: JobStatus | None = None, page: int = 1, size: int = 50) -> JobListResponse:
+    etag = version_etag("jobs", job_store.version, status.value if status else "", page, size)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_validators(response, etag)
     items, total = await job_store.list_jobs(status=status, page=page, size=size)
     summaries = [
         JobSummary(
@@ -60,10 +271,46 @@ async def list_jobs(status: JobStatus | None = None, page: int = 1, size: int =
     has_more = (page * size) < total
     return JobListResponse(items=summaries, total=total, page=page, size=size, has_more=has_more)
 
+@router.get("/jobs/events")
+async def jobs_events():
+    """
+    Server-sent events for dashboards: a `snapshot` (counters + newest jobs),
+    then `job_created` / `job_updated` / `job_expired` and `stats` deltas.
+    """
+    sub = job_events.subscribe()
+    if sub is None:
+        raise HTTPException(status_code=503, detail={"status": "too_many_subscribers"}, headers={"Retry-After": "30"})
+    return StreamingResponse(
+        job_events.stream(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/jobs/stats")
-async def jobs_stats():
+async def jobs_stats(request: Request):
     """
     Returns both live counts and cumulative totals since process start.
     Useful for dashboards with persistent stats even after jobs expire.
+    Also reports per-tier statistics of the model cascade and per-tenant
+    queue depth / wait times of the scheduler and rate limiter rejections.
+    "windows" holds rates and latency percentiles over the last 1m/5m/15m/1h.
     """
-    return await job_store.stats_cumulative()
+    data = await job_store.stats_cumulative()
+    data["cascade"] = model_ladder.snapshot()
+    data["scheduler"] = scheduler.snapshot()
+    data["rate_limit"] = rate_limiter.snapshot()
+    data["similarity_cache"] = similarity_cache.snapshot()
+    data["idempotency_keys"] = job_store.idempotency_keys()
+    data["webhooks"] = webhook_dispatcher.snapshot()
+    data["events"] = job_events.snapshot()
+    data["windows"] = rolling_stats.snapshot()
+    data["ollama_limit"] = ollama_limiter.snapshot()
+    data["batches"] = batch_registry.snapshot()
+    body = JSONResponse(data)
+    # stats mix several sources, so the validator is a digest of the body itself
+    etag = make_etag("stats", body.body)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_validators(body, etag)
+    return body
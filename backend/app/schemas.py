@@ -21,6 +21,18 @@ class GenerateRequest(BaseModel):
         default=None,
         description="Optional free-form object for future constraints."
     )
+    pretty: bool = Field(
+        default=False,
+        description="Return the page as validated, skipping output minification (debugging)."
+    )
+    deadline_seconds: Optional[float] = Field(
+        default=None,
+        description="Optional end-to-end time budget; can only tighten the server's GEN_JOB_DEADLINE_SECONDS."
+    )
+    callback_url: Optional[str] = Field(
+        default=None,
+        description="Optional http(s) URL that receives a POST with the job result once it finishes, fails or is cancelled."
+    )
 
 class GenerateResponse(BaseModel):
     error: bool = Field(..., description="True if generation failed, false otherwise.")
@@ -29,6 +41,14 @@ class GenerateResponse(BaseModel):
         default=None,
         description="Optional diagnostic message explaining the error cause."
     )
+    approximate: bool = Field(
+        default=False,
+        description="True if the page was reused from a similar earlier instruction instead of generated."
+    )
+    similarity: Optional[float] = Field(
+        default=None,
+        description="Similarity (0..1) between this instruction and the one the reused page was made for."
+    )
 
 class HealthResponse(BaseModel):
     status: str
@@ -40,6 +60,7 @@ class JobStatus(str, Enum):
     processing = "processing"
     finished = "finished"
     failed = "failed"
+    cancelled = "cancelled"
 
 class AcceptedJob(BaseModel):
     job_id: str
@@ -51,6 +72,10 @@ class JobResult(BaseModel):
     status: JobStatus
     result: Optional[GenerateResponse] | None = None
     error: Optional[str] | None = None
+    trace: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Phase timeline of the job, only present when requested with ?trace=1."
+    )
 
 class JobSummary(BaseModel):
     job_id: str
@@ -63,4 +88,45 @@ class JobListResponse(BaseModel):
     total: int
     page: int
     size: int
-    has_more: bool
\ No newline at end of file
+    has_more: bool
+
+class BatchItem(BaseModel):
+    """Per-item overrides on top of BatchRequest.base; unset fields keep the base value."""
+    message: Optional[str] = Field(
+        default=None,
+        description="Replaces the base instruction for this item."
+    )
+    append: Optional[str] = Field(
+        default=None,
+        description="Added after the (base) instruction, e.g. 'Use a dark color scheme.'. Keeps the prompt prefix shared."
+    )
+    previous_html: Optional[str] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    extra: Optional[Dict[str, Any]] = None
+    pretty: Optional[bool] = None
+
+class BatchRequest(BaseModel):
+    base: GenerateRequest
+    items: list[BatchItem] = Field(..., min_length=1)
+
+class BatchAccepted(BaseModel):
+    batch_id: str
+    job_ids: list[str]
+    expires_at: datetime
+
+class BatchItemStatus(BaseModel):
+    index: int
+    job_id: str
+    status: JobStatus
+    error: Optional[str] = None
+
+class BatchProgress(BaseModel):
+    batch_id: str
+    status: str = Field(..., description="queued, running or done (every item finished, failed or cancelled).")
+    total: int
+    counts: Dict[str, int]
+    progress: float
+    created_at: datetime
+    expires_at: datetime
+    items: list[BatchItemStatus]
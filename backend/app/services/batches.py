@@ -0,0 +1,153 @@
+# app/services/batches.py
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from ..schemas import BatchItem, GenerateRequest, JobStatus
+from .jobs import TERMINAL_STATUSES, Job
+from .llm import SYSTEM_INSTRUCTION, estimate_job_tokens, estimate_tokens
+from .scheduler import PREFILL_COST_FACTOR, estimate_job_cost
+
+# POST /generate/batch: one base request plus per-item overrides, each item a job.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+# Batches are dropped with their jobs (JOB_TTL_MINUTES); the oldest go first past this many.
+BATCH_MAX_TRACKED = int(os.getenv("BATCH_MAX_TRACKED", "1000"))
+
+
+def item_request(base: GenerateRequest, item: BatchItem) -> GenerateRequest:
+    update = item.model_dump(exclude_none=True, exclude={"message", "append"})
+    message = item.message if item.message is not None else base.message
+    if item.append:
+        # after the instruction, so the prompt up to here is the same for every variant
+        message = f"{message}\n{item.append}"
+    update["message"] = message
+    return base.model_copy(update=update)
+
+
+@dataclass
+class PlannedItem:
+    index: int
+    req: GenerateRequest
+    group: str  # items with the same prompt prefix
+    cost: float  # charged to the tenant by the scheduler
+    order: float  # queue position, shared by the whole group
+    tokens: int  # estimated LLM tokens, for rate limiting
+
+
+def plan_batch(base: GenerateRequest, items: List[BatchItem]) -> List[PlannedItem]:
+    """
+    Items in dispatch order. Items whose prompts share a prefix (same
+    previous_html and, unless they replace it, the base instruction) form a
+    group; a group is queued as one run so its prompts reach Ollama back to back
+    and reuse the cached prefix. Only the first item of a group pays for
+    prefilling that prefix.
+    """
+    groups: "OrderedDict[str, List[PlannedItem]]" = OrderedDict()
+    for index, item in enumerate(items):
+        req = item_request(base, item)
+        shares_instruction = item.message is None
+        prefix = (req.previous_html or "") + "\0" + (base.message if shares_instruction else "")
+        group = hashlib.sha256(prefix.encode()).hexdigest()[:16]
+        prefix_tokens = estimate_tokens(SYSTEM_INSTRUCTION) + estimate_tokens(req.previous_html)
+        if shares_instruction:
+            prefix_tokens += estimate_tokens(base.message)
+        members = groups.setdefault(group, [])
+        cost = estimate_job_cost(req)
+        tokens = sum(estimate_job_tokens(req.message, req.previous_html))
+        if members:
+            cost -= prefix_tokens * PREFILL_COST_FACTOR
+            tokens -= prefix_tokens
+            order = members[0].order
+        else:
+            order = cost
+        members.append(PlannedItem(index, req, group, max(cost, 1.0), order, tokens))
+    return [p for members in groups.values() for p in members]
+
+
+@dataclass
+class Batch:
+    batch_id: str
+    tenant: str
+    job_ids: List[str]  # in item order
+    groups: int
+    created_at: datetime
+    expires_at: datetime
+
+
+def batch_progress(batch: Batch, jobs: List[Optional[Job]]) -> Dict[str, Any]:
+    counts = {s.value: 0 for s in JobStatus}
+    items = []
+    for index, job in enumerate(jobs):
+        if job is None:
+            continue
+        counts[job.status.value] += 1
+        items.append({"index": index, "job_id": job.job_id, "status": job.status, "error": job.error})
+    total = len(batch.job_ids)
+    done = sum(counts[s.value] for s in TERMINAL_STATUSES)
+    if done == len(items):
+        status = "done"
+    elif counts[JobStatus.received.value] == len(items):
+        status = "queued"
+    else:
+        status = "running"
+    return {
+        "batch_id": batch.batch_id,
+        "status": status,
+        "total": total,
+        "counts": counts,
+        "progress": round(done / total, 4) if total else 1.0,
+        "created_at": batch.created_at,
+        "expires_at": batch.expires_at,
+        "items": items,
+    }
+
+
+class BatchRegistry:
+    """Batch id -> its job ids. Insertion order is expiry order. Event loop only."""
+
+    def __init__(self, max_batches: int = BATCH_MAX_TRACKED) -> None:
+        self.max_batches = max(1, max_batches)
+        self._batches: "OrderedDict[str, Batch]" = OrderedDict()
+        self.created = 0
+        self.items = 0
+
+    def add(self, tenant: str, jobs: List[Job], groups: int) -> Batch:
+        self._prune(datetime.now(timezone.utc))
+        batch = Batch(
+            batch_id=str(uuid.uuid4()),
+            tenant=tenant,
+            job_ids=[job.job_id for job in jobs],
+            groups=groups,
+            created_at=min(job.created_at for job in jobs),
+            expires_at=min(job.expires_at for job in jobs),
+        )
+        self._batches[batch.batch_id] = batch
+        while len(self._batches) > self.max_batches:
+            self._batches.popitem(last=False)
+        self.created += 1
+        self.items += len(jobs)
+        return batch
+
+    def get(self, batch_id: str) -> Optional[Batch]:
+        batch = self._batches.get(batch_id)
+        if batch is not None and batch.expires_at <= datetime.now(timezone.utc):
+            self._prune(datetime.now(timezone.utc))
+            return None
+        return batch
+
+    def _prune(self, now: datetime) -> None:
+        while self._batches:
+            oldest = next(iter(self._batches.values()))
+            if oldest.expires_at > now:
+                break
+            self._batches.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"tracked": len(self._batches), "created": self.created, "items": self.items}
+
+
+batch_registry = BatchRegistry()
@@ -0,0 +1,143 @@
+# app/services/cascade.py
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .llm import OLLAMA_MODEL
+
+# Comma separated list of Ollama models, cheapest first.
+# Example: OLLAMA_MODEL_LADDER=qwen2.5-coder:0.5b,qwen2.5-coder:1.5b,qwen2.5-coder:3b
+# Defaults to the single OLLAMA_MODEL, which reproduces the pre-cascade behavior.
+MODEL_LADDER = [m.strip() for m in os.getenv("OLLAMA_MODEL_LADDER", "").split(",") if m.strip()] or [OLLAMA_MODEL]
+
+# A tier is skipped as a starting point once it has at least MIN_SAMPLES attempts
+# and its smoothed pass rate dropped below MIN_PASS_RATE.
+CASCADE_MIN_SAMPLES = int(os.getenv("GEN_CASCADE_MIN_SAMPLES", "20"))
+CASCADE_MIN_PASS_RATE = float(os.getenv("GEN_CASCADE_MIN_PASS_RATE", "0.35"))
+CASCADE_EWMA_ALPHA = float(os.getenv("GEN_CASCADE_EWMA_ALPHA", "0.1"))
+# Every Nth job starts at the cheapest tier anyway so skipped tiers get re-measured.
+CASCADE_PROBE_EVERY = int(os.getenv("GEN_CASCADE_PROBE_EVERY", "25"))
+
+
+@dataclass
+class TierStats:
+    model: str
+    attempts: int = 0
+    passes: int = 0
+    low_score: int = 0
+    truncated: int = 0
+    errors: int = 0
+    gpu_seconds: float = 0.0
+    pass_rate: Optional[float] = None  # EWMA over attempts, None until the first sample
+    attempt_seconds: Optional[float] = None  # EWMA of attempt wall time (LLM call + post-processing)
+
+    def observe(self, passed: bool) -> None:
+        sample = 1.0 if passed else 0.0
+        if self.pass_rate is None:
+            self.pass_rate = sample
+        else:
+            self.pass_rate += CASCADE_EWMA_ALPHA * (sample - self.pass_rate)
+
+    def observe_duration(self, seconds: float) -> None:
+        if self.attempt_seconds is None:
+            self.attempt_seconds = seconds
+        else:
+            self.attempt_seconds += CASCADE_EWMA_ALPHA * (seconds - self.attempt_seconds)
+
+
+class ModelLadder:
+    """
+    Ordered list of model tiers. Jobs start on the cheapest tier that is still
+    passing often enough and escalate one tier per failed or truncated attempt.
+    All mutations happen on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, models: List[str]) -> None:
+        self._tiers = [TierStats(model=m) for m in models]
+        self._jobs = 0
+        self._finished_jobs = 0
+        self._job_gpu_seconds = 0.0
+
+    @property
+    def top(self) -> int:
+        return len(self._tiers) - 1
+
+    def model(self, tier: int) -> str:
+        return self._tiers[tier].model
+
+    def can_escalate(self, tier: int) -> bool:
+        return tier < self.top
+
+    def escalate(self, tier: int) -> int:
+        return min(tier + 1, self.top)
+
+    def start_tier(self) -> int:
+        self._jobs += 1
+        if CASCADE_PROBE_EVERY > 0 and self._jobs % CASCADE_PROBE_EVERY == 0:
+            return 0
+        for i, t in enumerate(self._tiers[:-1]):
+            if t.attempts < CASCADE_MIN_SAMPLES:
+                return i
+            if (t.pass_rate or 0.0) >= CASCADE_MIN_PASS_RATE:
+                return i
+        return self.top
+
+    def record_attempt(
+        self,
+        tier: int,
+        *,
+        passed: bool,
+        truncated: bool = False,
+        error: bool = False,
+        gpu_seconds: float = 0.0,
+        seconds: float = 0.0,
+    ) -> None:
+        t = self._tiers[tier]
+        t.attempts += 1
+        if seconds > 0:
+            t.observe_duration(seconds)
+        t.gpu_seconds += gpu_seconds
+        if passed:
+            t.passes += 1
+        elif error:
+            t.errors += 1
+        elif truncated:
+            t.truncated += 1
+        else:
+            t.low_score += 1
+        t.observe(passed)
+
+    def expected_attempt_seconds(self, tier: int) -> float:
+        """Smoothed duration of one attempt on `tier` (0.0 until measured)."""
+        return self._tiers[tier].attempt_seconds or 0.0
+
+    def record_job(self, *, finished: bool, gpu_seconds: float) -> None:
+        self._job_gpu_seconds += gpu_seconds
+        if finished:
+            self._finished_jobs += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        tiers = []
+        for i, t in enumerate(self._tiers):
+            tiers.append({
+                "tier": i,
+                "model": t.model,
+                "attempts": t.attempts,
+                "passes": t.passes,
+                "low_score": t.low_score,
+                "truncated": t.truncated,
+                "errors": t.errors,
+                "pass_rate": round(t.pass_rate, 4) if t.pass_rate is not None else None,
+                "gpu_seconds": round(t.gpu_seconds, 3),
+                "attempt_seconds": round(t.attempt_seconds, 3) if t.attempt_seconds is not None else None,
+            })
+        per_finished = self._job_gpu_seconds / self._finished_jobs if self._finished_jobs else 0.0
+        return {
+            "tiers": tiers,
+            "jobs": self._jobs,
+            # all GPU time spent (including failed jobs) amortized over successful ones
+            "gpu_seconds_per_finished_job": round(per_finished, 3),
+        }
+
+
+model_ladder = ModelLadder(MODEL_LADDER)
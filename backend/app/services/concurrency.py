@@ -0,0 +1,204 @@
+# app/services/concurrency.py
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from . import metrics
+
+# Adaptive cap on concurrent Ollama requests (opt-in). AIMD steered by a latency
+# gradient against a minimum-latency baseline: while smoothed latency stays
+# within TOLERANCE x the best recently seen, the limit grows by ~1 per round
+# trip; beyond that it shrinks in proportion to the excess; timeouts and
+# overload errors cut it multiplicatively. The generation scheduler enforces it
+# at dispatch (one slot per running job), so with it enabled GEN_WORKERS is
+# ignored and up to OLLAMA_LIMIT_MAX jobs run at once.
+OLLAMA_ADAPTIVE_LIMIT = os.getenv("OLLAMA_ADAPTIVE_LIMIT", "0") == "1"
+OLLAMA_LIMIT_INITIAL = float(os.getenv("OLLAMA_LIMIT_INITIAL", "2"))
+OLLAMA_LIMIT_MIN = float(os.getenv("OLLAMA_LIMIT_MIN", "1"))
+OLLAMA_LIMIT_MAX = float(os.getenv("OLLAMA_LIMIT_MAX", "16"))
+OLLAMA_LIMIT_TOLERANCE = float(os.getenv("OLLAMA_LIMIT_TOLERANCE", "1.5"))
+OLLAMA_LIMIT_SMOOTHING = float(os.getenv("OLLAMA_LIMIT_SMOOTHING", "0.2"))
+OLLAMA_LIMIT_BACKOFF = float(os.getenv("OLLAMA_LIMIT_BACKOFF", "0.9"))
+# The baseline is the minimum over this many recent samples, so it can rise
+# again when the model or hardware changes.
+OLLAMA_LIMIT_RTT_WINDOW = int(os.getenv("OLLAMA_LIMIT_RTT_WINDOW", "100"))
+OLLAMA_LIMIT_HISTORY = 120
+
+
+class WindowedMin:
+    """Minimum of the last `size` values in O(1) amortized (monotonic deque)."""
+
+    def __init__(self, size: int) -> None:
+        self.size = max(1, size)
+        self._n = 0
+        self._q: Deque[Tuple[int, float]] = deque()
+
+    def add(self, value: float) -> float:
+        while self._q and self._q[-1][1] >= value:
+            self._q.pop()
+        self._q.append((self._n, value))
+        self._n += 1
+        if self._q[0][0] <= self._n - 1 - self.size:
+            self._q.popleft()
+        return self._q[0][1]
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._q[0][1] if self._q else None
+
+
+class Slot:
+    __slots__ = ("sample",)
+
+    def __init__(self) -> None:
+        self.sample: Optional[float] = None  # latency to learn from; None = ignore
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limiter whose limit is learned from latency samples.
+    Samples should be comparable across requests (the LLM client reports
+    wall seconds per generated token). Waiters are served FIFO. Event loop only.
+    Cancellation is not a drop: only timeouts and overload errors are.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = OLLAMA_ADAPTIVE_LIMIT,
+        initial: float = OLLAMA_LIMIT_INITIAL,
+        min_limit: float = OLLAMA_LIMIT_MIN,
+        max_limit: float = OLLAMA_LIMIT_MAX,
+        tolerance: float = OLLAMA_LIMIT_TOLERANCE,
+        smoothing: float = OLLAMA_LIMIT_SMOOTHING,
+        backoff: float = OLLAMA_LIMIT_BACKOFF,
+        rtt_window: int = OLLAMA_LIMIT_RTT_WINDOW,
+    ) -> None:
+        self.enabled = enabled
+        self.min_limit = max(1.0, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self._min_rtt = WindowedMin(rtt_window)
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.samples = 0
+        self.drops = 0
+        self.last_rtt: Optional[float] = None
+        self.smoothed_rtt: Optional[float] = None
+        self.history: Deque[Tuple[float, float, str]] = deque(maxlen=OLLAMA_LIMIT_HISTORY)
+        self._publish("init")
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.limit))
+
+    async def acquire(self) -> None:
+        if not self.enabled:
+            self.in_flight += 1
+            return
+        if self.in_flight < self.capacity and not self._waiters:
+            self.in_flight += 1
+            metrics.OLLAMA_IN_FLIGHT.set(self.in_flight)
+            return
+        t0 = time.perf_counter()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut  # the slot is handed over by _wake (in_flight already counted)
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release_slot()  # got the slot just as we were cancelled
+            elif fut in self._waiters:
+                self._waiters.remove(fut)
+            raise
+        metrics.OLLAMA_LIMIT_WAIT.observe(time.perf_counter() - t0)
+
+    def release(self, sample: Optional[float] = None) -> None:
+        if sample is not None:
+            self.observe(sample)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        if self.enabled:
+            metrics.OLLAMA_IN_FLIGHT.set(self.in_flight)
+            self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.capacity:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+        metrics.OLLAMA_IN_FLIGHT.set(self.in_flight)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Slot]:
+        """`async with limiter.slot() as s: ...; s.sample = latency`."""
+        await self.acquire()
+        s = Slot()
+        try:
+            yield s
+        finally:
+            self.release(s.sample)
+
+    def observe(self, rtt: float) -> None:
+        """Gradient update from one successful request's latency."""
+        if not self.enabled or rtt <= 0:
+            return
+        self.samples += 1
+        self.last_rtt = rtt
+        min_rtt = self._min_rtt.add(rtt)
+        if self.smoothed_rtt is None:
+            self.smoothed_rtt = rtt
+        else:
+            self.smoothed_rtt += self.smoothing * (rtt - self.smoothed_rtt)
+        gradient = max(0.5, min(1.0, self.tolerance * min_rtt / self.smoothed_rtt))
+        if gradient < 1.0:
+            self._set(self.limit * (1 - self.smoothing * (1 - gradient)), "latency")
+        elif self.in_flight >= self.limit / 2:
+            # additive increase: +1 after `limit` samples, i.e. about one round trip
+            self._set(self.limit + 1 / self.limit, "probe")
+        # else: not using the current limit, so no evidence that more would help
+
+    def record_drop(self) -> None:
+        """Timeout or overload error: multiplicative decrease."""
+        if not self.enabled:
+            return
+        self.drops += 1
+        metrics.OLLAMA_LIMIT_DROPS.inc()
+        self._set(self.limit * self.backoff, "drop")
+
+    def _set(self, limit: float, reason: str) -> None:
+        old = self.capacity
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        if self.capacity != old:
+            self._publish(reason)
+            self._wake()
+
+    def _publish(self, reason: str) -> None:
+        self.history.append((time.time(), self.capacity, reason))
+        metrics.OLLAMA_LIMIT.set(self.capacity if self.enabled else 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "limit": self.capacity,
+            "limit_exact": round(self.limit, 3),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "min_rtt": self._min_rtt.value,
+            "last_rtt": self.last_rtt,
+            "smoothed_rtt": self.smoothed_rtt,
+            "samples": self.samples,
+            "drops": self.drops,
+            "history": [{"at": round(t, 3), "limit": lim, "reason": r} for t, lim, r in self.history],
+        }
+
+
+ollama_limiter = AdaptiveLimiter()
@@ -0,0 +1,293 @@
+# app/services/diagnostics.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import Counter as Tally, deque
+from types import FrameType
+from typing import Any, Deque, Dict, List, Optional
+
+from . import metrics
+
+# Event-loop health and on-demand profiling. Everything that inspects the loop
+# runs in its own daemon thread, so it keeps working while the loop is stuck.
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("DIAG_LOOP_LAG_INTERVAL_SECONDS", "0.1"))  # 0 = off
+# A stall this long is logged with the loop thread's stack (0 = off).
+SLOW_CALLBACK_SECONDS = float(os.getenv("DIAG_SLOW_CALLBACK_SECONDS", "0.25"))
+PROFILE_HZ = float(os.getenv("DIAG_PROFILE_HZ", "100"))
+PROFILE_MAX_SECONDS = float(os.getenv("DIAG_PROFILE_MAX_SECONDS", "300"))
+MAX_STACK_DEPTH = 64
+_BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    if "site-packages" in path:
+        path = path.split("site-packages", 1)[1].lstrip("/\\")
+    elif path.startswith(_BACKEND_ROOT):
+        path = os.path.relpath(path, _BACKEND_ROOT)
+    else:
+        path = os.path.basename(path)
+    path = path.replace("\\", "/")
+    return f"{path}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame: Optional[FrameType], root: str = "") -> str:
+    """Stack as "root;outer;...;inner" (Brendan Gregg's collapsed format, no count)."""
+    names: List[str] = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    if root:
+        names.insert(0, root)
+    return ";".join(n.replace(";", ":").replace(" ", "_") for n in names)
+
+
+def render_collapsed(stacks: Tally) -> str:
+    """One "stack count" line per distinct stack, ready for flamegraph.pl / speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class LoopMonitor:
+    """
+    A task sleeps `interval` in a loop; the overshoot is the loop lag
+    (ai_event_loop_lag_seconds). A watchdog thread notices when that task has
+    not run for `slow_seconds` and logs what the loop thread is executing.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS, slow_seconds: float = SLOW_CALLBACK_SECONDS) -> None:
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self._beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.max_lag = 0.0
+        self.samples = 0
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=20)
+
+    async def start(self) -> None:
+        if self.interval <= 0 or self._task is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample_loop())
+        if self.slow_seconds > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _sample_loop(self) -> None:
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat = now = time.monotonic()
+            lag = max(0.0, now - t0 - self.interval)
+            self.samples += 1
+            self.max_lag = max(self.max_lag, lag)
+            metrics.LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.slow_seconds / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.slow_seconds or beat == reported:
+                continue
+            reported = beat  # once per stall
+            frame = sys._current_frames().get(self.loop_thread_id)
+            task = asyncio.current_task(self.loop) if self.loop is not None else None
+            stack = "".join(traceback.format_stack(frame, limit=MAX_STACK_DEPTH)) if frame is not None else ""
+            self.stalls.append({
+                "at": time.time(),
+                "stalled_seconds": round(stalled, 3),
+                "task": repr(task) if task is not None else None,
+                "stack": collapse(frame),
+            })
+            metrics.SLOW_CALLBACKS.inc()
+            logger.warning("event loop blocked for %.3fs in %r\n%s", stalled, task, stack)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "samples": self.samples,
+            "max_lag": round(self.max_lag, 4),
+            "slow_callback_seconds": self.slow_seconds,
+            "stalls": list(self.stalls),
+        }
+
+
+class SamplingProfiler:
+    """
+    Samples thread stacks from a daemon thread at `hz`. Two consumers:
+      * a global run (start/stop), which records every thread's stack;
+      * per-task watches, which record the loop thread's stack only while the
+        watched asyncio task, or a task it spawned (asyncio.wait_for, gather),
+        is the one running: CPU spent on the loop by that job. Work handed to
+        executor threads is not attributed.
+    The sampler thread only runs while one of them is active.
+    """
+
+    def __init__(self, hz: float = PROFILE_HZ, max_seconds: float = PROFILE_MAX_SECONDS) -> None:
+        self.hz = hz
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        # global run
+        self._until: Optional[float] = None
+        self._stacks: Tally = Tally()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.result: Optional[str] = None
+        self.result_samples = 0
+        # per-task watches: task -> (stacks, samples while the task was running, total samples)
+        self._watches: Dict[asyncio.Task, List[Any]] = {}
+        self._owners: "weakref.WeakKeyDictionary[asyncio.Task, asyncio.Task]" = weakref.WeakKeyDictionary()
+        self._factory_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> bool:
+        return self._until is not None
+
+    def _bind_loop(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def start(self, seconds: float) -> bool:
+        """Begins a global run of `seconds` (capped); False if one is in progress."""
+        self._bind_loop()
+        with self._lock:
+            if self._until is not None:
+                return False
+            self._stacks = Tally()
+            self.samples = 0
+            self.started_at = time.time()
+            self._until = time.monotonic() + min(max(seconds, 0.01), self.max_seconds)
+        self._ensure_thread()
+        return True
+
+    def stop(self) -> None:
+        with self._lock:
+            self._finish()
+
+    def _finish(self) -> None:
+        # caller holds self._lock
+        if self._until is None:
+            return
+        self._until = None
+        self.result = render_collapsed(self._stacks)
+        self.result_samples = self.samples
+
+    def remaining(self) -> float:
+        until = self._until
+        return max(0.0, until - time.monotonic()) if until is not None else 0.0
+
+    def _install_task_factory(self) -> None:
+        # remembers which watched task (transitively) created each new task
+        loop = asyncio.get_running_loop()
+        if self._factory_loop is loop:
+            return
+        self._factory_loop = loop
+        previous = loop.get_task_factory()
+
+        def factory(loop: asyncio.AbstractEventLoop, coro: Any, *args: Any, **kwargs: Any) -> asyncio.Task:
+            if previous is not None:
+                task = previous(loop, coro, *args, **kwargs)
+            else:
+                task = asyncio.Task(coro, *args, loop=loop, **kwargs)
+            if self._watches:
+                parent = asyncio.current_task(loop)
+                if parent is not None:
+                    with self._lock:
+                        owner = parent if parent in self._watches else self._owners.get(parent)
+                        if owner is not None:
+                            self._owners[task] = owner
+            return task
+
+        loop.set_task_factory(factory)
+
+    def watch(self, task: asyncio.Task) -> None:
+        self._bind_loop()
+        self._install_task_factory()
+        with self._lock:
+            self._watches[task] = [Tally(), 0, 0]
+        self._ensure_thread()
+
+    def unwatch(self, task: asyncio.Task) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._watches.pop(task, None)
+        if entry is None:
+            return None
+        stacks, on_cpu, total = entry
+        return {"collapsed": render_collapsed(stacks), "samples": on_cpu, "wall_samples": total, "hz": self.hz}
+
+    def _sample(self) -> None:
+        interval = 1.0 / self.hz if self.hz > 0 else 0.01
+        me = threading.get_ident()
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if self._until is not None and time.monotonic() >= self._until:
+                    self._finish()
+                if self._until is None and not self._watches:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                if self._until is not None:
+                    self.samples += 1
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                    for ident, frame in frames.items():
+                        if ident != me:
+                            self._stacks[collapse(frame, names.get(ident, str(ident)))] += 1
+                if self._watches:
+                    current = asyncio.current_task(self.loop) if self.loop is not None else None
+                    owner = None
+                    if current is not None:
+                        owner = current if current in self._watches else self._owners.get(current)
+                    for task, entry in self._watches.items():
+                        entry[2] += 1
+                        if task is owner:
+                            entry[1] += 1
+                            entry[0][collapse(frames.get(self.loop_thread_id))] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "remaining_seconds": round(self.remaining(), 3),
+            "hz": self.hz,
+            "samples": self.samples,
+            "has_result": self.result is not None,
+            "watched_tasks": len(self._watches),
+        }
+
+
+loop_monitor = LoopMonitor()
+profiler = SamplingProfiler()
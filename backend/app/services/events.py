@@ -0,0 +1,185 @@
+# app/services/events.py
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from .jobs import JOB_CREATED, JOB_EXPIRED, JOB_STATUS, InMemoryJobStore, Job, job_store
+from .serialize import dumps
+
+# Push stream behind GET /api/ai/jobs/events (server-sent events). Every store
+# mutation is encoded once and fanned out to per-subscriber buffers; each
+# subscriber keeps at most one pending event per job, so a slow dashboard
+# receives the latest state instead of the whole history.
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "100"))
+# Distinct jobs a subscriber may have pending; beyond it the buffer is dropped
+# and the subscriber gets a fresh snapshot instead.
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "256"))
+# After a wake-up, wait this long so bursts go out as one write.
+EVENTS_FLUSH_INTERVAL_SECONDS = float(os.getenv("EVENTS_FLUSH_INTERVAL_SECONDS", "0.5"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_SNAPSHOT_JOBS = int(os.getenv("EVENTS_SNAPSHOT_JOBS", "50"))
+
+_EVENT_NAMES = {JOB_CREATED: "job_created", JOB_STATUS: "job_updated", JOB_EXPIRED: "job_expired"}
+HEARTBEAT = b": keepalive\n\n"
+
+
+def job_summary(job: Job) -> Dict[str, Any]:
+    """Same fields as JobSummary in GET /jobs."""
+    return {
+        "job_id": job.job_id,
+        "status": job.status.value,
+        "created_at": job.created_at.isoformat(),
+        "expires_at": job.expires_at.isoformat(),
+    }
+
+
+def frame(event: str, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+class Subscriber:
+    def __init__(self, max_pending: int) -> None:
+        self.max_pending = max(1, max_pending)
+        # job_id -> (event name, encoded data); at most one entry per job
+        self.pending: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self.stats_dirty = False
+        self.resync = True  # the first flush is a snapshot
+        self.wake = asyncio.Event()
+        self.coalesced = 0
+        self.resyncs = 0
+
+    @property
+    def has_pending(self) -> bool:
+        return self.resync or self.stats_dirty or bool(self.pending)
+
+    def push(self, job_id: str, event: str, data: bytes) -> None:
+        self.stats_dirty = True
+        self.wake.set()
+        if self.resync:
+            return  # the coming snapshot includes it
+        prev = self.pending.pop(job_id, None)
+        if prev is not None:
+            self.coalesced += 1
+            if prev[0] == "job_created":
+                if event == "job_expired":
+                    return  # created and gone before this subscriber heard of it
+                event = "job_created"
+        self.pending[job_id] = (event, data)
+        if len(self.pending) > self.max_pending:
+            self.pending.clear()
+            self.resync = True
+            self.resyncs += 1
+
+
+class JobEventHub:
+    """
+    Fan-out of InMemoryJobStore mutations to SSE subscribers. The hub listens
+    to the store only while someone is subscribed. Stats and snapshot payloads
+    are encoded once per store version and shared, so the work per mutation is
+    one encode plus a dict write per subscriber.
+    """
+
+    def __init__(
+        self,
+        store: Optional[InMemoryJobStore] = None,
+        max_subscribers: int = EVENTS_MAX_SUBSCRIBERS,
+        buffer_size: int = EVENTS_BUFFER_SIZE,
+        flush_interval: float = EVENTS_FLUSH_INTERVAL_SECONDS,
+        heartbeat: float = EVENTS_HEARTBEAT_SECONDS,
+        snapshot_jobs: int = EVENTS_SNAPSHOT_JOBS,
+    ) -> None:
+        self.store = store or job_store
+        self.max_subscribers = max_subscribers
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.heartbeat = heartbeat
+        self.snapshot_jobs = snapshot_jobs
+        self._subscribers: Set[Subscriber] = set()
+        self._stats: Tuple[int, bytes] = (-1, b"")
+        self._snapshot: Tuple[int, bytes] = (-1, b"")
+        self.events = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[Subscriber]:
+        """None when the subscriber limit is reached."""
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        if not self._subscribers:
+            self.store.add_listener(self._on_job_event)
+        sub = Subscriber(self.buffer_size)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self._subscribers.discard(sub)
+        if not self._subscribers:
+            self.store.remove_listener(self._on_job_event)
+
+    def _on_job_event(self, kind: str, job: Job) -> None:
+        event = _EVENT_NAMES.get(kind)
+        if event is None:
+            return
+        self.events += 1
+        data = dumps(job_summary(job)) if kind != JOB_EXPIRED else dumps({"job_id": job.job_id})
+        for sub in self._subscribers:
+            sub.push(job.job_id, event, data)
+
+    def _stats_data(self) -> bytes:
+        version = self.store.version
+        if self._stats[0] != version:
+            self._stats = (version, dumps(self.store.counters()))
+        return self._stats[1]
+
+    def _snapshot_data(self) -> bytes:
+        version = self.store.version
+        if self._snapshot[0] != version:
+            jobs = [job_summary(j) for j in self.store.recent_jobs(self.snapshot_jobs)]
+            self._snapshot = (version, dumps({"stats": self.store.counters(), "jobs": jobs}))
+        return self._snapshot[1]
+
+    def drain(self, sub: Subscriber) -> bytes:
+        """Everything pending for `sub` as one chunk of SSE frames."""
+        if sub.resync:
+            sub.resync = False
+            sub.stats_dirty = False
+            sub.pending.clear()
+            return frame("snapshot", self._snapshot_data())
+        chunks: List[bytes] = [frame(event, data) for event, data in sub.pending.values()]
+        sub.pending.clear()
+        if sub.stats_dirty:
+            sub.stats_dirty = False
+            chunks.append(frame("stats", self._stats_data()))
+        return b"".join(chunks)
+
+    async def stream(self, sub: Subscriber) -> AsyncIterator[bytes]:
+        try:
+            yield b"retry: 3000\n\n" + self.drain(sub)
+            while True:
+                if not sub.has_pending:
+                    sub.wake.clear()
+                    try:
+                        await asyncio.wait_for(sub.wake.wait(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        yield HEARTBEAT
+                        continue
+                    await asyncio.sleep(self.flush_interval)  # coalescing window
+                chunk = self.drain(sub)
+                if chunk:
+                    yield chunk
+        finally:
+            self.unsubscribe(sub)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "events": self.events,
+            "coalesced": sum(s.coalesced for s in self._subscribers),
+            "resyncs": sum(s.resyncs for s in self._subscribers),
+        }
+
+
+job_events = JobEventHub()
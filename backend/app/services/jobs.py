@@ -1,14 +1,37 @@
 # app/services/jobs.py
 import asyncio
+import hashlib
+import logging
+import os
+import time
 import uuid
-from dataclasses import dataclass
+from collections import OrderedDict
+from itertools import islice
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict
+from typing import Any, Callable, Optional, Dict, List, Tuple
 
 from ..schemas import JobStatus, GenerateRequest, GenerateResponse
+from .ratelimit import BucketTable, RateDecision, RateLimits
+from .serialize import ResultCache, build_result_cache, build_result_cache_async
+from .trace import JobTrace
 
 JOB_TTL_MINUTES = 20
 REAPER_INTERVAL_SECONDS = 30
+# End-to-end budget of a job from creation (0 = none). Clients may only tighten it
+# with GenerateRequest.deadline_seconds.
+JOB_DEADLINE_SECONDS = float(os.getenv("GEN_JOB_DEADLINE_SECONDS", "300"))
+# Idempotency-Key index on POST /generate: keys live as long as their job (JOB_TTL_MINUTES)
+# and the oldest are dropped beyond this many entries.
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# states after which a job's result is immutable
+TERMINAL_STATUSES = frozenset({JobStatus.finished, JobStatus.failed, JobStatus.cancelled})
+# kinds passed to store listeners
+JOB_CREATED = "created"
+JOB_STATUS = "status"
+JOB_EXPIRED = "expired"
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -18,8 +41,78 @@ class Job:
     created_at: datetime
     expires_at: datetime
     request: GenerateRequest
+    tenant: str = "anonymous"
     result: Optional[GenerateResponse] = None
     error: Optional[str] = None
+    trace: JobTrace = field(default_factory=JobTrace)
+    version: int = 0  # bumped on every status/result change (ETag source)
+    cached: Optional[ResultCache] = None  # encoded /result bytes, terminal jobs only
+    # time.monotonic() of the last client read, drives GEN_ABANDON_AFTER_SECONDS
+    last_polled_at: float = field(default_factory=time.monotonic)
+    deadline: Optional[float] = None  # time.monotonic() by which the job must be done
+    profile: bool = False  # sample run_generation_job's stacks (X-Profile, admins only)
+    profile_result: Optional[Dict[str, Any]] = None
+
+
+def job_deadline_seconds(req: GenerateRequest) -> Optional[float]:
+    """Effective time budget: the server default, tightened by the client if asked."""
+    budget = JOB_DEADLINE_SECONDS if JOB_DEADLINE_SECONDS > 0 else None
+    requested = req.deadline_seconds
+    if requested is not None and requested > 0:
+        budget = requested if budget is None else min(budget, requested)
+    return budget
+
+
+class IdempotencyConflict(Exception):
+    """The Idempotency-Key was already used for a different request body."""
+
+    def __init__(self, job_id: str) -> None:
+        super().__init__(job_id)
+        self.job_id = job_id
+
+
+def request_fingerprint(req: GenerateRequest) -> str:
+    return hashlib.sha256(req.model_dump_json().encode()).hexdigest()
+
+
+@dataclass
+class IdempotencyEntry:
+    job_id: str
+    fingerprint: str
+    expires_at: float  # time.monotonic()
+
+
+class IdempotencyIndex:
+    """Bounded, TTL-expiring map of (tenant, Idempotency-Key) -> job, oldest first."""
+
+    def __init__(self, max_keys: int = IDEMPOTENCY_MAX_KEYS, ttl_seconds: float = JOB_TTL_MINUTES * 60) -> None:
+        self.max_keys = max(1, max_keys)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], IdempotencyEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple[str, str], now: float) -> Optional[IdempotencyEntry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def put(self, key: Tuple[str, str], job_id: str, fingerprint: str, now: float) -> None:
+        self._entries[key] = IdempotencyEntry(job_id, fingerprint, now + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    def prune(self, now: float) -> None:
+        # insertion order == expiry order (constant TTL), so stop at the first live key
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[key]
 
 
 class InMemoryJobStore:
@@ -30,6 +123,31 @@ class InMemoryJobStore:
         # cumulative totals since process start (not affected by reaper)
         self._totals: Dict[JobStatus, int] = {s: 0 for s in JobStatus}  # type: ignore
         self._totals_created: int = 0  # optional extra counter of jobs created
+        # live counts per status, kept in step with _jobs so stats() never scans
+        self._live: Dict[JobStatus, int] = {s: 0 for s in JobStatus}  # type: ignore
+        # token buckets for RATE_LIMIT_BACKEND=store (shared by everyone using this store)
+        self._rate_buckets = BucketTable()
+        # store-wide mutation counter, used to validate cached job listings
+        self._version: int = 0
+        self._idempotency = IdempotencyIndex()
+        # called as listener(kind, job) on every create / status change / expiry,
+        # under the lock: listeners must not block
+        self._listeners: List[Callable[[str, Job], None]] = []
+
+    def add_listener(self, listener: Callable[[str, Job], None]) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, Job], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, kind: str, job: Job) -> None:
+        for listener in self._listeners:
+            try:
+                listener(kind, job)
+            except Exception:  # a listener must never break a store write
+                logger.exception("[job_store] listener failed on %s for %s", kind, job.job_id)
 
     async def start_reaper(self) -> None:
         if self._reaper_task is None:
@@ -51,46 +169,192 @@ class InMemoryJobStore:
             async with self._lock:
                 to_delete = [jid for jid, job in self._jobs.items() if job.expires_at <= now]
                 for jid in to_delete:
-                    self._jobs.pop(jid, None)
+                    job = self._jobs.pop(jid)
+                    self._live[job.status] -= 1
+                    self._notify(JOB_EXPIRED, job)
+                if to_delete:
+                    self._version += 1
+                self._idempotency.prune(time.monotonic())
+
+    async def create_job(self, req: GenerateRequest, tenant: str = "anonymous") -> Job:
+        job = self._new_job(req, tenant)
+        logger.info("[job_store] create_job -> %s", job.job_id)
+        async with self._lock:
+            self._insert(job)
+        return job
+
+    async def create_jobs(self, reqs: List[GenerateRequest], tenant: str = "anonymous") -> List[Job]:
+        """Creates several jobs under one lock acquisition (batch submissions)."""
+        jobs = [self._new_job(req, tenant) for req in reqs]
+        async with self._lock:
+            for job in jobs:
+                self._insert(job)
+        logger.info("[job_store] create_jobs -> %d jobs", len(jobs))
+        return jobs
+
+    async def find_idempotent(self, tenant: str, key: str, req: GenerateRequest) -> Optional[Job]:
+        """Job previously created with this Idempotency-Key, if it is still alive."""
+        async with self._lock:
+            return self._replay(tenant, key, request_fingerprint(req), time.monotonic())
+
+    async def create_or_get_job(self, req: GenerateRequest, tenant: str, idempotency_key: str) -> Tuple[Job, bool]:
+        """
+        Atomically returns the job already registered under (tenant, key), or
+        creates one and registers it. Returns (job, created).
+        Raises IdempotencyConflict if the key was used for a different body.
+        """
+        fingerprint = request_fingerprint(req)
+        job = self._new_job(req, tenant)
+        async with self._lock:
+            now = time.monotonic()
+            existing = self._replay(tenant, idempotency_key, fingerprint, now)
+            if existing is not None:
+                return existing, False
+            self._insert(job)
+            self._idempotency.put((tenant, idempotency_key), job.job_id, fingerprint, now)
+        logger.info("[job_store] create_job -> %s (idempotency key)", job.job_id)
+        return job, True
+
+    def _replay(self, tenant: str, key: str, fingerprint: str, now: float) -> Optional[Job]:
+        entry = self._idempotency.get((tenant, key), now)
+        if entry is None:
+            return None
+        job = self._jobs.get(entry.job_id)
+        if job is None:
+            return None
+        if entry.fingerprint != fingerprint:
+            raise IdempotencyConflict(job.job_id)
+        return job
+
+    def idempotency_keys(self) -> int:
+        return len(self._idempotency)
 
-    async def create_job(self, req: GenerateRequest) -> Job:
+    def _new_job(self, req: GenerateRequest, tenant: str) -> Job:
         now = datetime.now(timezone.utc)
         job_id = str(uuid.uuid4())
-        print(f"[job_store] create_job -> {job_id}")
         job = Job(
             job_id=job_id,
             status=JobStatus.received,
             created_at=now,
             expires_at=now + timedelta(minutes=JOB_TTL_MINUTES),
             request=req,
+            tenant=tenant,
         )
-        async with self._lock:
-            self._jobs[job_id] = job
-            # cumulative: count job created and status 'received'
-            self._totals_created += 1
-            self._totals[JobStatus.received] += 1
+        budget = job_deadline_seconds(req)
+        if budget is not None:
+            job.deadline = job.last_polled_at + budget
+        job.trace.mark("queued", tenant=tenant)
         return job
 
+    def _insert(self, job: Job) -> None:
+        # caller holds self._lock
+        self._jobs[job.job_id] = job
+        self._version += 1
+        # cumulative: count job created and status 'received'
+        self._totals_created += 1
+        self._totals[JobStatus.received] += 1
+        self._live[job.status] += 1
+        self._notify(JOB_CREATED, job)
+
     async def get_job(self, job_id: str) -> Optional[Job]:
         async with self._lock:
             return self._jobs.get(job_id)
 
+    async def get_jobs(self, job_ids: List[str]) -> List[Optional[Job]]:
+        async with self._lock:
+            return [self._jobs.get(job_id) for job_id in job_ids]
+
     async def set_status(self, job_id: str, status: JobStatus) -> None:
+        # encode the terminal response before taking the lock (large pages in a thread)
+        prepared: Optional[ResultCache] = None
+        job = self._jobs.get(job_id)
+        if job is not None and status in TERMINAL_STATUSES and job.status != status and job.status != JobStatus.cancelled:
+            prepared = await build_result_cache_async(job.job_id, status, job.result, job.error, job.version + 1)
         async with self._lock:
             job = self._jobs.get(job_id)
             if job:
                 prev = job.status
+                if prev == JobStatus.cancelled:
+                    return  # a late write from the cancelled runner
                 if prev != status:
                     job.status = status
+                    job.version += 1
+                    self._version += 1
                     # cumulative: count new status
                     self._totals[status] += 1
+                    self._live[prev] -= 1
+                    self._live[status] += 1
+                    if prepared is not None and prepared.version == job.version:
+                        job.cached = prepared
+                    else:  # nothing prepared, or the job changed meanwhile
+                        self._refresh_cache(job)
+                    self._notify(JOB_STATUS, job)
 
     async def set_result(self, job_id: str, result: Optional[GenerateResponse], error: Optional[str]) -> None:
         async with self._lock:
             job = self._jobs.get(job_id)
-            if job:
+            if job and job.status != JobStatus.cancelled:
                 job.result = result
                 job.error = error
+                job.version += 1
+                self._version += 1
+                self._refresh_cache(job)
+
+    @staticmethod
+    def _refresh_cache(job: Job) -> None:
+        # serialize once, when the job reaches its final state
+        if job.status in TERMINAL_STATUSES:
+            job.cached = build_result_cache(job.job_id, job.status, job.result, job.error, job.version)
+        else:
+            job.cached = None
+
+    async def cancel(self, job_id: str, reason: str) -> Optional[JobStatus]:
+        """
+        Moves a non-terminal job to `cancelled`. Returns the status it had
+        (None if the job is unknown or already terminal).
+        """
+        async with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in TERMINAL_STATUSES:
+                return None
+            prev = job.status
+            job.status = JobStatus.cancelled
+            job.error = f"Cancelled ({reason})."
+            job.version += 1
+            self._version += 1
+            self._totals[JobStatus.cancelled] += 1
+            self._live[prev] -= 1
+            self._live[JobStatus.cancelled] += 1
+            self._refresh_cache(job)
+            self._notify(JOB_STATUS, job)
+            return prev
+
+    async def unpolled_jobs(self, idle_seconds: float, now: Optional[float] = None) -> List[str]:
+        """
+        Ids of queued/running jobs nobody has read for `idle_seconds`. Jobs with
+        a callback_url are never unpolled: the callback is how they are read.
+        """
+        now = time.monotonic() if now is None else now
+        async with self._lock:
+            return [
+                j.job_id for j in self._jobs.values()
+                if j.status not in TERMINAL_STATUSES and not j.request.callback_url
+                and now - j.last_polled_at >= idle_seconds
+            ]
+
+    async def rate_limit_take(
+        self, key: str, limits: RateLimits, cost: float, now: float, requests: float = 1.0
+    ) -> RateDecision:
+        """Atomically refill and debit the token buckets of a client key."""
+        async with self._lock:
+            return self._rate_buckets.take(key, limits, cost, now, requests)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def rate_limit_keys(self) -> int:
+        return len(self._rate_buckets)
 
     async def list_jobs(self, *, status: Optional[JobStatus] = None, page: int = 1, size: int = 50):
         """
@@ -116,11 +380,18 @@ class InMemoryJobStore:
         return jobs[start:end], total
 
     async def stats(self) -> Dict[JobStatus, int]:
-        counts: Dict[JobStatus, int] = {s: 0 for s in JobStatus}  # type: ignore
         async with self._lock:
-            for j in self._jobs.values():
-                counts[j.status] += 1
-        return counts
+            return dict(self._live)
+
+    def counters(self) -> Dict[str, Dict[str, int]]:
+        """stats_cumulative() without the lock, for callers already on the store's side (listeners)."""
+        total = {k.value: v for k, v in self._totals.items()}  # type: ignore
+        total["created"] = self._totals_created
+        return {"live": {k.value: v for k, v in self._live.items()}, "total": total}  # type: ignore
+
+    def recent_jobs(self, limit: int) -> List[Job]:
+        """Newest `limit` jobs, newest first (insertion order is creation order)."""
+        return list(islice(reversed(self._jobs.values()), max(0, limit)))
 
     async def stats_cumulative(self) -> Dict[str, Dict[str, int]]:
         """
@@ -131,11 +402,8 @@ class InMemoryJobStore:
           "total": {"received": N, "processing": N, "finished": N, "failed": N, "created": N_all}
         }
         """
-        live = await self.stats()
         async with self._lock:
-            total = {k.value: v for k, v in self._totals.items()}  # type: ignore
-            total["created"] = self._totals_created
-        return {"live": {k.value: v for k, v in live.items()}, "total": total}  # type: ignore
+            return self.counters()
 
 
 job_store = InMemoryJobStore()
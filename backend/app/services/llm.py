@@ -2,13 +2,20 @@
 import os
 import re
 import json
+import logging
+import time
 import httpx
-from typing import Optional, Dict, Any
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple
 from dotenv import load_dotenv
 
+from .concurrency import ollama_limiter
+
 # Load .env for local runs. In Docker, compose env_file plus environment take precedence.
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # ---------- Environment helpers ----------
 def _get_env(*names: str, default: str | None = None) -> str:
     for n in names:
@@ -99,6 +106,29 @@ FENCE_ANY  = re.compile(r"```[\w-]*\s*([\s\S]*?)```", re.IGNORECASE)
 class LLMError(Exception):
     """Raised when the LLM call fails or returns an invalid payload."""
 
+
+@dataclass
+class LLMReply:
+    """Model text plus the timing/usage fields Ollama reports (durations in ns)."""
+    text: str
+    model: str
+    done_reason: Optional[str] = None
+    total_duration: int = 0
+    load_duration: int = 0
+    prompt_eval_count: int = 0
+    prompt_eval_duration: int = 0
+    eval_count: int = 0
+    eval_duration: int = 0
+
+    @property
+    def truncated(self) -> bool:
+        # Ollama reports "length" when num_predict was exhausted mid-answer.
+        return self.done_reason == "length"
+
+    @property
+    def gpu_seconds(self) -> float:
+        return self.total_duration / 1e9
+
 def build_prompt(message: str, previous_html: Optional[str]) -> str:
     context = ""
     if previous_html:
@@ -106,7 +136,26 @@ def build_prompt(message: str, previous_html: Optional[str]) -> str:
     user_block = f"User instruction:\n{message}\n"
     return f"{SYSTEM_INSTRUCTION}\n{context}\n{user_block}\nReturn only the final HTML document."
 
+def estimate_tokens(text: Optional[str]) -> int:
+    # ~4 characters per token is close enough for scheduling and rate limiting.
+    return (len(text) + 3) // 4 if text else 0
+
+def estimate_job_tokens(message: str, previous_html: Optional[str], num_predict: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Returns (prompt_tokens, output_tokens) expected for a generation request.
+    Refinements re-emit the whole previous document, capped by num_predict.
+    """
+    num_predict = int(num_predict or DEFAULT_NUM_PREDICT)
+    prompt_tokens = estimate_tokens(SYSTEM_INSTRUCTION) + estimate_tokens(message) + estimate_tokens(previous_html)
+    output_tokens = min(num_predict, max(num_predict // 2, estimate_tokens(previous_html)))
+    return prompt_tokens, output_tokens
+
 async def call_ollama(prompt: str, req: Dict[str, Any]) -> str:
+    reply = await generate_completion(prompt, req)
+    return reply.text
+
+async def generate_completion(prompt: str, req: Dict[str, Any], model: Optional[str] = None) -> LLMReply:
+    model = model or OLLAMA_MODEL
     temperature = float(req.get("temperature", 0.35) or 0.35)
     top_p       = float(req.get("top_p", 0.95) or 0.95)
     seed        = req.get("seed", None)
@@ -124,26 +173,34 @@ async def call_ollama(prompt: str, req: Dict[str, Any]) -> str:
 
 
     payload = {
-        "model": OLLAMA_MODEL,
+        "model": model,
         "prompt": prompt,
         "stream": False,
         "options": options,
     }
 
     if DEBUG_MODE:
-        print("---- OLLAMA REQUEST ----")
-        print(json.dumps({
+        logger.info("---- OLLAMA REQUEST ----\n%s", json.dumps({
             "url": f"{OLLAMA_BASE_URL}/api/generate",
             "payload": payload
         }, indent=2))
 
     url = f"{OLLAMA_BASE_URL}/api/generate"
     try:
+        started = time.perf_counter()
         async with httpx.AsyncClient(timeout=HTTPX_TIMEOUT) as client:
             r = await client.post(url, json=payload)
             r.raise_for_status()
             data = r.json()
+        # the scheduler holds the limiter slot for the job; every Ollama call
+        # (call_ollama delegates here) feeds it wall seconds per generated token,
+        # which is comparable across short and long pages
+        ollama_limiter.observe((time.perf_counter() - started) / max(1, int(data.get("eval_count") or 0)))
     except httpx.HTTPError as e:
+        if isinstance(e, httpx.TimeoutException) or (
+            isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (429, 503)
+        ):
+            ollama_limiter.record_drop()  # overloaded
         raise LLMError(f"HTTP error calling Ollama: {e}") from e
     except Exception as e:
         raise LLMError(f"Unexpected error calling Ollama: {e}") from e
@@ -151,7 +208,17 @@ async def call_ollama(prompt: str, req: Dict[str, Any]) -> str:
     resp = data.get("response", "")
     if not isinstance(resp, str):
         raise LLMError("Ollama returned an invalid payload: missing 'response' string.")
-    return resp
+    return LLMReply(
+        text=resp,
+        model=model,
+        done_reason=data.get("done_reason"),
+        total_duration=int(data.get("total_duration") or 0),
+        load_duration=int(data.get("load_duration") or 0),
+        prompt_eval_count=int(data.get("prompt_eval_count") or 0),
+        prompt_eval_duration=int(data.get("prompt_eval_duration") or 0),
+        eval_count=int(data.get("eval_count") or 0),
+        eval_duration=int(data.get("eval_duration") or 0),
+    )
 
 # app/services/llm.py  (replace only this function)
 
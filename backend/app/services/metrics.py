@@ -0,0 +1,180 @@
+# app/services/metrics.py
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Minimal Prometheus text-format instrumentation.
+# Recording is a dict lookup plus a few integer/float additions on preallocated
+# lists, with no locks: every observation happens on the event loop thread.
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+FAST_BUCKETS: Tuple[float, ...] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+SCORE_BUCKETS: Tuple[float, ...] = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0)
+TOKENS_PER_SECOND_BUCKETS: Tuple[float, ...] = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500, 1000, 2000, 5000)
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = float(value)
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], _HistogramChild] = {}
+        if not self.labelnames:
+            self._children[()] = _HistogramChild(len(self.bounds) + 1)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _HistogramChild(len(self.bounds) + 1)
+        # counts are per bucket (not cumulative) so an observation touches one slot
+        child.counts[bisect_left(self.bounds, value)] += 1
+        child.sum += value
+        child.count += 1
+
+    def count(self, **labels: str) -> int:
+        child = self._children.get(self._key(labels))
+        return child.count if child else 0
+
+    def render(self) -> List[str]:
+        lines: List[str] = []
+        for key, child in self._children.items():
+            running = 0
+            for bound, c in zip(self.bounds + (float("inf"),), child.counts):
+                running += c
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {child.count}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    out: List[str] = []
+    for m in REGISTRY:
+        out.extend(m.header())
+        out.extend(m.render())
+    return "\n".join(out) + "\n"
+
+
+# ---------- Application metrics ----------
+QUEUE_WAIT = Histogram("ai_queue_wait_seconds", "Time a job spent in the scheduler queue.")
+LLM_CALL = Histogram("ai_llm_call_seconds", "Latency of a single Ollama generate call.", labelnames=("model",))
+SANITIZE_TIME = Histogram("ai_sanitize_seconds", "Time spent in sanitize_model_output.", buckets=FAST_BUCKETS)
+VALIDATE_TIME = Histogram("ai_validate_seconds", "Time spent in score_compliance.", buckets=FAST_BUCKETS)
+JOB_DURATION = Histogram("ai_job_duration_seconds", "End-to-end job duration from creation to terminal status.", labelnames=("status",))
+COMPLIANCE_SCORE = Histogram("ai_compliance_score", "Compliance score of each validated attempt.", buckets=SCORE_BUCKETS)
+EVAL_TOKENS_PER_SECOND = Histogram("ai_llm_eval_tokens_per_second", "Decode throughput reported by Ollama.", buckets=TOKENS_PER_SECOND_BUCKETS, labelnames=("model",))
+PROMPT_TOKENS_PER_SECOND = Histogram("ai_llm_prompt_tokens_per_second", "Prefill throughput reported by Ollama.", buckets=TOKENS_PER_SECOND_BUCKETS + (10000, 20000), labelnames=("model",))
+
+POSTPROCESS_WAIT = Histogram("ai_postprocess_wait_seconds", "Time a document waited for a post-processing executor slot.", buckets=FAST_BUCKETS, labelnames=("mode",))
+POSTPROCESS_COMPUTE = Histogram("ai_postprocess_compute_seconds", "Sanitize + validate compute time per document.", buckets=FAST_BUCKETS, labelnames=("mode",))
+POSTPROCESS_PENDING = Gauge("ai_postprocess_pending", "Documents currently submitted to the post-processing executor.")
+
+ATTEMPTS = Counter("ai_generation_attempts_total", "LLM attempts started.", labelnames=("model",))
+RETRIES = Counter("ai_generation_retries_total", "Attempts that were retried after a rejected result.")
+TIMEOUTS = Counter("ai_generation_timeouts_total", "Attempts that hit GENERATION_TIMEOUT_SECONDS.")
+LLM_ERRORS = Counter("ai_llm_errors_total", "LLMError raised while calling Ollama.")
+EVAL_TOKENS = Counter("ai_llm_eval_tokens_total", "Tokens generated by Ollama.", labelnames=("model",))
+PROMPT_TOKENS = Counter("ai_llm_prompt_tokens_total", "Prompt tokens evaluated by Ollama.", labelnames=("model",))
+JOBS = Counter("ai_jobs_total", "Jobs reaching a terminal status.", labelnames=("status",))
+DEADLINE_EXCEEDED = Counter("ai_job_deadline_exceeded_total", "Jobs that ran out of their deadline budget.", labelnames=("stage",))
+MINIFY_TIME = Histogram("ai_minify_seconds", "Time spent minifying and re-validating a passing page.", buckets=FAST_BUCKETS)
+MINIFY_BYTES_SAVED = Counter("ai_minify_bytes_saved_total", "Bytes removed from stored pages by minification.")
+MINIFY_FALLBACKS = Counter("ai_minify_fallbacks_total", "Minified pages rejected because their compliance score changed.")
+SIMILARITY_LOOKUP = Histogram("ai_similarity_lookup_seconds", "Latency of a similarity cache lookup.", buckets=FAST_BUCKETS)
+SIMILARITY_LOOKUPS = Counter("ai_similarity_lookups_total", "Similarity cache lookups.", labelnames=("result",))
+CANCELLATIONS = Counter("ai_jobs_cancelled_total", "Jobs cancelled before completion.", labelnames=("reason", "stage"))
+LOOP_LAG = Histogram("ai_event_loop_lag_seconds", "How late the event loop ran a timer that was due (sampled).", buckets=FAST_BUCKETS + (2.5, 5, 10))
+SLOW_CALLBACKS = Counter("ai_event_loop_stalls_total", "Times the event loop was blocked longer than DIAG_SLOW_CALLBACK_SECONDS.")
+OLLAMA_LIMIT = Gauge("ai_ollama_concurrency_limit", "Current adaptive limit on concurrent Ollama requests (0 = disabled).")
+OLLAMA_IN_FLIGHT = Gauge("ai_ollama_in_flight", "Ollama requests currently holding a limiter slot.")
+OLLAMA_LIMIT_DROPS = Counter("ai_ollama_limit_drops_total", "Timeouts/overload errors that decreased the Ollama concurrency limit.")
+OLLAMA_LIMIT_WAIT = Histogram("ai_ollama_limit_wait_seconds", "Time a request waited for an Ollama concurrency slot.")
+WEBHOOK_ATTEMPT = Histogram("ai_webhook_attempt_seconds", "Latency of a single completion callback POST.")
+WEBHOOK_DELIVERIES = Counter("ai_webhook_deliveries_total", "Completion callback outcomes (delivered, retried, failed, dropped).", labelnames=("result",))
+
+
+def observe_llm_reply(reply) -> None:
+    """Record token counters and throughput from an LLMReply."""
+    model = reply.model
+    if reply.eval_count:
+        EVAL_TOKENS.inc(reply.eval_count, model=model)
+        if reply.eval_duration:
+            EVAL_TOKENS_PER_SECOND.observe(reply.eval_count / (reply.eval_duration / 1e9), model=model)
+    if reply.prompt_eval_count:
+        PROMPT_TOKENS.inc(reply.prompt_eval_count, model=model)
+        if reply.prompt_eval_duration:
+            PROMPT_TOKENS_PER_SECOND.observe(reply.prompt_eval_count / (reply.prompt_eval_duration / 1e9), model=model)
@@ -0,0 +1,330 @@
+# app/services/minify.py
+import os
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, List
+
+# Optional output optimization applied after validation (see postprocess.py).
+# Everything here is a linear scanner: the input is untrusted model output and
+# must not be able to trigger regex backtracking on large documents.
+MINIFY_OUTPUT = os.getenv("GEN_MINIFY_OUTPUT", "0") == "1"
+# Decimal places kept in SVG geometry attributes (path data, points, transforms...).
+SVG_PRECISION = int(os.getenv("GEN_MINIFY_SVG_PRECISION", "2"))
+
+# A tag is "<" name, then attributes up to the first ">" outside quotes. The
+# attribute part is found by _TagEnds, not by one regex per "<": a regex that
+# fails (no ">", unclosed quote) rescans to the end of the document each time.
+_TAG_NAME = re.compile(r"<(/?)([A-Za-z][\w:.-]*)")
+_TAG_SPECIAL = re.compile(r"[>\"']")
+_ATTR_TOKENS = re.compile(r"\s+|\"[^\"]*\"|'[^']*'|[^\s\"']+")
+_WS = re.compile(r"\s+")
+_SVG_GEOMETRY_ATTRS = (
+    "d|points|transform|x|y|x1|x2|y1|y2|cx|cy|r|rx|ry|fx|fy|width|height|viewBox|stroke-width|offset"
+)
+_SVG_ATTR = re.compile(r"(\s(?:%s)\s*=\s*)(\"[^\"]*\"|'[^']*')" % _SVG_GEOMETRY_ATTRS)
+_DECIMAL = re.compile(r"\d*\.\d+(?![\deE])")
+_JS_TYPES = ("", "text/javascript", "application/javascript", "module")
+# after these, a "/" starts a regular expression literal rather than a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = ("return", "typeof", "case", "do", "else", "in", "of", "void", "yield", "await", "delete")
+
+
+def _collapse_text(text: str) -> str:
+    return _WS.sub(" ", text)
+
+
+def _collapse_attrs(attrs: str) -> str:
+    parts = [" " if tok[0].isspace() else tok for tok in _ATTR_TOKENS.findall(attrs)]
+    out = "".join(parts).rstrip()
+    if out.endswith(" /"):
+        out = out[:-2] + "/"
+    return out
+
+
+def _round_numbers(value: str, precision: int) -> str:
+    def repl(m: "re.Match[str]") -> str:
+        num = m.group(0)
+        if len(num) - num.index(".") - 1 <= precision:
+            return num
+        out = ("%.*f" % (precision, float(num))).rstrip("0").rstrip(".") or "0"
+        if out.startswith("0.") and m.start() > 0 and not value[m.start() - 1].isdigit():
+            out = out[1:]  # 0.5 -> .5 unless it would merge with a preceding digit
+        if "." not in out and value[m.end():m.end() + 1] == ".":
+            out += " "  # "1" followed by ".5" would read as 1.5
+        return out
+
+    return _DECIMAL.sub(repl, value)
+
+
+def _round_svg_attrs(attrs: str, precision: int) -> str:
+    def repl(m: "re.Match[str]") -> str:
+        quoted = m.group(2)
+        return m.group(1) + quoted[0] + _round_numbers(quoted[1:-1], precision) + quoted[0]
+
+    return _SVG_ATTR.sub(repl, attrs)
+
+
+def minify_css(css: str) -> str:
+    """Drop comments and redundant whitespace; strings are copied verbatim."""
+    out: List[str] = []  # a string literal is always one item, so out[-1] checks never look inside it
+    i, n = 0, len(css)
+
+    def space() -> None:
+        # spaces next to { } ; , never matter in CSS
+        if out and out[-1] not in (" ", "{", "}", ";", ","):
+            out.append(" ")
+
+    while i < n:
+        c = css[i]
+        if c in "\"'":
+            j = i + 1
+            while j < n and css[j] != c:
+                j += 2 if css[j] == "\\" else 1
+            out.append(css[i:j + 1])
+            i = j + 1
+        elif css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            space()
+        elif c.isspace():
+            while i < n and css[i].isspace():
+                i += 1
+            space()
+        else:
+            if c in "{};,":
+                if out and out[-1] == " ":
+                    out.pop()
+                if c == "}" and out and out[-1] == ";":
+                    out.pop()
+            out.append(c)
+            i += 1
+    return "".join(out).strip()
+
+
+def _regex_allowed(out: List[str]) -> bool:
+    prev = "".join(out[-12:]).rstrip()
+    if not prev or prev[-1] in _REGEX_PRECEDERS:
+        return True
+    word = re.search(r"[\w$]+$", prev)
+    return word is not None and word.group(0) in _REGEX_KEYWORDS
+
+
+def minify_js(js: str) -> str:
+    """
+    Removes // and /* */ comments, indentation and blank lines. Newlines are
+    kept (automatic semicolon insertion); strings, template literals and
+    regular expression literals are copied verbatim.
+    """
+    out: List[str] = []
+    i, n = 0, len(js)
+    templates: List[int] = []  # brace depth at each open `${`
+    depth = 0
+    line_start = True
+
+    def newline() -> None:
+        nonlocal line_start
+        while out and out[-1] in (" ", "\t"):
+            out.pop()
+        if out and out[-1] != "\n":
+            out.append("\n")
+        line_start = True
+
+    def scan_template(j: int) -> int:
+        """Copies template text from j; returns index after the closing backtick or `${`."""
+        nonlocal depth
+        while j < n:
+            ch = js[j]
+            if ch == "\\":
+                out.append(js[j:j + 2])
+                j += 2
+            elif ch == "`":
+                out.append(ch)
+                return j + 1
+            elif js.startswith("${", j):
+                out.append("${")
+                templates.append(depth)
+                return j + 2
+            else:
+                out.append(ch)
+                j += 1
+        return j
+
+    while i < n:
+        c = js[i]
+        if c == "\n" or c == "\r":
+            newline()
+            i += 1
+            continue
+        if c in " \t":
+            if not line_start and out and out[-1] != " ":
+                out.append(" ")
+            i += 1
+            continue
+        line_start = False
+        if c in "\"'":
+            j = i + 1
+            while j < n and js[j] != c and js[j] != "\n":
+                j += 2 if js[j] == "\\" else 1
+            out.append(js[i:j + 1])
+            i = j + 1
+        elif c == "`":
+            out.append(c)
+            i = scan_template(i + 1)
+        elif c == "{":
+            depth += 1
+            out.append(c)
+            i += 1
+        elif c == "}":
+            if templates and templates[-1] == depth:
+                templates.pop()
+                out.append(c)
+                i = scan_template(i + 1)
+            else:
+                depth -= 1
+                out.append(c)
+                i += 1
+        elif js.startswith("//", i):
+            end = js.find("\n", i)
+            i = n if end < 0 else end
+        elif js.startswith("/*", i):
+            end = js.find("*/", i + 2)
+            body = js[i:n if end < 0 else end]
+            i = n if end < 0 else end + 2
+            if "\n" in body:
+                newline()
+            elif out and out[-1] != " ":
+                out.append(" ")
+        elif c == "/" and _regex_allowed(out):
+            j, in_class = i + 1, False
+            while j < n and js[j] != "\n":
+                ch = js[j]
+                if ch == "\\":
+                    j += 2
+                    continue
+                if ch == "[":
+                    in_class = True
+                elif ch == "]":
+                    in_class = False
+                elif ch == "/" and not in_class:
+                    break
+                j += 1
+            out.append(js[i:j + 1])
+            i = j + 1
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out).strip()
+
+
+class _TagEnds:
+    """
+    Where the attributes starting at a given index end: the first ">" outside
+    quoted strings, or -1 for an unclosed quote or no ">" at all. Every ">"
+    and quote of the document is visited once in total, however many "<"
+    fail to start a tag.
+    """
+
+    def __init__(self, html: str) -> None:
+        self._html = html
+        self._special = [m.start() for m in _TAG_SPECIAL.finditer(html)]
+        self._quotes = {q: [i for i in self._special if html[i] == q] for q in "\"'"}
+        self._memo: Dict[int, int] = {}  # index into _special -> result from there
+
+    def find(self, start: int) -> int:
+        special, idx = self._special, bisect_left(self._special, start)
+        path: List[int] = []
+        result = -1
+        while idx < len(special):
+            if idx in self._memo:
+                result = self._memo[idx]
+                break
+            path.append(idx)
+            pos = special[idx]
+            ch = self._html[pos]
+            if ch == ">":
+                result = pos
+                break
+            quotes = self._quotes[ch]
+            k = bisect_right(quotes, pos)
+            if k == len(quotes):
+                break  # unclosed quote
+            idx = bisect_right(special, quotes[k])
+        for p in path:
+            self._memo[p] = result
+        return result
+
+
+def _raw_end(html: str, low: str, start: int, name: str) -> int:
+    end = low.find("</" + name, start)
+    return len(html) if end < 0 else end
+
+
+def minify_html(html: str, svg_precision: int = SVG_PRECISION) -> str:
+    """
+    Collapses whitespace outside <pre>/<textarea>, strips HTML comments (except
+    conditional ones), minifies <style>/<script> bodies and rounds SVG geometry
+    to `svg_precision` decimals. Anything it cannot parse is copied verbatim.
+    """
+    low = html.lower()
+    out: List[str] = []
+    i, n = 0, len(html)
+    svg_depth = 0
+    tag_ends = _TagEnds(html)
+
+    def text(chunk: str) -> None:
+        chunk = _collapse_text(chunk)
+        if chunk.startswith(" ") and out and out[-1].endswith(" "):
+            chunk = chunk[1:]  # e.g. "a <!-- x --> b"
+        if chunk:
+            out.append(chunk)
+
+    while i < n:
+        lt = html.find("<", i)
+        if lt < 0:
+            text(html[i:])
+            break
+        if lt > i:
+            text(html[i:lt])
+        if html.startswith("<!--", lt):
+            end = html.find("-->", lt + 4)
+            if end < 0:
+                out.append(html[lt:])
+                break
+            if html.startswith("<!--[if", lt):
+                out.append(html[lt:end + 3])
+            i = end + 3
+            continue
+        if html.startswith("<!", lt):
+            end = html.find(">", lt)
+            end = n if end < 0 else end + 1
+            out.append(_collapse_text(html[lt:end]))
+            i = end
+            continue
+        m = _TAG_NAME.match(html, lt)
+        gt = tag_ends.find(m.end()) if m is not None else -1
+        if gt < 0:
+            out.append("<")
+            i = lt + 1
+            continue
+        closing, name, attrs = m.group(1), m.group(2).lower(), html[m.end():gt]
+        if name == "svg" and not attrs.rstrip().endswith("/"):
+            svg_depth += -1 if closing else 1
+        attrs = _collapse_attrs(attrs)
+        if svg_depth > 0 or name == "svg":
+            attrs = _round_svg_attrs(attrs, svg_precision)
+        out.append("<" + closing + m.group(2) + attrs + ">")
+        i = gt + 1
+        if closing or name not in ("script", "style", "pre", "textarea"):
+            continue
+
+        end = _raw_end(html, low, i, name)
+        body = html[i:end]
+        if name == "style":
+            body = minify_css(body)
+        elif name == "script":
+            type_m = re.search(r"\btype\s*=\s*[\"']?([^\"'\s>]*)", attrs, re.IGNORECASE)
+            if (type_m.group(1).lower() if type_m else "") in _JS_TYPES:
+                body = minify_js(body)
+        out.append(body)
+        i = end
+    return "".join(out).strip()
@@ -0,0 +1,252 @@
+# app/services/postprocess.py
+import asyncio
+import multiprocessing
+import os
+import time
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from ..schemas import GenerateRequest
+from .llm import sanitize_model_output
+from .minify import minify_html
+from .validator import score_compliance
+from . import metrics
+
+# CPU-bound post-processing (sanitize + validate) of model output.
+# Small outputs are handled inline on the event loop; anything at or above
+# GEN_POSTPROCESS_INLINE_MAX_BYTES goes to a thread or process pool so /result
+# polls and /health keep being served while a large page is validated.
+# The `re` engine holds the GIL for the whole of a single match, so only the
+# process pool fully isolates the loop from one pathological regex pass.
+POSTPROCESS_EXECUTOR = os.getenv("GEN_POSTPROCESS_EXECUTOR", "process").lower()  # process | thread | inline
+POSTPROCESS_WORKERS = int(os.getenv("GEN_POSTPROCESS_WORKERS", "2"))
+POSTPROCESS_INLINE_MAX_BYTES = int(os.getenv("GEN_POSTPROCESS_INLINE_MAX_BYTES", "32768"))
+# Maximum documents submitted to the pool at once; further jobs wait their turn.
+POSTPROCESS_MAX_PENDING = int(os.getenv("GEN_POSTPROCESS_MAX_PENDING", "8"))
+# Give up on a document the pool has not finished within this many seconds (0 = wait forever).
+# In process mode the pool is replaced, which stops the runaway worker.
+POSTPROCESS_TIMEOUT_SECONDS = float(os.getenv("GEN_POSTPROCESS_TIMEOUT_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+class PostProcessTimeout(Exception):
+    """Sanitize/validate of one document took longer than GEN_POSTPROCESS_TIMEOUT_SECONDS."""
+
+
+def _is_full_html(doc: str) -> bool:
+    if not doc:
+        return False
+    low = doc.strip().lower()
+    return low.startswith("<!doctype html") and "</html>" in low
+
+
+def _score_html(html: str, req: GenerateRequest, expected_svgs: Optional[int]) -> Tuple[float, List[str]]:
+    """
+    Compatibility shim: tries multiple known signatures for score_compliance.
+    Supports:
+      - score_compliance(html, require_inline_assets=..., require_semantics=..., expected_svgs=...)
+      - score_compliance(html, req)
+      - score_compliance(html)
+    Each may return:
+      - float
+      - (float,)
+      - (float, issues)
+    """
+    # 1) Preferred signature with kwargs
+    try:
+        sc = score_compliance(
+            html,
+            require_inline_assets=True,
+            require_semantics=True,
+            expected_svgs=expected_svgs,
+        )
+        if isinstance(sc, tuple):
+            score = float(sc[0])
+            issues = list(sc[1]) if len(sc) > 1 and isinstance(sc[1], (list, tuple)) else []
+            return score, issues
+        return float(sc), []
+    except TypeError:
+        pass
+
+    # 2) Signature (html, req)
+    try:
+        sc = score_compliance(html, req)
+        if isinstance(sc, tuple):
+            score = float(sc[0])
+            issues = list(sc[1]) if len(sc) > 1 and isinstance(sc[1], (list, tuple)) else []
+            return score, issues
+        return float(sc), []
+    except TypeError:
+        pass
+
+    # 3) Signature (html)
+    sc = score_compliance(html)
+    if isinstance(sc, tuple):
+        score = float(sc[0])
+        issues = list(sc[1]) if len(sc) > 1 and isinstance(sc[1], (list, tuple)) else []
+        return score, issues
+    return float(sc), []
+
+
+@dataclass
+class PostProcessResult:
+    html: str
+    score: float
+    issues: List[str] = field(default_factory=list)
+    sanitize_seconds: float = 0.0
+    validate_seconds: float = 0.0
+    started_at: float = 0.0  # time.monotonic() when the worker picked the document up
+    wait_seconds: float = 0.0  # filled in by PostProcessor
+    mode: str = "inline"
+    minify_seconds: float = 0.0
+    bytes_saved: int = 0
+    minify_fallback: bool = False  # minified page scored differently, original kept
+
+
+def postprocess_output(
+    raw: str,
+    req: GenerateRequest,
+    expected_svgs: Optional[int],
+    minify_min_score: Optional[float] = None,
+) -> PostProcessResult:
+    """
+    Sanitize the raw model text and score it. When `minify_min_score` is set and
+    the page reaches it, the page is minified too, but only kept if the minified
+    version scores identically. Module level so it pickles for process pools.
+    """
+    started = time.monotonic()
+    t0 = time.perf_counter()
+    html = sanitize_model_output(raw)
+    t1 = time.perf_counter()
+    if not _is_full_html(html):
+        raise ValueError("Model did not return a full HTML document.")
+    fenced_for_validator = f"```html\n{html}\n```"
+    score, issues = _score_html(fenced_for_validator, req, expected_svgs)
+    t2 = time.perf_counter()
+    res = PostProcessResult(
+        html=html,
+        score=score,
+        issues=issues,
+        sanitize_seconds=t1 - t0,
+        validate_seconds=t2 - t1,
+        started_at=started,
+    )
+    if minify_min_score is not None and score >= minify_min_score:
+        candidate = minify_html(html)
+        if len(candidate) < len(html):
+            m_score, m_issues = _score_html(f"```html\n{candidate}\n```", req, expected_svgs)
+            if m_score == score and m_issues == issues:
+                res.html = candidate
+                res.bytes_saved = len(html.encode("utf-8")) - len(candidate.encode("utf-8"))
+            else:
+                res.minify_fallback = True
+        res.minify_seconds = time.perf_counter() - t2
+    return res
+
+
+class PostProcessor:
+    def __init__(
+        self,
+        mode: str = POSTPROCESS_EXECUTOR,
+        workers: int = POSTPROCESS_WORKERS,
+        inline_max_bytes: int = POSTPROCESS_INLINE_MAX_BYTES,
+        max_pending: int = POSTPROCESS_MAX_PENDING,
+        timeout: float = POSTPROCESS_TIMEOUT_SECONDS,
+    ) -> None:
+        self.mode = mode if mode in ("thread", "process", "inline") else "process"
+        self.workers = max(1, workers)
+        self.inline_max_bytes = inline_max_bytes
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self.pool_restarts = 0
+        self._pool: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+
+    def _executor(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                # spawn: never fork a process that is running an event loop and threads
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="postprocess")
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _discard(self, pool: Executor) -> None:
+        """Drops `pool` (if still current) so the next call builds a fresh one."""
+        if self._pool is not pool:
+            return  # another caller already replaced it
+        self._pool = None
+        self.pool_restarts += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+        if isinstance(pool, ProcessPoolExecutor):
+            # shutdown() does not stop a worker stuck in a pathological regex
+            for proc in list((getattr(pool, "_processes", None) or {}).values()):
+                proc.terminate()
+
+    async def _in_executor(self, *args) -> PostProcessResult:
+        loop = asyncio.get_running_loop()
+        for attempt in (1, 2):
+            pool = self._executor()
+            try:
+                fut = loop.run_in_executor(pool, postprocess_output, *args)
+                if self.timeout > 0:
+                    return await asyncio.wait_for(fut, self.timeout)
+                return await fut
+            except BrokenProcessPool:
+                # a worker died (OOM kill, segfault): the executor is unusable from now on
+                self._discard(pool)
+                if attempt == 2:
+                    raise
+                logger.warning("[postprocess] process pool broken, retrying on a new pool")
+            except asyncio.TimeoutError:
+                self._discard(pool)
+                raise PostProcessTimeout(f"Post-processing exceeded {self.timeout:g}s") from None
+        raise AssertionError("unreachable")
+
+    async def run(
+        self,
+        raw: str,
+        req: GenerateRequest,
+        expected_svgs: Optional[int],
+        minify_min_score: Optional[float] = None,
+    ) -> PostProcessResult:
+        if self.mode == "inline" or len(raw) < self.inline_max_bytes:
+            res = postprocess_output(raw, req, expected_svgs, minify_min_score)
+        else:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.max_pending)
+            submitted = time.monotonic()
+            async with self._slots:
+                self.pending += 1
+                metrics.POSTPROCESS_PENDING.set(self.pending)
+                try:
+                    res = await self._in_executor(raw, req, expected_svgs, minify_min_score)
+                finally:
+                    self.pending -= 1
+                    metrics.POSTPROCESS_PENDING.set(self.pending)
+            res.mode = self.mode
+            res.wait_seconds = max(0.0, res.started_at - submitted)
+
+        metrics.SANITIZE_TIME.observe(res.sanitize_seconds)
+        metrics.VALIDATE_TIME.observe(res.validate_seconds)
+        metrics.POSTPROCESS_WAIT.observe(res.wait_seconds, mode=res.mode)
+        metrics.POSTPROCESS_COMPUTE.observe(res.sanitize_seconds + res.validate_seconds, mode=res.mode)
+        if res.minify_seconds:
+            metrics.MINIFY_TIME.observe(res.minify_seconds)
+            metrics.MINIFY_BYTES_SAVED.inc(res.bytes_saved)
+            if res.minify_fallback:
+                metrics.MINIFY_FALLBACKS.inc()
+        return res
+
+
+postprocessor = PostProcessor()
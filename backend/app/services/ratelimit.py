@@ -0,0 +1,188 @@
+# app/services/ratelimit.py
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+# Admission control for POST /generate. Each client key owns two token buckets:
+# one refilled in requests/second, one in estimated LLM tokens/minute.
+# A limit of 0 disables that bucket; both at 0 disables rate limiting entirely.
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_TOKENS_PER_MIN = float(os.getenv("RATE_LIMIT_TOKENS_PER_MIN", "0"))
+RATE_LIMIT_TOKEN_BURST = float(os.getenv("RATE_LIMIT_TOKEN_BURST", "0"))  # 0 -> one minute worth
+# Buckets untouched for this long are full again and are dropped.
+RATE_LIMIT_IDLE_SECONDS = float(os.getenv("RATE_LIMIT_IDLE_SECONDS", "300"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+# "local" keeps buckets in this process; "store" keeps them in the job store
+# backend so every worker process sharing that store sees the same limits.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local").lower()
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    rps: float
+    burst: float
+    tokens_per_min: float
+    token_burst: float
+
+    @property
+    def enabled(self) -> bool:
+        return self.rps > 0 or self.tokens_per_min > 0
+
+    def exceeds_burst(self, requests: float, tokens: float) -> Optional[str]:
+        """Which bucket could never hold a batch of this size ("rps" | "tokens"), if any."""
+        if self.rps > 0 and requests > self.burst:
+            return "rps"
+        if self.tokens_per_min > 0 and tokens > self.token_burst:
+            return "tokens"
+        return None
+
+
+@dataclass
+class RateDecision:
+    allowed: bool
+    retry_after: float = 0.0
+    reason: Optional[str] = None  # "rps" | "tokens"
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def default_limits() -> RateLimits:
+    token_burst = RATE_LIMIT_TOKEN_BURST or RATE_LIMIT_TOKENS_PER_MIN
+    return RateLimits(
+        rps=RATE_LIMIT_RPS,
+        burst=max(1.0, RATE_LIMIT_BURST),
+        tokens_per_min=RATE_LIMIT_TOKENS_PER_MIN,
+        token_burst=token_burst,
+    )
+
+
+class BucketTable:
+    """
+    Bounded map of client key -> (request tokens, llm tokens, last refill time).
+    Keys are kept in access order, so idle eviction only ever looks at the head.
+    """
+
+    def __init__(self, idle_seconds: float = RATE_LIMIT_IDLE_SECONDS, max_keys: int = RATE_LIMIT_MAX_KEYS) -> None:
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._idle = idle_seconds
+        self._max_keys = max(1, max_keys)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, (_, _, last) = next(iter(self._buckets.items()))
+            if now - last < self._idle and len(self._buckets) < self._max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+    def take(self, key: str, limits: RateLimits, cost: float, now: float, requests: float = 1.0) -> RateDecision:
+        """Debits `requests` request tokens (one per job) and `cost` LLM tokens, or neither."""
+        self._evict(now)
+        req_tokens, llm_tokens, last = self._buckets.pop(key, (limits.burst, limits.token_burst, now))
+        elapsed = max(0.0, now - last)
+        if limits.rps > 0:
+            req_tokens = min(limits.burst, req_tokens + elapsed * limits.rps)
+        if limits.tokens_per_min > 0:
+            llm_tokens = min(limits.token_burst, llm_tokens + elapsed * limits.tokens_per_min / 60.0)
+            # a single request larger than the bucket is admitted once the bucket is full
+            cost = min(cost, limits.token_burst)
+
+        decision = RateDecision(allowed=True)
+        if limits.rps > 0 and req_tokens < requests:
+            decision = RateDecision(False, (requests - req_tokens) / limits.rps, "rps")
+        if limits.tokens_per_min > 0 and llm_tokens < cost:
+            wait = (cost - llm_tokens) * 60.0 / limits.tokens_per_min
+            if decision.allowed or wait > decision.retry_after:
+                decision = RateDecision(False, wait, "tokens")
+
+        if decision.allowed:
+            if limits.rps > 0:
+                req_tokens -= requests
+            if limits.tokens_per_min > 0:
+                llm_tokens -= cost
+        self._buckets[key] = (req_tokens, llm_tokens, now)
+        return decision
+
+
+class RateLimiter:
+    """In-process limiter. All calls run on the event loop, so no lock is needed."""
+
+    def __init__(self, limits: Optional[RateLimits] = None, table: Optional[BucketTable] = None) -> None:
+        self.limits = limits or default_limits()
+        self._table = table or BucketTable()
+        self._allowed = 0
+        self._rejected: Dict[str, int] = {"rps": 0, "tokens": 0}
+
+    async def _take(self, key: str, cost: float, requests: float) -> RateDecision:
+        return self._table.take(key, self.limits, cost, time.monotonic(), requests)
+
+    async def check(self, key: str, estimated_tokens: float = 0.0, requests: float = 1.0) -> RateDecision:
+        """`requests` is the number of jobs admitted at once (a batch pays one per item)."""
+        if not self.limits.enabled:
+            return RateDecision(allowed=True)
+        decision = await self._take(key, estimated_tokens, requests)
+        if decision.allowed:
+            self._allowed += 1
+        else:
+            self._rejected[decision.reason or "rps"] += 1
+        return decision
+
+    def tracked_keys(self) -> int:
+        return len(self._table)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.limits.enabled,
+            "backend": "local",
+            "allowed": self._allowed,
+            "rejected": sum(self._rejected.values()),
+            "rejected_by_reason": dict(self._rejected),
+            "tracked_keys": self.tracked_keys(),
+        }
+
+
+class StoreRateLimiter(RateLimiter):
+    """
+    Keeps bucket state in the job store backend. Wall-clock time is used so that
+    buckets stay meaningful when several processes share that backend.
+    """
+
+    def __init__(self, store: Any = None, limits: Optional[RateLimits] = None) -> None:
+        super().__init__(limits)
+        self._store = store
+
+    @property
+    def store(self) -> Any:
+        if self._store is None:
+            # resolved lazily: the job store module imports this one
+            from .jobs import job_store
+            self._store = job_store
+        return self._store
+
+    async def _take(self, key: str, cost: float, requests: float) -> RateDecision:
+        return await self.store.rate_limit_take(key, self.limits, cost, time.time(), requests)
+
+    def tracked_keys(self) -> int:
+        return self.store.rate_limit_keys()
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = super().snapshot()
+        data["backend"] = "store"
+        return data
+
+
+def build_rate_limiter() -> RateLimiter:
+    if RATE_LIMIT_BACKEND == "store":
+        return StoreRateLimiter()
+    return RateLimiter()
+
+
+rate_limiter = build_rate_limiter()
@@ -2,12 +2,22 @@
 import asyncio
 import logging
 import os
+import time
 from typing import Optional, Tuple, List
 
 from ..schemas import GenerateRequest, GenerateResponse, JobStatus
 from .jobs import job_store
-from ..services.llm import call_ollama, build_prompt, LLMError, sanitize_model_output
-from ..services.validator import score_compliance
+from .scheduler import scheduler
+from ..services.llm import generate_completion, build_prompt, LLMError
+from .cascade import model_ladder
+from .concurrency import ollama_limiter
+from . import metrics
+from .trace import JobTrace
+from .postprocess import postprocessor
+from .minify import MINIFY_OUTPUT
+from .similarity import SimilarHit, similarity_cache
+from .windows import rolling_stats
+from .diagnostics import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -17,13 +27,6 @@ MAX_RETRIES = int(os.getenv("GEN_MAX_RETRIES", "5"))
 RETRY_BASE_DELAY_SECONDS = float(os.getenv("GEN_RETRY_BASE_DELAY_SECONDS", "1.0"))
 
 
-def _is_full_html(doc: str) -> bool:
-    if not doc:
-        return False
-    low = doc.strip().lower()
-    return low.startswith("<!doctype html") and "</html>" in low
-
-
 def _build_prompt_from_request(req: GenerateRequest) -> Tuple[str, Optional[int]]:
     previous_html = getattr(req, "previous_html", None)
     prompt = build_prompt(req.message, previous_html)
@@ -31,98 +34,157 @@ def _build_prompt_from_request(req: GenerateRequest) -> Tuple[str, Optional[int]
     return prompt, expected_svgs
 
 
-def _score_html(html: str, req: GenerateRequest, expected_svgs: Optional[int]) -> Tuple[float, List[str]]:
-    """
-    Compatibility shim: tries multiple known signatures for score_compliance.
-    Supports:
-      - score_compliance(html, require_inline_assets=..., require_semantics=..., expected_svgs=...)
-      - score_compliance(html, req)
-      - score_compliance(html)
-    Each may return:
-      - float
-      - (float,)
-      - (float, issues)
-    """
-    # 1) Preferred signature with kwargs
-    try:
-        sc = score_compliance(
-            html,
-            require_inline_assets=True,
-            require_semantics=True,
-            expected_svgs=expected_svgs,
-        )
-        if isinstance(sc, tuple):
-            score = float(sc[0])
-            issues = list(sc[1]) if len(sc) > 1 and isinstance(sc[1], (list, tuple)) else []
-            return score, issues
-        return float(sc), []
-    except TypeError:
-        pass
-
-    # 2) Signature (html, req)
+async def run_generation_job(job_id: str, req: GenerateRequest) -> None:
+    job = await job_store.get_job(job_id)
+    if job is None or not job.profile:
+        await _run_generation_job(job_id, req)
+        return
+    # X-Profile: sample this task's stacks; GET /result/{id}/profile serves them
+    task = asyncio.current_task()
+    profiler.watch(task)
     try:
-        sc = score_compliance(html, req)
-        if isinstance(sc, tuple):
-            score = float(sc[0])
-            issues = list(sc[1]) if len(sc) > 1 and isinstance(sc[1], (list, tuple)) else []
-            return score, issues
-        return float(sc), []
-    except TypeError:
-        pass
-
-    # 3) Signature (html)
-    sc = score_compliance(html)
-    if isinstance(sc, tuple):
-        score = float(sc[0])
-        issues = list(sc[1]) if len(sc) > 1 and isinstance(sc[1], (list, tuple)) else []
-        return score, issues
-    return float(sc), []
+        await _run_generation_job(job_id, req)
+    finally:
+        job.profile_result = profiler.unwatch(task)
 
 
-async def run_generation_job(job_id: str, req: GenerateRequest) -> None:
+async def _run_generation_job(job_id: str, req: GenerateRequest) -> None:
+    job = await job_store.get_job(job_id)
+    if job is not None and job.status != JobStatus.received:
+        # cancelled (or otherwise settled) between leaving the queue and starting
+        logger.info("[job %s] not starting: already %s", job_id, job.status.value)
+        return
+    trace = job.trace if job is not None else JobTrace()
+    deadline = job.deadline if job is not None else None
+    trace.mark("started")
     await job_store.set_status(job_id, JobStatus.processing)
     error: Optional[str] = None
     result_obj: Optional[GenerateResponse] = None
+    gpu_seconds = 0.0
+    attempt = 0
+
+    # minify only pages that pass, and never when the client asked for pretty output
+    minify_min_score = MIN_SCORE if MINIFY_OUTPUT and not req.pretty else None
 
     try:
         prompt, expected_svgs = _build_prompt_from_request(req)
         req_payload = req.model_dump() if hasattr(req, "model_dump") else req.dict()
 
         last_issues: List[str] = []
+        tier = model_ladder.start_tier()
         for attempt in range(1, MAX_RETRIES + 1):
+            model = model_ladder.model(tier)
+            timeout = GENERATION_TIMEOUT_SECONDS
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                # the first attempt gets whatever is left; retries only if a typical attempt still fits
+                if remaining <= 0 or (attempt > 1 and remaining < model_ladder.expected_attempt_seconds(tier)):
+                    metrics.DEADLINE_EXCEEDED.inc(stage="retry")
+                    trace.mark("deadline", attempt=attempt, remaining_s=round(remaining, 3))
+                    error = f"Job deadline exceeded before attempt {attempt}"
+                    if last_issues:
+                        error += ": " + "; ".join(last_issues)
+                    logger.info("[job %s] %s", job_id, error)
+                    break
+                timeout = min(timeout, remaining)
             try:
-                logger.info("[job %s] attempt %d: calling LLM", job_id, attempt)
-                raw = await asyncio.wait_for(
-                    call_ollama(prompt, req_payload),
-                    timeout=GENERATION_TIMEOUT_SECONDS,
+                logger.info("[job %s] attempt %d: calling LLM (%s)", job_id, attempt, model)
+                metrics.ATTEMPTS.inc(model=model)
+                if attempt > 1:
+                    metrics.RETRIES.inc()
+                llm_start = trace.now()
+                reply = await asyncio.wait_for(
+                    generate_completion(prompt, req_payload, model=model),
+                    timeout=timeout,
                 )
+                llm_end = trace.now()
+                metrics.LLM_CALL.observe(llm_end - llm_start, model=model)
+                rolling_stats.observe("llm", llm_end - llm_start)
+                metrics.observe_llm_reply(reply)
+                trace.span(
+                    "llm", llm_start, llm_end, attempt=attempt, model=model,
+                    prompt_tokens=reply.prompt_eval_count, eval_tokens=reply.eval_count,
+                    truncated=reply.truncated,
+                )
+                trace.llm_phases(reply, llm_start, attempt=attempt)
+                gpu_seconds += reply.gpu_seconds
 
-                html = sanitize_model_output(raw)
-
-                if not _is_full_html(html):
-                    raise ValueError("Model did not return a full HTML document.")
-
-                fenced_for_validator = f"```html\n{html}\n```"
-                score, issues = _score_html(fenced_for_validator, req, expected_svgs)
+                t0 = trace.now()
+                post = await postprocessor.run(reply.text, req, expected_svgs, minify_min_score)
+                html, score, issues = post.html, post.score, post.issues
+                metrics.COMPLIANCE_SCORE.observe(float(score))
+                rolling_stats.observe_score(float(score))
+                t_sanitize = t0 + post.wait_seconds
+                if post.wait_seconds:
+                    trace.span("postprocess.wait", t0, t_sanitize, attempt=attempt, mode=post.mode)
+                trace.span("sanitize", t_sanitize, t_sanitize + post.sanitize_seconds, attempt=attempt, bytes=len(reply.text))
+                t_validate = t_sanitize + post.sanitize_seconds
+                trace.span("validate", t_validate, t_validate + post.validate_seconds, attempt=attempt, score=round(float(score), 4))
+                if post.minify_seconds:
+                    t_minify = t_validate + post.validate_seconds
+                    trace.span(
+                        "minify", t_minify, t_minify + post.minify_seconds, attempt=attempt,
+                        bytes_saved=post.bytes_saved, fallback=post.minify_fallback,
+                    )
 
                 logger.info(
-                    "[job %s] attempt %d: score=%.3f, issues=%s",
-                    job_id, attempt, float(score), issues or "[]"
+                    "[job %s] attempt %d: model=%s score=%.3f, truncated=%s, issues=%s",
+                    job_id, attempt, model, float(score), reply.truncated, issues or "[]"
+                )
+
+                # A truncated answer is only acceptable when there is no larger tier left.
+                truncated = reply.truncated and model_ladder.can_escalate(tier)
+                passed = score >= MIN_SCORE and not truncated
+                model_ladder.record_attempt(
+                    tier, passed=passed, truncated=truncated, gpu_seconds=reply.gpu_seconds,
+                    seconds=trace.now() - llm_start,
                 )
 
-                if score < MIN_SCORE:
+                if not passed:
                     last_issues = issues or []
-                    await asyncio.sleep(RETRY_BASE_DELAY_SECONDS * attempt)
+                    if truncated:
+                        last_issues = last_issues + ["Output truncated (num_predict exhausted)."]
+                    if model_ladder.can_escalate(tier):
+                        # a different model is a fresh start, no backoff needed
+                        tier = model_ladder.escalate(tier)
+                    else:
+                        delay = RETRY_BASE_DELAY_SECONDS * attempt
+                        if deadline is not None and deadline - time.monotonic() - delay < model_ladder.expected_attempt_seconds(tier):
+                            delay = 0.0  # the budget is better spent on the attempt itself
+                        if delay:
+                            await asyncio.sleep(delay)
                     continue
 
                 result_obj = GenerateResponse(error=False, html=html, detail=None)
+                if similarity_cache.enabled and similarity_cache.eligible(req):
+                    similarity_cache.add(req.message, html)
                 break
 
             except asyncio.TimeoutError:
-                error = f"Generation timed out after {GENERATION_TIMEOUT_SECONDS}s"
+                metrics.TIMEOUTS.inc()
+                trace.span("llm", llm_start, trace.now(), attempt=attempt, model=model, timeout=True)
+                # the attempt would have taken at least this long: a slow model must
+                # raise the estimate that decides whether another attempt fits
+                model_ladder.record_attempt(
+                    tier, passed=False, error=True,
+                    seconds=max(trace.now() - llm_start, model_ladder.expected_attempt_seconds(tier)),
+                )
+                ollama_limiter.record_drop()
+                if timeout < GENERATION_TIMEOUT_SECONDS:
+                    metrics.DEADLINE_EXCEEDED.inc(stage="attempt")
+                    error = f"Job deadline exceeded during attempt {attempt}"
+                else:
+                    error = f"Generation timed out after {GENERATION_TIMEOUT_SECONDS}s"
                 logger.warning("[job %s] timeout: %s", job_id, error)
                 break
             except LLMError as e:
+                metrics.LLM_ERRORS.inc()
+                trace.span("llm", llm_start, trace.now(), attempt=attempt, model=model, error=str(e)[:200])
+                model_ladder.record_attempt(tier, passed=False, error=True)
+                if model_ladder.can_escalate(tier):
+                    logger.warning("[job %s] LLMError on %s, escalating: %s", job_id, model, e)
+                    tier = model_ladder.escalate(tier)
+                    continue
                 error = str(e)
                 logger.error("[job %s] LLMError: %s", job_id, error)
                 break
@@ -136,10 +198,22 @@ async def run_generation_job(job_id: str, req: GenerateRequest) -> None:
             error = issue_text
             logger.info("[job %s] final quality rejection: %s", job_id, error)
 
+    except asyncio.CancelledError:
+        # cancel_generation_job() already moved the job to `cancelled`
+        model_ladder.record_job(finished=False, gpu_seconds=gpu_seconds)
+        metrics.JOB_DURATION.observe(trace.now(), status=JobStatus.cancelled.value)
+        logger.info("[job %s] cancelled during attempt %d", job_id, attempt)
+        raise
     except Exception as e:
         error = f"Unhandled server error: {e}"
         logger.exception("[job %s] fatal exception", job_id)
 
+    model_ladder.record_job(finished=error is None, gpu_seconds=gpu_seconds)
+    final_status = JobStatus.failed if error else JobStatus.finished
+    metrics.JOBS.inc(status=final_status.value)
+    metrics.JOB_DURATION.observe(trace.now(), status=final_status.value)
+    trace.mark(final_status.value, attempts=attempt)
+
     if error:
         await job_store.set_result(job_id, None, error)
         await job_store.set_status(job_id, JobStatus.failed)
@@ -148,3 +222,61 @@ async def run_generation_job(job_id: str, req: GenerateRequest) -> None:
         await job_store.set_result(job_id, result_obj, None)
         await job_store.set_status(job_id, JobStatus.finished)
         logger.info("[job %s] finished with status=finished", job_id)
+
+
+async def cancel_generation_job(job_id: str, reason: str = "client") -> Optional[JobStatus]:
+    """
+    Cancels a queued or running job: the store moves it to `cancelled` first
+    (so late writes from the runner are ignored), then the scheduler drops it
+    from its queue or cancels its task, which aborts the HTTP call to Ollama.
+    Returns the status the job had, or None if it was already terminal.
+    """
+    prev = await job_store.cancel(job_id, reason)
+    if prev is None:
+        return None
+    stage = scheduler.cancel(job_id) or prev.value
+    job = await job_store.get_job(job_id)
+    if job is not None:
+        job.trace.mark(JobStatus.cancelled.value, reason=reason, stage=stage)
+    metrics.JOBS.inc(status=JobStatus.cancelled.value)
+    metrics.CANCELLATIONS.inc(reason=reason, stage=stage)
+    logger.info("[job %s] cancelled (%s) while %s", job_id, reason, stage)
+    return prev
+
+
+async def cancel_abandoned_jobs(idle_seconds: float) -> int:
+    """Abandonment policy: cancel jobs whose result has not been polled for idle_seconds."""
+    cancelled = 0
+    for job_id in await job_store.unpolled_jobs(idle_seconds):
+        if await cancel_generation_job(job_id, reason="abandoned") is not None:
+            cancelled += 1
+    return cancelled
+
+
+async def expire_generation_job(job_id: str) -> None:
+    """Fails a job whose deadline passed while it was still queued (never ran)."""
+    job = await job_store.get_job(job_id)
+    if job is None or job.status != JobStatus.received:
+        return
+    metrics.DEADLINE_EXCEEDED.inc(stage="queued")
+    metrics.JOBS.inc(status=JobStatus.failed.value)
+    metrics.JOB_DURATION.observe(job.trace.now(), status=JobStatus.failed.value)
+    job.trace.mark(JobStatus.failed.value, reason="deadline", attempts=0)
+    await job_store.set_result(job_id, None, "Job deadline exceeded while queued")
+    await job_store.set_status(job_id, JobStatus.failed)
+    logger.info("[job %s] deadline exceeded while queued", job_id)
+
+
+async def finish_from_similar(job_id: str, hit: SimilarHit) -> None:
+    """Completes a job with a validated page of a near-identical instruction (no GPU work)."""
+    job = await job_store.get_job(job_id)
+    similarity = round(hit.similarity, 4)
+    if job is not None:
+        job.trace.mark("similarity_hit", similarity=similarity)
+        job.trace.mark(JobStatus.finished.value, attempts=0)
+        metrics.JOB_DURATION.observe(job.trace.now(), status=JobStatus.finished.value)
+    metrics.JOBS.inc(status=JobStatus.finished.value)
+    result = GenerateResponse(error=False, html=hit.html, approximate=True, similarity=similarity)
+    await job_store.set_result(job_id, result, None)
+    await job_store.set_status(job_id, JobStatus.finished)
+    logger.info("[job %s] served from similarity cache (%.3f)", job_id, similarity)
@@ -0,0 +1,353 @@
+# app/services/scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..schemas import GenerateRequest
+from .concurrency import AdaptiveLimiter, ollama_limiter
+from .llm import estimate_job_tokens
+from . import metrics
+from .windows import rolling_stats
+
+logger = logging.getLogger(__name__)
+
+# Number of jobs processed concurrently. Everything above waits in the fair queue.
+# With OLLAMA_ADAPTIVE_LIMIT=1 the adaptive limit decides instead (up to OLLAMA_LIMIT_MAX).
+GEN_WORKERS = int(os.getenv("GEN_WORKERS", "2"))
+# Relative tenant shares, e.g. GEN_TENANT_WEIGHTS="frontend=4,batch-bot=1".
+# Unlisted tenants get weight 1.
+GEN_TENANT_WEIGHTS = os.getenv("GEN_TENANT_WEIGHTS", "")
+# Prefill is much cheaper than decoding; prompt tokens are discounted by this factor.
+PREFILL_COST_FACTOR = float(os.getenv("GEN_PREFILL_COST_FACTOR", "0.1"))
+# Aging inside a tenant's queue: every second of waiting counts as this many
+# decode tokens less, so a large refinement cannot be bypassed forever by a
+# steady stream of small jobs from the same tenant (0 = pure shortest-job-first).
+QUEUE_AGING_TOKENS_PER_SECOND = float(os.getenv("GEN_QUEUE_AGING_TOKENS_PER_SECOND", "20"))
+# Idle tenants (nothing queued or running) are forgotten past this many entries.
+MAX_TRACKED_TENANTS = int(os.getenv("GEN_MAX_TRACKED_TENANTS", "1000"))
+# How often queued jobs past their deadline are failed, even while every worker is busy.
+QUEUE_EXPIRY_SWEEP_SECONDS = float(os.getenv("GEN_QUEUE_EXPIRY_SWEEP_SECONDS", "1"))
+# Cancel queued/running jobs whose result nobody has polled for this long (0 = off).
+ABANDON_AFTER_SECONDS = float(os.getenv("GEN_ABANDON_AFTER_SECONDS", "0"))
+
+DEFAULT_TENANT = "anonymous"
+
+Runner = Callable[[str, GenerateRequest], Awaitable[None]]
+ExpiredHandler = Callable[[str], Awaitable[None]]
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, sep, value = part.partition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            w = float(value)
+        except ValueError:
+            continue
+        if w > 0:
+            weights[name.strip()] = w
+    return weights
+
+
+def estimate_job_cost(req: GenerateRequest) -> float:
+    """Expected job size in decode-token equivalents (shortest-job-first key)."""
+    prompt_tokens, output_tokens = estimate_job_tokens(req.message, req.previous_html)
+    return prompt_tokens * PREFILL_COST_FACTOR + output_tokens
+
+
+@dataclass
+class QueuedJob:
+    job_id: str
+    req: GenerateRequest
+    tenant: str
+    cost: float
+    enqueued_at: float
+    deadline: Optional[float] = None  # time.monotonic(); expired jobs are never dispatched
+
+
+@dataclass
+class TenantQueue:
+    name: str
+    weight: float
+    heap: List[Any] = field(default_factory=list)
+    vtime: float = 0.0  # virtual finish time of the last dispatched job
+    running: int = 0
+    enqueued: int = 0
+    dispatched: int = 0
+    expired: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    last_active: float = 0.0
+
+    @property
+    def idle(self) -> bool:
+        return not self.heap and self.running == 0
+
+
+class GenerationScheduler:
+    """
+    Weighted fair queuing across tenants with shortest-expected-job-first inside
+    each tenant. The next job comes from the backlogged tenant with the smallest
+    virtual time; dispatching a job advances that tenant's virtual time by
+    cost / weight, so each tenant gets GPU work proportional to its weight.
+    Within a tenant, a job's position improves by `aging` tokens per second
+    waited; since all entries age at the same rate, the heap key is simply
+    order + aging * enqueue time.
+    An enabled adaptive limiter caps how many jobs run at once: workers take a
+    limiter slot before popping, so excess jobs keep their place in the fair
+    queue and the wait never counts against an attempt's timeout.
+    """
+
+    def __init__(
+        self,
+        runner: Optional[Runner] = None,
+        workers: int = GEN_WORKERS,
+        weights: Optional[Dict[str, float]] = None,
+        on_expired: Optional[ExpiredHandler] = None,
+        aging: float = QUEUE_AGING_TOKENS_PER_SECOND,
+        expiry_sweep: float = QUEUE_EXPIRY_SWEEP_SECONDS,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ) -> None:
+        self._limiter = limiter if limiter is not None else ollama_limiter
+        self._expiry_sweep = expiry_sweep
+        self._runner = runner
+        self._aging = max(0.0, aging)
+        self._epoch = time.monotonic()
+        self._on_expired = on_expired
+        self._expired: List[QueuedJob] = []
+        self._workers = max(1, int(self._limiter.max_limit) if self._limiter.enabled else workers)
+        self._weights = weights if weights is not None else _parse_weights(GEN_TENANT_WEIGHTS)
+        self._tenants: Dict[str, TenantQueue] = {}
+        self._seq = itertools.count()
+        self._available: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}  # job_id -> task executing it
+        self._queued_tenant: Dict[str, str] = {}  # job_id -> tenant, for queued jobs
+        self._vclock = 0.0  # virtual time of the most recent dispatch
+        self._queued = 0
+
+    # ---- lifecycle ---------------------------------------------------------
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        if self._runner is None:
+            from .runner import run_generation_job
+            self._runner = run_generation_job
+        if self._on_expired is None:
+            from .runner import expire_generation_job
+            self._on_expired = expire_generation_job
+        self._ensure_semaphore()
+        self._tasks = [asyncio.create_task(self._worker_loop(i)) for i in range(self._workers)]
+        if self._expiry_sweep > 0:
+            self._tasks.append(asyncio.create_task(self._expiry_loop(self._expiry_sweep)))
+        if ABANDON_AFTER_SECONDS > 0:
+            self._tasks.append(asyncio.create_task(self._abandon_loop(ABANDON_AFTER_SECONDS)))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def _ensure_semaphore(self) -> asyncio.Semaphore:
+        if self._available is None:
+            self._available = asyncio.Semaphore(0)
+        return self._available
+
+    # ---- queueing ----------------------------------------------------------
+    def _tenant(self, name: str) -> TenantQueue:
+        tq = self._tenants.get(name)
+        if tq is None:
+            if len(self._tenants) >= MAX_TRACKED_TENANTS:
+                self._forget_idle_tenants()
+            tq = TenantQueue(name=name, weight=self._weights.get(name, 1.0))
+            self._tenants[name] = tq
+        return tq
+
+    def _forget_idle_tenants(self) -> None:
+        idle = sorted((t for t in self._tenants.values() if t.idle), key=lambda t: t.last_active)
+        for t in idle[: max(1, len(idle) // 2)]:
+            self._tenants.pop(t.name, None)
+
+    def submit(
+        self,
+        job_id: str,
+        req: GenerateRequest,
+        tenant: str = DEFAULT_TENANT,
+        deadline: Optional[float] = None,
+        cost: Optional[float] = None,
+        order: Optional[float] = None,
+    ) -> None:
+        """
+        `cost` (charged to the tenant) defaults to estimate_job_cost(req);
+        `order` (position in the tenant's queue) defaults to the cost. Jobs
+        with equal order leave in submission order.
+        """
+        tq = self._tenant(tenant or DEFAULT_TENANT)
+        now = time.monotonic()
+        if tq.idle:
+            # a tenant returning from idle must not cash in credit for the time it was away
+            tq.vtime = max(tq.vtime, self._vclock)
+        if cost is None:
+            cost = estimate_job_cost(req)
+        key = (cost if order is None else order) + self._aging * (now - self._epoch)
+        heapq.heappush(tq.heap, (key, next(self._seq), QueuedJob(job_id, req, tq.name, cost, now, deadline)))
+        tq.enqueued += 1
+        tq.last_active = now
+        self._queued_tenant[job_id] = tq.name
+        self._queued += 1
+        self._ensure_semaphore().release()
+
+    def _pop_next(self) -> Optional[QueuedJob]:
+        now = time.monotonic()
+        while True:
+            best: Optional[TenantQueue] = None
+            for tq in self._tenants.values():
+                if tq.heap and (best is None or tq.vtime < best.vtime):
+                    best = tq
+            if best is None:
+                return None
+            _, _, entry = heapq.heappop(best.heap)
+            self._queued -= 1
+            self._queued_tenant.pop(entry.job_id, None)
+            if entry.deadline is None or now < entry.deadline:
+                break
+            # ran out of time while queued: not charged to the tenant, failed by the worker
+            best.expired += 1
+            self._expired.append(entry)
+        self._vclock = best.vtime
+        best.vtime += entry.cost / best.weight
+        wait = now - entry.enqueued_at
+        metrics.QUEUE_WAIT.observe(wait)
+        rolling_stats.observe("queue_wait", wait)
+        best.dispatched += 1
+        best.wait_total += wait
+        best.wait_max = max(best.wait_max, wait)
+        best.running += 1
+        return entry
+
+    async def _worker_loop(self, idx: int) -> None:
+        sem = self._ensure_semaphore()
+        while True:
+            await sem.acquire()
+            await self._limiter.acquire()
+            entry = self._pop_next()
+            if entry is None:
+                self._limiter.release()
+                await self._fail_expired()
+                continue
+            # the job runs in its own task so cancel() can stop it without killing the worker;
+            # it is registered before any await, so cancel() always finds it queued or running
+            task = asyncio.create_task(self._runner(entry.job_id, entry.req))
+            self._running[entry.job_id] = task
+            try:
+                await self._fail_expired()
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                self._limiter.release()
+                self._running.pop(entry.job_id, None)
+                tq = self._tenants.get(entry.tenant)
+                if tq is not None:
+                    tq.running -= 1
+                    tq.last_active = time.monotonic()
+            if not task.cancelled() and task.exception() is not None:
+                logger.error("[scheduler] worker %d: job %s crashed", idx, entry.job_id, exc_info=task.exception())
+
+    def _expire_due(self, now: float) -> None:
+        """Moves queued entries past their deadline to _expired (not charged to the tenant)."""
+        for tq in self._tenants.values():
+            if not any(item[2].deadline is not None and item[2].deadline <= now for item in tq.heap):
+                continue
+            keep = []
+            for item in tq.heap:
+                entry = item[2]
+                if entry.deadline is not None and entry.deadline <= now:
+                    self._queued -= 1
+                    self._queued_tenant.pop(entry.job_id, None)
+                    tq.expired += 1
+                    self._expired.append(entry)
+                else:
+                    keep.append(item)
+            heapq.heapify(keep)
+            tq.heap = keep
+            # their semaphore permits stay; a worker that takes one finds nothing and loops
+
+    async def _expiry_loop(self, interval: float) -> None:
+        # without this, a job whose deadline passes in the queue would only be
+        # failed when a worker frees up and reaches it in _pop_next
+        while True:
+            await asyncio.sleep(interval)
+            self._expire_due(time.monotonic())
+            await self._fail_expired()
+
+    async def _fail_expired(self) -> None:
+        while self._expired:
+            expired = self._expired.pop()
+            try:
+                await self._on_expired(expired.job_id)
+            except Exception:
+                logger.exception("[scheduler] failing expired job %s", expired.job_id)
+
+    # ---- cancellation ------------------------------------------------------
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Removes a queued job, or cancels the task of a running one (which
+        closes its in-flight Ollama request). Returns "queued", "running" or None.
+        """
+        tenant = self._queued_tenant.pop(job_id, None)
+        if tenant is not None:
+            tq = self._tenants.get(tenant)
+            if tq is not None:
+                tq.heap = [item for item in tq.heap if item[2].job_id != job_id]
+                heapq.heapify(tq.heap)
+                self._queued -= 1
+            # the semaphore permit stays; the worker that takes it finds nothing and loops
+            return "queued"
+        task = self._running.get(job_id)
+        if task is not None and not task.done():
+            task.cancel()
+            return "running"
+        return None
+
+    async def _abandon_loop(self, idle_seconds: float) -> None:
+        from .runner import cancel_abandoned_jobs
+
+        while True:
+            await asyncio.sleep(min(5.0, idle_seconds / 2))
+            try:
+                await cancel_abandoned_jobs(idle_seconds)
+            except Exception:
+                logger.exception("[scheduler] abandonment sweep failed")
+
+    # ---- stats -------------------------------------------------------------
+    def snapshot(self) -> Dict[str, Any]:
+        tenants: Dict[str, Dict[str, Any]] = {}
+        for tq in self._tenants.values():
+            tenants[tq.name] = {
+                "weight": tq.weight,
+                "queued": len(tq.heap),
+                "running": tq.running,
+                "enqueued": tq.enqueued,
+                "dispatched": tq.dispatched,
+                "expired": tq.expired,
+                "wait_avg_seconds": round(tq.wait_total / tq.dispatched, 3) if tq.dispatched else 0.0,
+                "wait_max_seconds": round(tq.wait_max, 3),
+            }
+        return {"workers": self._workers, "queued": self._queued, "running": len(self._running), "tenants": tenants}
+
+
+scheduler = GenerationScheduler()
@@ -0,0 +1,85 @@
+# app/services/serialize.py
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from ..compression import COMPRESSION_MIN_BYTES, compress
+from ..schemas import GenerateResponse, JobResult, JobStatus
+
+try:  # in requirements.txt: encodes large HTML strings several times faster
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - bare dev environments fall back to json
+    orjson = None
+
+# Terminal results never change again, so their responses are encoded once
+# (JSON + compressed variants) and served as bytes on every later poll.
+# Pages at least this large are encoded in a worker thread, off the event loop.
+RESULT_ENCODE_INLINE_MAX_BYTES = int(os.getenv("RESULT_ENCODE_INLINE_MAX_BYTES", "32768"))
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, same shape as Starlette's JSONResponse."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    media_type: str
+    _encoded: Dict[str, bytes] = field(default_factory=dict, repr=False)
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """(bytes, applied encoding); small bodies are always sent as is."""
+        if encoding is None or len(self.body) < COMPRESSION_MIN_BYTES:
+            return self.body, None
+        blob = self._encoded.get(encoding)
+        if blob is None:
+            blob = self._encoded[encoding] = compress(self.body, encoding)
+        return blob, encoding
+
+
+@dataclass
+class ResultCache:
+    version: int  # Job.version the bytes were built from
+    json: CachedBody
+    html: Optional[CachedBody] = None
+
+
+def build_result_cache(
+    job_id: str,
+    status: JobStatus,
+    result: Optional[GenerateResponse],
+    error: Optional[str],
+    version: int,
+) -> ResultCache:
+    """Encode the /result payload of a terminal job (mirrors get_result)."""
+    if status == JobStatus.finished and error is None:
+        payload = JobResult(job_id=job_id, status=status, result=result)
+    elif status in (JobStatus.failed, JobStatus.cancelled):
+        payload = JobResult(job_id=job_id, status=status, error=error)
+    else:
+        payload = JobResult(job_id=job_id, status=status)
+    cache = ResultCache(version=version, json=CachedBody(dumps(payload.model_dump(mode="json")), "application/json"))
+    cache.json.encoded("gzip")
+    if payload.result is not None and payload.result.html:
+        cache.html = CachedBody(payload.result.html.encode("utf-8"), "text/html; charset=utf-8")
+        cache.html.encoded("gzip")
+    return cache
+
+
+async def build_result_cache_async(
+    job_id: str,
+    status: JobStatus,
+    result: Optional[GenerateResponse],
+    error: Optional[str],
+    version: int,
+) -> ResultCache:
+    """build_result_cache, in a thread when the page is large."""
+    html = result.html if result is not None else None
+    if html and len(html) >= RESULT_ENCODE_INLINE_MAX_BYTES:
+        return await asyncio.to_thread(build_result_cache, job_id, status, result, error, version)
+    return build_result_cache(job_id, status, result, error, version)
@@ -0,0 +1,245 @@
+# app/services/similarity.py
+import hashlib
+import os
+import random
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from ..schemas import GenerateRequest
+from . import metrics
+
+# Opt-in cache of validated pages keyed by *similar* instructions, so that
+# "build a car landing page" can be answered with the page generated for
+# "Create a landing page for cars". Only plain prompts (no previous_html,
+# no extra constraints) take part.
+SIMILARITY_CACHE_ENABLED = os.getenv("GEN_SIMILARITY_CACHE", "0") == "1"
+# Minimum Jaccard similarity of the normalized word sets to reuse a result.
+SIMILARITY_THRESHOLD = float(os.getenv("GEN_SIMILARITY_THRESHOLD", "0.8"))
+SIMILARITY_MAX_ENTRIES = int(os.getenv("GEN_SIMILARITY_MAX_ENTRIES", "1000"))
+# LSH layout: BANDS x ROWS hash functions. A pair with Jaccard s becomes a
+# candidate with probability 1 - (1 - s^ROWS)^BANDS (~0.99 at s=0.6 for 32x4).
+SIMILARITY_BANDS = int(os.getenv("GEN_SIMILARITY_BANDS", "32"))
+SIMILARITY_ROWS = int(os.getenv("GEN_SIMILARITY_ROWS", "4"))
+
+_MERSENNE = (1 << 61) - 1
+_WORD = re.compile(r"[a-z0-9]+")
+
+STOPWORDS: FrozenSet[str] = frozenset("""
+    a an the and or for of to in on with by at from into as is are be it its this that these those
+    me my i we our you your please can could would should will just some any all very really
+    new simple nice modern beautiful
+    """.split())
+
+# Verbs and nouns that ask for the same thing; mapped after stemming.
+SYNONYMS: Dict[str, str] = {
+    "create": "build", "make": "build", "generate": "build", "design": "build", "develop": "build",
+    "write": "build", "code": "build", "produce": "build",
+    "webpage": "page", "website": "page", "site": "page", "web": "page",
+    "automobile": "car", "vehicle": "car", "auto": "car",
+    "colour": "color",
+}
+
+# Words that change what was asked for however similar the rest is; a cached
+# page is only reused when the instruction has exactly the same ones.
+NEGATIONS: FrozenSet[str] = frozenset("no not without never none nor don dont doesn doesnt avoid".split())
+NUMBER_WORDS: Dict[str, str] = {
+    w: str(i) for i, w in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve".split()
+    )
+}
+
+
+def _stem(word: str) -> str:
+    """Tiny suffix stripper; only needs to be consistent, not linguistically right."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ses", "xes", "zes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    for suffix in ("ing", "ed"):
+        if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def normalize(text: str) -> FrozenSet[str]:
+    """Word set of an instruction: case/accents folded, stopwords dropped, stemmed, synonyms merged."""
+    folded = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    words: Set[str] = set()
+    for w in _WORD.findall(folded):
+        if w in STOPWORDS:
+            continue
+        w = NUMBER_WORDS.get(w, w)
+        w = SYNONYMS.get(w, w)
+        w = _stem(w)
+        words.add(SYNONYMS.get(w, w))
+    return frozenset(words)
+
+
+def exact_terms(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    """Numbers and negations, which must match exactly (SYSTEM_INSTRUCTION demands exact counts)."""
+    return frozenset(t for t in tokens if t.isdigit() or t in NEGATIONS)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash over word shingles with universal hashing (a*x + b) mod 2^61-1."""
+
+    def __init__(self, num_perm: int, seed: int = 1) -> None:
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+
+    @staticmethod
+    def _base(token: str) -> int:
+        return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+    def signature(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        bases = [self._base(t) for t in tokens]
+        return tuple(min((a * x + b) % _MERSENNE for x in bases) for a, b in self._params)
+
+
+@dataclass
+class CacheEntry:
+    key: int
+    tokens: FrozenSet[str]
+    bands: Tuple[Tuple[int, ...], ...]
+    html: str
+    hits: int = 0
+
+
+@dataclass
+class SimilarHit:
+    html: str
+    similarity: float
+
+
+class SimilarityCache:
+    """
+    MinHash/LSH index over normalized instructions with LRU eviction.
+    Candidates share at least one LSH band; the best one is accepted when its
+    exact Jaccard similarity reaches the threshold. Runs on the event loop only.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_entries: int = SIMILARITY_MAX_ENTRIES,
+        bands: int = SIMILARITY_BANDS,
+        rows: int = SIMILARITY_ROWS,
+        enabled: bool = SIMILARITY_CACHE_ENABLED,
+    ) -> None:
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.bands = max(1, bands)
+        self.rows = max(1, rows)
+        self._hasher = MinHasher(self.bands * self.rows)
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._index: List[Dict[Tuple[int, ...], Set[int]]] = [dict() for _ in range(self.bands)]
+        self._exact: Dict[FrozenSet[str], int] = {}
+        self._next_key = 0
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self._lookup_seconds = 0.0
+
+    @staticmethod
+    def eligible(req: GenerateRequest) -> bool:
+        return not req.previous_html and not req.extra and bool(req.message.strip())
+
+    def _bands(self, tokens: FrozenSet[str]) -> Tuple[Tuple[int, ...], ...]:
+        sig = self._hasher.signature(tokens)
+        return tuple(sig[i * self.rows:(i + 1) * self.rows] for i in range(self.bands))
+
+    def lookup(self, message: str) -> Optional[SimilarHit]:
+        t0 = time.perf_counter()
+        hit = self._lookup(normalize(message))
+        elapsed = time.perf_counter() - t0
+        self.lookups += 1
+        self._lookup_seconds += elapsed
+        metrics.SIMILARITY_LOOKUP.observe(elapsed)
+        metrics.SIMILARITY_LOOKUPS.inc(result="hit" if hit else "miss")
+        if hit:
+            self.hits += 1
+        return hit
+
+    def _lookup(self, tokens: FrozenSet[str]) -> Optional[SimilarHit]:
+        if not tokens or not self._entries:
+            return None
+        key = self._exact.get(tokens)
+        if key is None:
+            candidates: Set[int] = set()
+            for i, band in enumerate(self._bands(tokens)):
+                candidates.update(self._index[i].get(band, ()))
+            best, best_sim = None, 0.0
+            required = exact_terms(tokens)
+            for k in candidates:
+                if exact_terms(self._entries[k].tokens) != required:
+                    continue  # "10 cards" is not "12 cards"
+                sim = jaccard(tokens, self._entries[k].tokens)
+                if sim > best_sim:
+                    best, best_sim = k, sim
+            if best is None or best_sim < self.threshold:
+                return None
+            key = best
+        else:
+            best_sim = 1.0
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        return SimilarHit(html=entry.html, similarity=best_sim)
+
+    def add(self, message: str, html: str) -> None:
+        tokens = normalize(message)
+        if not tokens:
+            return
+        old = self._exact.get(tokens)
+        if old is not None:
+            self._entries[old].html = html
+            self._entries.move_to_end(old)
+            return
+        key = self._next_key
+        self._next_key += 1
+        entry = CacheEntry(key=key, tokens=tokens, bands=self._bands(tokens), html=html)
+        self._entries[key] = entry
+        self._exact[tokens] = key
+        for i, band in enumerate(entry.bands):
+            self._index[i].setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        _, entry = self._entries.popitem(last=False)
+        self._exact.pop(entry.tokens, None)
+        for i, band in enumerate(entry.bands):
+            bucket = self._index[i].get(band)
+            if bucket is not None:
+                bucket.discard(entry.key)
+                if not bucket:
+                    del self._index[i][band]
+        self.evictions += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "evictions": self.evictions,
+            "lookup_avg_ms": round(self._lookup_seconds / self.lookups * 1000, 3) if self.lookups else 0.0,
+        }
+
+
+similarity_cache = SimilarityCache()
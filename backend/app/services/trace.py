@@ -0,0 +1,84 @@
+# app/services/trace.py
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# (name, start offset seconds, duration seconds or None for instants, attributes)
+TraceEvent = Tuple[str, float, Optional[float], Dict[str, Any]]
+
+
+class JobTrace:
+    """
+    Compact per-job timeline. Offsets are relative to job creation and taken
+    from the monotonic clock; only the creation instant is wall-clock.
+    """
+
+    __slots__ = ("_t0", "_wall0", "events")
+
+    def __init__(self) -> None:
+        self._t0 = time.monotonic()
+        self._wall0 = datetime.now(timezone.utc)
+        self.events: List[TraceEvent] = []
+
+    def now(self) -> float:
+        return time.monotonic() - self._t0
+
+    def mark(self, name: str, **attrs: Any) -> None:
+        self.events.append((name, self.now(), None, attrs))
+
+    def span(self, name: str, start: float, end: float, **attrs: Any) -> None:
+        self.events.append((name, start, max(0.0, end - start), attrs))
+
+    @contextmanager
+    def measure(self, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """Records a span around the block; attributes may be added through the yielded dict."""
+        start = self.now()
+        try:
+            yield attrs
+        finally:
+            self.span(name, start, self.now(), **attrs)
+
+    def llm_phases(self, reply: Any, start: float, **attrs: Any) -> None:
+        """Lays Ollama's own load/prefill/decode durations out from the call start."""
+        offset = start
+        for name, ns in (
+            ("ollama.load", reply.load_duration),
+            ("ollama.prompt_eval", reply.prompt_eval_duration),
+            ("ollama.eval", reply.eval_duration),
+        ):
+            if ns:
+                self.span(name, offset, offset + ns / 1e9, **attrs)
+                offset += ns / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        events = []
+        for name, start, dur, attrs in self.events:
+            ev: Dict[str, Any] = {"name": name, "t_ms": round(start * 1000, 3)}
+            if dur is not None:
+                ev["dur_ms"] = round(dur * 1000, 3)
+            ev.update(attrs)
+            events.append(ev)
+        return {"created_at": self._wall0.isoformat(), "events": events}
+
+    def to_chrome(self, job_id: str) -> Dict[str, Any]:
+        """Chrome trace-event format (chrome://tracing, Perfetto)."""
+        base_us = self._wall0.timestamp() * 1e6
+        events: List[Dict[str, Any]] = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": f"job {job_id}"}},
+        ]
+        for name, start, dur, attrs in self.events:
+            ev: Dict[str, Any] = {
+                "name": name,
+                "cat": name.split(".", 1)[0],
+                "pid": 1,
+                "tid": 2 if name.startswith("ollama.") else 1,
+                "ts": round(base_us + start * 1e6, 1),
+                "args": attrs,
+            }
+            if dur is None:
+                ev.update(ph="i", s="t")
+            else:
+                ev.update(ph="X", dur=round(dur * 1e6, 1))
+            events.append(ev)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
@@ -0,0 +1,377 @@
+# app/services/webhooks.py
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import metrics
+from .jobs import JOB_STATUS, TERMINAL_STATUSES, InMemoryJobStore, Job, job_store
+from .serialize import dumps
+
+# Completion callbacks (GenerateRequest.callback_url). Deliveries run on their
+# own small worker pool with a bounded queue, so a slow or dead receiver can
+# only delay other callbacks, never generation.
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+# retry n waits uniform(0, min(MAX, BASE * 2^(n-1))) seconds ("full jitter")
+WEBHOOK_BACKOFF_BASE_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_BASE_SECONDS", "1"))
+WEBHOOK_BACKOFF_MAX_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_MAX_SECONDS", "60"))
+# "result": the same JobResult body as GET /result/{id}; "compact": status only
+# plus the URL to fetch it from.
+WEBHOOK_PAYLOAD = os.getenv("WEBHOOK_PAYLOAD", "result").lower()
+# HMAC-SHA256 key for the X-Webhook-Signature header (empty = unsigned).
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Comma-separated hostnames callbacks may target (empty = any host).
+WEBHOOK_ALLOWED_HOSTS = frozenset(
+    h.strip().lower() for h in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()
+)
+# Callbacks to loopback/private/link-local/reserved/multicast addresses are
+# refused (SSRF: cloud metadata, Ollama, the admin API). Set to 1 only when the
+# receivers really live on an internal network.
+WEBHOOK_ALLOW_PRIVATE_NETWORKS = os.getenv("WEBHOOK_ALLOW_PRIVATE_NETWORKS", "0") == "1"
+WEBHOOK_DNS_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_DNS_TIMEOUT_SECONDS", "5"))
+
+RETRYABLE_STATUS = frozenset({408, 425, 429})
+
+logger = logging.getLogger(__name__)
+
+
+Resolver = Callable[[str, int], Awaitable[List[str]]]
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def resolve_host(host: str, port: int) -> List[str]:
+    """All addresses `host` resolves to (getaddrinfo in the loop's executor)."""
+    loop = asyncio.get_running_loop()
+    infos = await asyncio.wait_for(
+        loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), WEBHOOK_DNS_TIMEOUT_SECONDS
+    )
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+def callback_url_error(
+    url: str,
+    allowed_hosts: frozenset = WEBHOOK_ALLOWED_HOSTS,
+    allow_private: bool = WEBHOOK_ALLOW_PRIVATE_NETWORKS,
+) -> Optional[str]:
+    """Why `url` cannot be used as a callback, or None if it can (without resolving it)."""
+    if len(url) > 2048:
+        return "callback_url is too long."
+    parts = urlsplit(url)
+    try:
+        parts.port
+    except ValueError:
+        return "callback_url has an invalid port."
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "callback_url must be an absolute http(s) URL."
+    host = parts.hostname.lower().rstrip(".")
+    if allowed_hosts and host not in allowed_hosts:
+        return "callback_url host is not allowed."
+    if not allow_private:
+        if host == "localhost" or host.endswith(".localhost"):
+            return "callback_url must not point to a private or local address."
+        try:
+            if not is_public_address(host):
+                return "callback_url must not point to a private or local address."
+        except ValueError:
+            pass  # a name; checked by check_callback_url and again on every connect
+    return None
+
+
+async def check_callback_url(
+    url: str,
+    allowed_hosts: frozenset = WEBHOOK_ALLOWED_HOSTS,
+    allow_private: bool = WEBHOOK_ALLOW_PRIVATE_NETWORKS,
+    resolve: Resolver = resolve_host,
+) -> Optional[str]:
+    """callback_url_error, plus: every address the host resolves to must be public."""
+    reason = callback_url_error(url, allowed_hosts, allow_private)
+    if reason or allow_private:
+        return reason
+    parts = urlsplit(url)
+    try:
+        addresses = await resolve(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+    except (OSError, asyncio.TimeoutError):
+        return "callback_url host does not resolve."
+    if not addresses or not all(is_public_address(a) for a in addresses):
+        return "callback_url must not point to a private or local address."
+    return None
+
+
+class PublicAddressTransport(httpx.AsyncBaseTransport):
+    """
+    Resolves the host itself on every request, refuses non-public addresses
+    and connects to the address it checked (Host header and TLS SNI keep the
+    name), so a DNS answer that changes after validation cannot redirect a
+    callback to an internal service.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, resolve: Resolver = resolve_host) -> None:
+        self._inner = inner
+        self._resolve = resolve
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        try:
+            is_ip = bool(ipaddress.ip_address(host))
+        except ValueError:
+            is_ip = False
+        if is_ip:
+            addresses = [host]
+        else:
+            try:
+                addresses = await self._resolve(host, request.url.port or (443 if request.url.scheme == "https" else 80))
+            except (OSError, asyncio.TimeoutError) as exc:
+                raise httpx.ConnectError(f"cannot resolve {host}: {exc}", request=request) from exc
+        if not addresses or not all(is_public_address(a) for a in addresses):
+            raise httpx.ConnectError(f"{host} resolves to a non-public address", request=request)
+        if not is_ip:
+            request.url = request.url.copy_with(host=addresses[0])
+            request.extensions = {**request.extensions, "sni_hostname": host}
+        return await self._inner.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    """Value of X-Webhook-Signature: HMAC-SHA256 over "<timestamp>." + body."""
+    mac = hmac.new(secret.encode(), str(timestamp).encode() + b"." + body, hashlib.sha256)
+    return f"t={timestamp},v1={mac.hexdigest()}"
+
+
+def verify(secret: str, header: str, body: bytes, tolerance_seconds: float = 300, now: Optional[float] = None) -> bool:
+    """Receiver-side check of X-Webhook-Signature (also used by the tests)."""
+    try:
+        fields = dict(part.split("=", 1) for part in header.split(","))
+        timestamp = int(fields["t"])
+    except (KeyError, ValueError):
+        return False
+    now = time.time() if now is None else now
+    if abs(now - timestamp) > tolerance_seconds:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), header)
+
+
+@dataclass
+class Delivery:
+    job_id: str
+    url: str
+    body: bytes
+    # stable across retries so receivers can deduplicate
+    delivery_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    attempts: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class WebhookDispatcher:
+    """
+    Bounded queue + `workers` delivery tasks sharing one pooled httpx client.
+    Terminal jobs are enqueued synchronously from the job store; a full queue
+    drops the callback (counted) instead of blocking. Failed attempts are put
+    back on the queue after a jittered delay, so waiting retries do not hold a
+    worker. Deliveries are kept in memory only, like the jobs themselves.
+    """
+
+    def __init__(
+        self,
+        workers: int = WEBHOOK_WORKERS,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        timeout: float = WEBHOOK_TIMEOUT_SECONDS,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        backoff_base: float = WEBHOOK_BACKOFF_BASE_SECONDS,
+        backoff_max: float = WEBHOOK_BACKOFF_MAX_SECONDS,
+        payload: str = WEBHOOK_PAYLOAD,
+        secret: str = WEBHOOK_SECRET,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        allow_private: bool = WEBHOOK_ALLOW_PRIVATE_NETWORKS,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.payload = payload
+        self.secret = secret
+        self._transport = transport
+        self.allow_private = allow_private
+        self._store: Optional[InMemoryJobStore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._in_flight = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+
+    async def start(self, store: Optional[InMemoryJobStore] = None) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        limits = httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+        transport = self._transport
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=limits)
+            if not self.allow_private:
+                transport = PublicAddressTransport(transport)
+        # redirects are not followed: a 3xx is a final answer, never a second hop
+        self._client = httpx.AsyncClient(timeout=self.timeout, transport=transport)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._store = store or job_store
+        self._store.add_listener(self.on_job_event)
+
+    async def stop(self) -> None:
+        if self._store is not None:
+            self._store.remove_listener(self.on_job_event)
+            self._store = None
+        for timer in self._retry_timers.values():
+            timer.cancel()
+        self._retry_timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---- producer side (runs inside the job store lock: no awaits) ----
+
+    def on_job_event(self, kind: str, job: Job) -> None:
+        if kind == JOB_STATUS and job.status in TERMINAL_STATUSES:
+            self.notify(job)
+
+    def notify(self, job: Job) -> None:
+        url = job.request.callback_url
+        if url and self._queue is not None:
+            self._enqueue(Delivery(job_id=job.job_id, url=url, body=self._body(job)))
+
+    def _body(self, job: Job) -> bytes:
+        if self.payload == "compact":
+            return dumps({
+                "job_id": job.job_id,
+                "status": job.status.value,
+                "error": job.error,
+                "result_url": f"/api/ai/result/{job.job_id}",
+            })
+        # the terminal JobResult was already encoded for GET /result
+        return job.cached.json.body
+
+    def _enqueue(self, delivery: Delivery) -> bool:
+        try:
+            self._queue.put_nowait(delivery)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.WEBHOOK_DELIVERIES.inc(result="dropped")
+            logger.warning("[webhook %s] queue full, dropping callback for job %s", delivery.delivery_id, delivery.job_id)
+            return False
+
+    # ---- delivery side ----
+
+    async def _worker(self) -> None:
+        while True:
+            delivery = await self._queue.get()
+            self._in_flight += 1
+            try:
+                await self._attempt(delivery)
+            except Exception:
+                logger.exception("[webhook %s] unexpected delivery error", delivery.delivery_id)
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+
+    def headers(self, delivery: Delivery) -> Dict[str, str]:
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "ai-frontend-chat-service/webhook",
+            "X-Webhook-Id": delivery.delivery_id,
+            "X-Webhook-Attempt": str(delivery.attempts),
+            "X-Job-Id": delivery.job_id,
+        }
+        if self.secret:
+            headers["X-Webhook-Signature"] = sign(self.secret, int(time.time()), delivery.body)
+        return headers
+
+    async def _attempt(self, delivery: Delivery) -> None:
+        delivery.attempts += 1
+        t0 = time.perf_counter()
+        response: Optional[httpx.Response] = None
+        try:
+            response = await self._client.post(delivery.url, content=delivery.body, headers=self.headers(delivery))
+            reason = f"HTTP {response.status_code}"
+        except httpx.HTTPError as exc:
+            reason = f"{type(exc).__name__}: {exc}"
+        metrics.WEBHOOK_ATTEMPT.observe(time.perf_counter() - t0)
+
+        if response is not None and response.is_success:
+            self.delivered += 1
+            metrics.WEBHOOK_DELIVERIES.inc(result="delivered")
+            return
+        retryable = response is None or response.status_code in RETRYABLE_STATUS or response.status_code >= 500
+        if retryable and delivery.attempts < self.max_attempts:
+            delay = self.backoff_delay(delivery.attempts, response)
+            self.retries += 1
+            metrics.WEBHOOK_DELIVERIES.inc(result="retried")
+            logger.info("[webhook %s] attempt %d failed (%s), retrying in %.2fs",
+                        delivery.delivery_id, delivery.attempts, reason, delay)
+            loop = asyncio.get_running_loop()
+            self._retry_timers[delivery.delivery_id] = loop.call_later(delay, self._retry, delivery)
+            return
+        self.failed += 1
+        metrics.WEBHOOK_DELIVERIES.inc(result="failed")
+        logger.warning("[webhook %s] giving up on job %s after %d attempt(s): %s",
+                       delivery.delivery_id, delivery.job_id, delivery.attempts, reason)
+
+    def backoff_delay(self, attempts: int, response: Optional[httpx.Response] = None) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)))
+        retry_after = response.headers.get("retry-after", "") if response is not None else ""
+        if retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.backoff_max))
+        return delay
+
+    def _retry(self, delivery: Delivery) -> None:
+        self._retry_timers.pop(delivery.delivery_id, None)
+        self._enqueue(delivery)
+
+    @property
+    def pending(self) -> int:
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + self._in_flight + len(self._retry_timers)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self._in_flight,
+            "waiting_retry": len(self._retry_timers),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retries": self.retries,
+        }
+
+
+webhook_dispatcher = WebhookDispatcher()
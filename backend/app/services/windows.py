@@ -0,0 +1,184 @@
+# app/services/windows.py
+import math
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .jobs import JOB_CREATED, JOB_STATUS, TERMINAL_STATUSES, InMemoryJobStore, Job
+
+# Rolling-window aggregates for /jobs/stats ("windows"): a ring of fixed-width
+# time slots, each holding counters and bucketed histograms. A window is the
+# merge of its most recent slots, so memory is fixed and nothing per job is kept.
+STATS_SLOT_SECONDS = float(os.getenv("STATS_SLOT_SECONDS", "10"))
+STATS_WINDOWS: Tuple[Tuple[str, float], ...] = (("1m", 60), ("5m", 300), ("15m", 900), ("1h", 3600))
+
+# Log-spaced bucket bounds, 4 per doubling from 1 ms to ~1.2 h: a percentile read
+# from them is within ~10% of the true value.
+WINDOW_BOUNDS: Tuple[float, ...] = tuple(0.001 * 2 ** (i / 4) for i in range(88))
+
+COUNTERS = ("created", "finished", "failed", "cancelled")
+SERIES = ("queue_wait", "llm", "latency")
+QUANTILES = (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+
+
+class WindowHistogram:
+    """Mergeable bucketed histogram (per-bucket counts plus exact min/max/sum)."""
+
+    __slots__ = ("counts", "count", "sum", "min", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(WINDOW_BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(WINDOW_BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "WindowHistogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Linear interpolation inside the bucket holding the q-th observation."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = WINDOW_BOUNDS[i - 1] if i > 0 else 0.0
+                hi = WINDOW_BOUNDS[i] if i < len(WINDOW_BOUNDS) else self.max
+                value = lo + (hi - lo) * max(0.0, rank - seen) / c
+                return min(max(value, self.min), self.max)
+            seen += c
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"count": self.count, "mean": round(self.sum / self.count, 4) if self.count else None}
+        for name, q in QUANTILES:
+            v = self.quantile(q)
+            out[name] = round(v, 4) if v is not None else None
+        return out
+
+
+class _Slot:
+    __slots__ = ("epoch", "counters", "series", "score_sum", "score_count")
+
+    def __init__(self) -> None:
+        self.reset(-1)
+
+    def reset(self, epoch: int) -> None:
+        self.epoch = epoch
+        self.counters: Dict[str, int] = {}
+        self.series: Dict[str, WindowHistogram] = {}  # allocated on first observation
+        self.score_sum = 0.0
+        self.score_count = 0
+
+
+class RollingStats:
+    """
+    Ring of `ceil(longest window / slot_seconds) + 1` slots; slot i holds
+    observations made during [epoch * slot, (epoch + 1) * slot). Stale slots
+    are reset lazily when their index comes round again. Event loop only.
+    """
+
+    def __init__(
+        self,
+        windows: Tuple[Tuple[str, float], ...] = STATS_WINDOWS,
+        slot_seconds: float = STATS_SLOT_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.windows = windows
+        self.slot_seconds = slot_seconds
+        self.clock = clock
+        self._slots: List[_Slot] = [_Slot() for _ in range(math.ceil(max(s for _, s in windows) / slot_seconds) + 1)]
+        self._started = clock()
+        self._store: Optional[InMemoryJobStore] = None
+
+    def _slot(self, now: Optional[float]) -> _Slot:
+        epoch = int((self.clock() if now is None else now) // self.slot_seconds)
+        slot = self._slots[epoch % len(self._slots)]
+        if slot.epoch != epoch:
+            slot.reset(epoch)
+        return slot
+
+    def incr(self, name: str, amount: int = 1, now: Optional[float] = None) -> None:
+        counters = self._slot(now).counters
+        counters[name] = counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float, now: Optional[float] = None) -> None:
+        series = self._slot(now).series
+        hist = series.get(name)
+        if hist is None:
+            hist = series[name] = WindowHistogram()
+        hist.observe(value)
+
+    def observe_score(self, score: float, now: Optional[float] = None) -> None:
+        slot = self._slot(now)
+        slot.score_sum += score
+        slot.score_count += 1
+
+    # job counts and end-to-end latency come straight from the store
+    def attach(self, store: InMemoryJobStore) -> None:
+        self._store = store
+        store.add_listener(self._on_job_event)
+
+    def detach(self) -> None:
+        if self._store is not None:
+            self._store.remove_listener(self._on_job_event)
+            self._store = None
+
+    def _on_job_event(self, kind: str, job: Job) -> None:
+        if kind == JOB_CREATED:
+            self.incr("created")
+        elif kind == JOB_STATUS and job.status in TERMINAL_STATUSES:
+            self.incr(job.status.value)
+            self.observe("latency", job.trace.now())
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Dict[str, Any]:
+        now = self.clock() if now is None else now
+        current = int(now // self.slot_seconds)
+        span = min(seconds, len(self._slots) * self.slot_seconds)
+        oldest = int((now - span) // self.slot_seconds) + 1
+        counters = {name: 0 for name in COUNTERS}
+        series = {name: WindowHistogram() for name in SERIES}
+        score_sum, score_count = 0.0, 0
+        for slot in self._slots:
+            if not oldest <= slot.epoch <= current:
+                continue
+            for name, v in slot.counters.items():
+                counters[name] = counters.get(name, 0) + v
+            for name, hist in slot.series.items():
+                series.setdefault(name, WindowHistogram()).merge(hist)
+            score_sum += slot.score_sum
+            score_count += slot.score_count
+
+        covered = max(min(now - oldest * self.slot_seconds, now - self._started), 1e-9)
+        out: Dict[str, Any] = {"seconds": seconds, "covered_seconds": round(covered, 1)}
+        out.update(counters)
+        for name in ("created", "finished", "failed"):
+            out[f"{name}_per_min"] = round(counters[name] * 60 / covered, 3)
+        for name, hist in series.items():
+            out[name] = hist.summary()
+        out["compliance_score"] = {
+            "count": score_count,
+            "mean": round(score_sum / score_count, 4) if score_count else None,
+        }
+        return out
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = self.clock() if now is None else now
+        return {label: self.window(seconds, now) for label, seconds in self.windows}
+
+
+rolling_stats = RollingStats()
@@ -0,0 +1,126 @@
+# benchmarks/corpus.py
+"""
+Deterministic generator of synthetic model outputs for the validator and
+sanitizer benchmarks. The same (kind, size, seed) always yields the same text.
+"""
+import random
+from typing import Callable, Dict, List
+
+SIZES: Dict[str, int] = {
+    "1k": 1 << 10,
+    "16k": 16 << 10,
+    "256k": 256 << 10,
+    "1m": 1 << 20,
+    "5m": 5 << 20,
+}
+
+_WORDS = (
+    "car landing hero section card button modal gallery pricing feature contact "
+    "footer header main nav grid flex layout color theme dark light rotate slide"
+).split()
+
+
+def _svg(rng: random.Random) -> str:
+    pts = " ".join(f"{rng.uniform(0, 100):.4f},{rng.uniform(0, 100):.4f}" for _ in range(rng.randint(3, 8)))
+    return (
+        f'<svg viewBox="0 0 100 100" width="{rng.randint(16, 256)}" aria-hidden="true">'
+        f'<path d="M{rng.uniform(0, 50):.5f} {rng.uniform(0, 50):.5f} L{rng.uniform(50, 100):.5f} {rng.uniform(50, 100):.5f} Z" fill="#{rng.randrange(1 << 24):06x}"/>'
+        f'<polygon points="{pts}"/></svg>'
+    )
+
+
+def _card(rng: random.Random) -> str:
+    words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 20)))
+    return f'<section class="card c{rng.randint(0, 99)}"><h2>{words[:30]}</h2><p>{words}</p><button type="button">Go</button></section>'
+
+
+def _css(rng: random.Random) -> str:
+    return f".c{rng.randint(0, 99)}{{color:#{rng.randrange(1 << 24):06x};padding:{rng.randint(0, 32)}px}}\n"
+
+
+def _js(rng: random.Random) -> str:
+    return f"document.querySelectorAll('.c{rng.randint(0, 99)}').forEach(function(el){{el.dataset.n={rng.randint(0, 999)};}});\n"
+
+
+def _document(head: str, body: str) -> str:
+    return (
+        "<!doctype html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\" />\n"
+        f"<title>Bench</title>\n{head}\n</head>\n<body>\n<header></header>\n<main>\n{body}\n</main>\n<footer></footer>\n</body>\n</html>"
+    )
+
+
+def _fill(rng: random.Random, size: int, piece: Callable[[random.Random], str]) -> str:
+    parts: List[str] = []
+    total = 0
+    while total < size:
+        p = piece(rng)
+        parts.append(p)
+        total += len(p)
+    return "".join(parts)
+
+
+def svg_heavy(rng: random.Random, size: int) -> str:
+    body = _fill(rng, size, _svg)
+    return "```html\n" + _document("<style>svg{display:block}</style>", body + "<script>void 0;</script>") + "\n```"
+
+
+def many_blocks(rng: random.Random, size: int) -> str:
+    # many separate <style>/<script> blocks, the sanitizer has to merge them
+    def piece(r: random.Random) -> str:
+        return f"<style>{_css(r)}</style>{_card(r)}<script>{_js(r)}</script>"
+    return "```html\n" + _document("", _fill(rng, size, piece)) + "\n```"
+
+
+def prose_fences(rng: random.Random, size: int) -> str:
+    # chatty answer: prose, markdown noise and several fenced blocks
+    def piece(r: random.Random) -> str:
+        prose = " ".join(r.choice(_WORDS) for _ in range(r.randint(10, 40)))
+        kind = r.choice(("html", "css", "js", ""))
+        code = {"html": _card, "css": _css, "js": _js, "": _card}[kind](r)
+        return f"{prose}\n# Notes\n---\n```{kind}\n{code}\n```\n"
+    return _fill(rng, size, piece)
+
+
+def unclosed_tags(rng: random.Random, size: int) -> str:
+    # truncated output: tags left open, no closing </body></html>
+    def piece(r: random.Random) -> str:
+        return r.choice((
+            f'<div class="c{r.randint(0, 9)}"><span>{r.choice(_WORDS)}',
+            f"<section><p>{r.choice(_WORDS)} ",
+            "<style>.x{color:red}",
+            "<script>var a = 1;",
+            "<svg><path d=\"M0 0",
+        ))
+    return "```html\n<!doctype html><html lang=\"en\"><head><title>t</title></head><body>" + _fill(rng, size, piece)
+
+
+def adversarial(rng: random.Random, size: int) -> str:
+    # inputs that make the (?is) patterns scan far without ever matching:
+    # tag openers with no '>' and handler-like attributes, unterminated titles
+    def piece(r: random.Random) -> str:
+        return r.choice((
+            "<div onclick ",
+            "<span data-x=1 ",
+            "<title ",
+            "<style ",
+            "<script src= ",
+            "<link rel=",
+            "< svg ",
+            "<meta charset=",
+        ))
+    return _fill(rng, size, piece)
+
+
+KINDS: Dict[str, Callable[[random.Random, int], str]] = {
+    "svg_heavy": svg_heavy,
+    "many_blocks": many_blocks,
+    "prose_fences": prose_fences,
+    "unclosed_tags": unclosed_tags,
+    "adversarial": adversarial,
+}
+
+
+def generate(kind: str, size: int, seed: int = 0) -> str:
+    """Return a synthetic model output of roughly `size` characters."""
+    rng = random.Random(f"{kind}:{size}:{seed}")
+    return KINDS[kind](rng, size)
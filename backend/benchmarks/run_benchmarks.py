@@ -0,0 +1,220 @@
+# benchmarks/run_benchmarks.py
+"""
+Microbenchmarks for the post-processing hot path:
+sanitize_model_output, score_compliance and _strip_fences_and_markers.
+
+Usage (from backend/):
+    python -m benchmarks.run_benchmarks                      # compare against baselines
+    python -m benchmarks.run_benchmarks --save-baseline      # record new baselines
+    python -m benchmarks.run_benchmarks --large              # also the 1m documents (~1 min)
+    python -m benchmarks.run_benchmarks --sizes 256k,1m,5m --kinds adversarial
+
+Each case runs in its own process with a hard timeout, so a pathological
+(quadratic) regex on a large input is reported as a timeout instead of
+hanging the run. Exit code is 1 when any case regresses beyond --threshold
+or times out where its baseline did not (a timeout already recorded in the
+baseline is reported, not failed), which is what fails a CI step. A case
+that looks regressed is measured once more and only fails if it still does.
+
+The committed baselines.json covers the default matrix and --large. Every
+case also times a fixed calibration workload in the same process, right
+around its own measurement, and cases are compared on ops/sec relative to
+that calibration. A slower or busier CI runner therefore does not read as
+a regression. Several sanitizer/validator passes time out
+on 1m adversarial and unclosed-tag inputs; the baseline records those.
+"""
+import re
+import argparse
+import json
+import multiprocessing as mp
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from benchmarks.corpus import KINDS, SIZES, generate  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines.json"
+FUNCTIONS = ("sanitize_model_output", "score_compliance", "_strip_fences_and_markers")
+DEFAULT_SIZES = ("1k", "16k")
+LARGE_SIZES = ("1m",)
+ROUNDS = 5
+
+
+def _resolve(name: str) -> Callable[[str], Any]:
+    from app.services.llm import sanitize_model_output
+    from app.services.validator import score_compliance, _strip_fences_and_markers
+    return {
+        "sanitize_model_output": sanitize_model_output,
+        "score_compliance": score_compliance,
+        "_strip_fences_and_markers": _strip_fences_and_markers,
+    }[name]
+
+
+def _measure(func_name: str, kind: str, size: int, seed: int, min_time: float, conn) -> None:
+    fn = _resolve(func_name)
+    text = generate(kind, size, seed)
+    fn(text)  # warm-up (regex compile caches)
+    calibration = calibrate()
+
+    # best of ROUNDS: on a shared machine the fastest round is the least disturbed one
+    iterations, elapsed, best = 0, 0.0, 0.0
+    for _ in range(ROUNDS):
+        n = 0
+        start = time.perf_counter()
+        spent = 0.0
+        while spent < min_time / ROUNDS or n == 0:
+            fn(text)
+            n += 1
+            spent = time.perf_counter() - start
+        iterations += n
+        elapsed += spent
+        best = max(best, n / spent)
+
+    calibration = max(calibration, calibrate())
+
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    conn.send({
+        "ops_per_sec": best,
+        "mean_ms": elapsed / iterations * 1000,
+        "iterations": iterations,
+        "peak_kb": peak / 1024,
+        "input_bytes": len(text),
+        "calibration_ops_per_sec": calibration,
+    })
+    conn.close()
+
+
+def run_case(func_name: str, kind: str, size: int, *, seed: int, min_time: float, timeout: float) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_measure, args=(func_name, kind, size, seed, min_time, child), daemon=True)
+    proc.start()
+    child.close()
+    result: Optional[Dict[str, Any]] = None
+    if parent.poll(timeout):
+        try:
+            result = parent.recv()
+        except EOFError:
+            result = None
+    if proc.is_alive():
+        proc.terminate()
+    proc.join()
+    if result is None:
+        return {"timeout": True}
+    return result
+
+
+def calibrate(rounds: int = 3) -> float:
+    """Ops/sec of a fixed regex + string workload: how fast this machine is for this kind of code."""
+    text = ("<div class='card'><p>" + "lorem ipsum dolor " * 20 + "</p></div>\n") * 200
+    tag = re.compile(r"<(/?)([a-z]+)[^>]*>")
+    best = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(20):
+            tag.sub(r"<\1\2>", text).lower().split()
+        best = max(best, 20 / (time.perf_counter() - start))
+    return best
+
+
+def _case_id(func_name: str, kind: str, size_label: str) -> str:
+    return f"{func_name}/{kind}/{size_label}"
+
+
+def _relative(res: Dict[str, Any]) -> float:
+    # older baselines have no calibration: compare raw ops/sec
+    return res["ops_per_sec"] / res.get("calibration_ops_per_sec", 1.0)
+
+
+def compare(res: Dict[str, Any], base: Optional[Dict[str, Any]], threshold: float) -> Tuple[str, bool]:
+    """(note, failed) for one case against its baseline entry, if any."""
+    if res.get("timeout"):
+        if base and base.get("timeout"):
+            return "TIMEOUT (as in baseline)", False
+        return "TIMEOUT", True
+    if not base:
+        return "", False
+    if base.get("timeout"):
+        return "fixed (baseline timed out)", False
+    if ("calibration_ops_per_sec" in res) == ("calibration_ops_per_sec" in base):
+        ratio = _relative(res) / _relative(base)
+    else:
+        ratio = res["ops_per_sec"] / base["ops_per_sec"]
+    if ratio < 1.0 - threshold:
+        return f"{ratio:6.2f}x  REGRESSION", True
+    return f"{ratio:6.2f}x", False
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default=",".join(DEFAULT_SIZES), help="comma list of " + ",".join(SIZES))
+    ap.add_argument("--large", action="store_true", help="add " + ",".join(LARGE_SIZES) + " to --sizes")
+    ap.add_argument("--kinds", default=",".join(KINDS), help="comma list of " + ",".join(KINDS))
+    ap.add_argument("--functions", default=",".join(FUNCTIONS))
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--min-time", type=float, default=0.3, help="seconds of repeated calls per case")
+    ap.add_argument("--timeout", type=float, default=15.0, help="hard limit per case (seconds)")
+    ap.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed ops/sec drop vs baseline (0.25 = 25%%)")
+    ap.add_argument("--json", type=Path, default=None, help="also write raw results here")
+    args = ap.parse_args(argv)
+
+    sizes = args.sizes.split(",")
+    if args.large:
+        sizes += [s for s in LARGE_SIZES if s not in sizes]
+
+    baseline: Dict[str, Dict[str, Any]] = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())
+
+    results: Dict[str, Dict[str, Any]] = {}
+    failures: List[str] = []
+    print(f"{'case':58} {'ops/sec':>12} {'mean ms':>10} {'peak KB':>10}  vs baseline")
+    for func_name in args.functions.split(","):
+        for kind in args.kinds.split(","):
+            for size_label in sizes:
+                cid = _case_id(func_name, kind, size_label)
+                res = run_case(func_name, kind, SIZES[size_label], seed=args.seed, min_time=args.min_time, timeout=args.timeout)
+                note, failed = compare(res, baseline.get(cid), args.threshold)
+                if failed and not res.get("timeout") and not args.save_baseline:
+                    # one noisy run is not a regression: it has to reproduce
+                    res = run_case(func_name, kind, SIZES[size_label], seed=args.seed, min_time=args.min_time, timeout=args.timeout)
+                    note, failed = compare(res, baseline.get(cid), args.threshold)
+                results[cid] = res
+                if failed:
+                    failures.append(f"{cid}: {note.strip()}")
+                if res.get("timeout"):
+                    print(f"{cid:58} {note:>12}")
+                    continue
+                print(f"{cid:58} {res['ops_per_sec']:12.1f} {res['mean_ms']:10.3f} {res['peak_kb']:10.1f}  {note}")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, sort_keys=True))
+    if args.save_baseline:
+        merged = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        merged.update(results)
+        args.baseline.write_text(json.dumps(merged, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print("  " + f)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
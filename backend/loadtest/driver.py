@@ -0,0 +1,250 @@
+# loadtest/driver.py
+"""
+Open-loop load driver for the job pipeline.
+
+Fires POST /api/ai/generate at a target rate, polls /api/ai/result/{job_id}
+until each job is terminal, and reports throughput, job latency percentiles,
+event-loop lag and job store memory.
+
+By default the real FastAPI app runs in-process (so loop lag and store memory
+are the service's own) and a fake Ollama is started in a subprocess:
+
+    python -m loadtest.driver --rps 5 --duration 60 --tps 80
+    GEN_WORKERS=4 python -m loadtest.driver --rps 5 --duration 60     # compare scheduler settings
+
+Use --url to drive an already running deployment instead (loop lag and memory
+then describe the driver process only).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+import httpx  # noqa: E402
+
+TERMINAL = {"finished", "failed", "cancelled"}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LoopLagSampler:
+    """Sleeps `interval` repeatedly; any overshoot is time the loop was blocked."""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - t0 - self.interval))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+def store_memory_bytes() -> Dict[str, int]:
+    """Rough payload size of the in-process job store (request + result strings)."""
+    from app.services.jobs import job_store
+
+    jobs = list(job_store._jobs.values())
+    total = 0
+    for j in jobs:
+        total += len(j.request.message or "") + len(j.request.previous_html or "")
+        if j.result is not None:
+            total += len(j.result.html or "")
+        total += len(j.error or "")
+    return {"jobs": len(jobs), "payload_bytes": total}
+
+
+async def _start_fake_ollama(args: argparse.Namespace, port: int) -> asyncio.subprocess.Process:
+    cmd = [
+        sys.executable, "-m", "loadtest.fake_ollama",
+        "--port", str(port),
+        "--ttft-ms", str(args.ttft_ms),
+        "--tps", str(args.tps),
+        "--failure-rate", str(args.failure_rate),
+        "--truncation-rate", str(args.truncation_rate),
+        "--capacity", str(args.capacity),
+        "--contention", str(args.contention),
+    ]
+    if args.replay:
+        cmd += ["--replay", args.replay]
+    proc = await asyncio.create_subprocess_exec(*cmd, cwd=str(BACKEND_ROOT))
+    async with httpx.AsyncClient() as c:
+        for _ in range(100):
+            try:
+                if (await c.get(f"http://127.0.0.1:{port}/api/ps")).status_code == 200:
+                    return proc
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("fake Ollama did not start")
+
+
+async def _one_job(client: httpx.AsyncClient, idx: int, args: argparse.Namespace, out: List[Dict[str, Any]]) -> None:
+    t0 = time.perf_counter()
+    body = {"message": f"Build a landing page variant {idx}"}
+    headers = {"Authorization": f"Bearer load-{idx % max(1, args.tenants)}"}
+    try:
+        r = await client.post("/api/ai/generate", json=body, headers=headers)
+    except httpx.HTTPError as e:
+        out.append({"status": "submit_error", "error": str(e), "latency": time.perf_counter() - t0})
+        return
+    if r.status_code != 202:
+        out.append({"status": f"http_{r.status_code}", "latency": time.perf_counter() - t0})
+        return
+    job_id = r.json()["job_id"]
+    polls = 0
+    while time.perf_counter() - t0 < args.job_timeout:
+        await asyncio.sleep(args.poll_interval)
+        polls += 1
+        try:
+            res = await client.get(f"/api/ai/result/{job_id}")
+        except httpx.HTTPError:
+            continue
+        if res.status_code == 200 and res.json().get("status") in TERMINAL:
+            out.append({"status": res.json()["status"], "latency": time.perf_counter() - t0, "polls": polls})
+            return
+    out.append({"status": "driver_timeout", "latency": time.perf_counter() - t0, "polls": polls})
+
+
+async def _drive(client: httpx.AsyncClient, args: argparse.Namespace) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    lag = LoopLagSampler()
+    lag.start()
+    tasks = []
+    start = time.perf_counter()
+    total = int(args.rps * args.duration)
+    for i in range(total):
+        # open loop: arrivals follow the schedule regardless of response times
+        delay = start + i / args.rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_one_job(client, i, args, results)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await lag.stop()
+
+    latencies = [r["latency"] for r in results if r["status"] == "finished"]
+    by_status: Dict[str, int] = {}
+    for r in results:
+        by_status[r["status"]] = by_status.get(r["status"], 0) + 1
+    polls = [r.get("polls", 0) for r in results]
+    return {
+        "submitted": total,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_jobs_per_s": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "status": by_status,
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "mean": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        },
+        "polls_per_job": round(statistics.fmean(polls), 2) if polls else 0.0,
+        "loop_lag_ms": {
+            "p50": round(percentile(lag.samples, 50) * 1000, 2),
+            "p99": round(percentile(lag.samples, 99) * 1000, 2),
+            "max": round(max(lag.samples, default=0.0) * 1000, 2),
+        },
+    }
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+            report = await _drive(client, args)
+        report["target"] = args.url
+        return report
+
+    fake_proc = None
+    if args.ollama_url:
+        os.environ["OLLAMA_BASE_URL"] = args.ollama_url
+    else:
+        port = _free_port()
+        fake_proc = await _start_fake_ollama(args, port)
+        os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{port}"
+    try:
+        from app.main import app  # imported after OLLAMA_BASE_URL is set
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=30) as client:
+                report = await _drive(client, args)
+                report["store"] = store_memory_bytes()
+                report["stats"] = (await client.get("/api/ai/jobs/stats")).json()
+        report["target"] = "in-process"
+        return report
+    finally:
+        if fake_proc is not None:
+            fake_proc.terminate()
+            await fake_proc.wait()
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rps", type=float, default=2.0, help="target job submissions per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of submissions")
+    ap.add_argument("--tenants", type=int, default=1, help="spread requests over N bearer tokens (tenants)")
+    ap.add_argument("--poll-interval", type=float, default=1.0)
+    ap.add_argument("--job-timeout", type=float, default=600.0)
+    ap.add_argument("--url", default=None, help="drive a running server instead of the in-process app")
+    ap.add_argument("--ollama-url", default=None, help="use this Ollama (or fake) instead of spawning one")
+    ap.add_argument("--ttft-ms", type=float, default=200.0)
+    ap.add_argument("--tps", type=float, default=50.0)
+    ap.add_argument("--failure-rate", type=float, default=0.0)
+    ap.add_argument("--truncation-rate", type=float, default=0.0)
+    ap.add_argument("--capacity", type=int, default=0, help="fake Ollama concurrent slots (0 = unlimited)")
+    ap.add_argument("--contention", type=float, default=0.0, help="fake Ollama slowdown per extra active request")
+    ap.add_argument("--replay", default=None)
+    ap.add_argument("--json", type=Path, default=None, help="write the report here as well")
+    return ap.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        args.json.write_text(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# loadtest/fake_ollama.py
+"""
+Stand-in for the Ollama HTTP API, for load tests without a GPU.
+
+Implements /api/generate, /api/chat (streaming NDJSON and non-streaming) and
+/api/ps. Latency is modeled as time-to-first-token plus output tokens divided
+by tokens/sec; failures and truncations are injected at configurable rates.
+Saturation is modeled with --capacity (requests served at once, the rest
+queue, like OLLAMA_NUM_PARALLEL) and --contention (each extra concurrent
+request slows every active one by that fraction, like a shared GPU).
+Recorded real responses (JSONL, one Ollama response object per line) can be
+replayed instead of the built-in page.
+
+    python -m loadtest.fake_ollama --port 11435 --ttft-ms 300 --tps 40 --failure-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CANNED_HTML = """```html
+<!doctype html>
+<html lang="en">
+<head>
+  <meta charset="utf-8" />
+  <title>Fake Page</title>
+  <style>
+    body{margin:0;font-family:system-ui}
+    .hero{padding:2rem;background:#123;color:#fff}
+    .card{display:inline-block;padding:1rem;margin:.5rem;border:1px solid #ccc}
+  </style>
+</head>
+<body>
+  <header class="hero"><h1>Fake landing page</h1></header>
+  <main>
+    <section class="card"><svg viewBox="0 0 10 10" width="40"><circle cx="5" cy="5" r="4"/></svg><p>Card one</p></section>
+    <section class="card"><svg viewBox="0 0 10 10" width="40"><rect width="8" height="8" x="1" y="1"/></svg><p>Card two</p></section>
+    <button type="button" id="go">Go</button>
+  </main>
+  <footer><p>Generated offline</p></footer>
+  <script>
+    document.getElementById('go').addEventListener('click', function(){ document.body.classList.toggle('on'); });
+  </script>
+</body>
+</html>
+```"""
+
+
+@dataclass
+class FakeOllamaConfig:
+    ttft_ms: float = 200.0
+    tokens_per_sec: float = 50.0
+    prompt_tokens_per_sec: float = 2000.0
+    load_ms: float = 0.0
+    failure_rate: float = 0.0
+    truncation_rate: float = 0.0
+    replay_file: Optional[str] = None
+    capacity: int = 0  # 0 = unlimited
+    contention: float = 0.0
+    models: List[str] = field(default_factory=lambda: ["qwen2.5-coder:3b"])
+    seed: Optional[int] = None
+
+
+def _tokens(text: str) -> List[str]:
+    # ~4 characters per token, like the estimates used by the service
+    return [text[i:i + 4] for i in range(0, len(text), 4)] or [""]
+
+
+class FakeOllama:
+    def __init__(self, config: FakeOllamaConfig) -> None:
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.replay: List[Dict[str, Any]] = []
+        if config.replay_file:
+            for line in Path(config.replay_file).read_text().splitlines():
+                line = line.strip()
+                if line:
+                    self.replay.append(json.loads(line))
+        self._replay_idx = 0
+        self.in_flight = 0
+        self.active = 0  # holding one of the `capacity` slots
+        self.max_active = 0
+        self.requests = 0
+        self._slots = asyncio.Semaphore(config.capacity) if config.capacity > 0 else None
+        self.loaded_at: Dict[str, datetime] = {}
+
+    def _next_text(self) -> str:
+        if not self.replay:
+            return CANNED_HTML
+        rec = self.replay[self._replay_idx % len(self.replay)]
+        self._replay_idx += 1
+        if isinstance(rec.get("message"), dict):
+            return str(rec["message"].get("content", ""))
+        return str(rec.get("response", ""))
+
+    def _plan(self, prompt: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        text = self._next_text()
+        toks = _tokens(text)
+        num_predict = int(options.get("num_predict") or 0)
+        done_reason = "stop"
+        if self.rng.random() < self.config.truncation_rate:
+            toks = toks[: max(1, int(len(toks) * self.rng.uniform(0.3, 0.8)))]
+            done_reason = "length"
+        elif num_predict > 0 and len(toks) > num_predict:
+            toks = toks[:num_predict]
+            done_reason = "length"
+        prompt_tokens = max(1, len(prompt) // 4)
+        return {
+            "tokens": toks,
+            "done_reason": done_reason,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_s": prompt_tokens / self.config.prompt_tokens_per_sec,
+            "ttft_s": self.config.ttft_ms / 1000.0,
+            "per_token_s": 1.0 / self.config.tokens_per_sec if self.config.tokens_per_sec > 0 else 0.0,
+            "load_s": self.config.load_ms / 1000.0,
+        }
+
+    def _final(self, model: str, plan: Dict[str, Any], started: float, eval_s: float) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": plan["done_reason"],
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": int(plan["load_s"] * 1e9),
+            "prompt_eval_count": plan["prompt_eval_count"],
+            "prompt_eval_duration": int(plan["prompt_eval_s"] * 1e9),
+            "eval_count": len(plan["tokens"]),
+            "eval_duration": int(eval_s * 1e9),
+        }
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._slots is not None:
+            await self._slots.acquire()
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def slowdown(self) -> float:
+        return 1.0 + self.config.contention * max(0, self.active - 1)
+
+    def should_fail(self) -> bool:
+        return self.rng.random() < self.config.failure_rate
+
+
+def create_app(config: Optional[FakeOllamaConfig] = None) -> FastAPI:
+    fake = FakeOllama(config or FakeOllamaConfig())
+    app = FastAPI(title="Fake Ollama")
+    app.state.fake = fake
+
+    async def _handle(body: Dict[str, Any], chat: bool):
+        model = body.get("model") or fake.config.models[0]
+        if chat:
+            prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages") or [])
+        else:
+            prompt = str(body.get("prompt", ""))
+        stream = body.get("stream", True)
+        fake.requests += 1
+        if fake.should_fail():
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+
+        plan = fake._plan(prompt, body.get("options") or {})
+        fake.loaded_at.setdefault(model, datetime.now(timezone.utc))
+        started = time.perf_counter()
+
+        def _chunk(piece: str) -> Dict[str, Any]:
+            base = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": False}
+            if chat:
+                base["message"] = {"role": "assistant", "content": piece}
+            else:
+                base["response"] = piece
+            return base
+
+        if not stream:
+            fake.in_flight += 1
+            try:
+                async with fake.slot():
+                    await asyncio.sleep(
+                        (plan["load_s"] + plan["ttft_s"] + plan["per_token_s"] * len(plan["tokens"])) * fake.slowdown()
+                    )
+            finally:
+                fake.in_flight -= 1
+            final = fake._final(model, plan, started, plan["per_token_s"] * len(plan["tokens"]))
+            final.update(_chunk("".join(plan["tokens"])))
+            final["done"] = True
+            return JSONResponse(final)
+
+        async def _gen():
+            fake.in_flight += 1
+            try:
+                async with fake.slot():
+                    await asyncio.sleep((plan["load_s"] + plan["ttft_s"]) * fake.slowdown())
+                    eval_start = time.perf_counter()
+                    for tok in plan["tokens"]:
+                        yield json.dumps(_chunk(tok)) + "\n"
+                        if plan["per_token_s"]:
+                            await asyncio.sleep(plan["per_token_s"] * fake.slowdown())
+                    final = fake._final(model, plan, started, time.perf_counter() - eval_start)
+                    final.update(_chunk(""))
+                    final["done"] = True
+                    yield json.dumps(final) + "\n"
+            finally:
+                fake.in_flight -= 1
+
+        return StreamingResponse(_gen(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        return await _handle(await request.json(), chat=False)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        return await _handle(await request.json(), chat=True)
+
+    @app.get("/api/ps")
+    async def ps():
+        return {
+            "models": [
+                {"name": m, "model": m, "size": 0, "details": {"format": "gguf"}, "expires_at": None,
+                 "loaded_at": ts.isoformat()}
+                for m, ts in fake.loaded_at.items()
+            ],
+            "in_flight": fake.in_flight,
+            "active": fake.active,
+            "max_active": fake.max_active,
+            "requests": fake.requests,
+        }
+
+    return app
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--ttft-ms", type=float, default=200.0)
+    ap.add_argument("--tps", type=float, default=50.0, help="decode tokens per second")
+    ap.add_argument("--prompt-tps", type=float, default=2000.0, help="prefill tokens per second (reported only)")
+    ap.add_argument("--load-ms", type=float, default=0.0)
+    ap.add_argument("--failure-rate", type=float, default=0.0)
+    ap.add_argument("--truncation-rate", type=float, default=0.0)
+    ap.add_argument("--capacity", type=int, default=0, help="requests served concurrently, the rest queue (0 = unlimited)")
+    ap.add_argument("--contention", type=float, default=0.0, help="slowdown per extra concurrent request (0.3 = +30%% each)")
+    ap.add_argument("--replay", default=None, help="JSONL file of recorded Ollama responses")
+    ap.add_argument("--seed", type=int, default=None)
+    return ap.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeOllamaConfig:
+    return FakeOllamaConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tps,
+        prompt_tokens_per_sec=args.prompt_tps,
+        load_ms=args.load_ms,
+        failure_rate=args.failure_rate,
+        truncation_rate=args.truncation_rate,
+        replay_file=args.replay,
+        capacity=args.capacity,
+        contention=args.contention,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = _parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,259 @@
+"""
+Offline re-scoring of stored model outputs.
+
+Runs every raw output of a corpus through the production post-processing
+(sanitize_model_output + score_compliance, as the job runner does) on all
+cores, and writes one JSON line per item plus an aggregate report. Use it to
+see what a change to SYSTEM_INSTRUCTION's expected format, GEN_MIN_SCORE or
+the validator weights does to a few thousand past outputs.
+
+Usage (from backend/):
+    python score.py outputs.jsonl -o scores.jsonl --report report.json
+    python score.py saved_pages/ --glob "*.txt" -o scores.jsonl
+    GEN_MIN_SCORE=0.85 python score.py outputs.jsonl --workers 8 --chunk-size 32
+
+A JSONL corpus has one object per line holding the raw model text in
+--text-field (default "raw") and optionally an id in --id-field; "-" reads
+stdin. A directory corpus is one file per output, read by the workers.
+Input is streamed and at most --max-pending chunks are in flight, so memory
+stays flat however large the corpus is.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, TextIO, Tuple
+
+BACKEND_ROOT = Path(__file__).resolve().parent
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.schemas import GenerateRequest  # noqa: E402
+from app.services.postprocess import postprocess_output  # noqa: E402
+
+# same variable and default as the job runner's pass threshold
+DEFAULT_MIN_SCORE = float(os.getenv("GEN_MIN_SCORE", "0.80"))
+
+# (item id, raw text or None, file to read it from or None, error or None)
+Item = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+
+def iter_jsonl(stream: TextIO, text_field: str, id_field: str) -> Iterator[Item]:
+    for lineno, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield str(lineno), None, None, "invalid_json"
+            continue
+        item_id = str(record.get(id_field, lineno)) if isinstance(record, dict) else str(lineno)
+        raw = record.get(text_field) if isinstance(record, dict) else None
+        if not isinstance(raw, str):
+            yield item_id, None, None, f"missing_{text_field}"
+            continue
+        yield item_id, raw, None, None
+
+
+def iter_directory(root: Path, pattern: str) -> Iterator[Item]:
+    # os.walk is lazy; only the current directory's listing is held in memory
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            if path.match(pattern):
+                yield path.relative_to(root).as_posix(), None, str(path), None
+
+
+def score_one(raw: str) -> Dict[str, Any]:
+    res = postprocess_output(raw, GenerateRequest(message=""), None)
+    return {
+        "score": round(res.score, 4),
+        "issues": res.issues,
+        "sanitize_ms": round(res.sanitize_seconds * 1000, 3),
+        "validate_ms": round(res.validate_seconds * 1000, 3),
+    }
+
+
+def score_chunk(chunk: List[Item]) -> List[Dict[str, Any]]:
+    """Worker entry point: one result per item, errors included (never raises)."""
+    out = []
+    for item_id, raw, path, error in chunk:
+        row: Dict[str, Any] = {"id": item_id}
+        if error is None and raw is None:
+            try:
+                raw = Path(path).read_text(encoding="utf-8", errors="replace")
+            except OSError as exc:
+                error = f"unreadable: {exc.strerror}"
+        if error is None:
+            row["bytes"] = len(raw.encode("utf-8"))
+            try:
+                row.update(score_one(raw))
+            except ValueError as exc:  # not a full HTML document after sanitizing
+                error = str(exc)
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+        if error is not None:
+            row["error"] = error
+        out.append(row)
+    return out
+
+
+def chunked(items: Iterator[Item], size: int) -> Iterator[List[Item]]:
+    chunk: List[Item] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Report:
+    """Aggregates in O(distinct issues) memory while results stream past."""
+
+    def __init__(self, min_score: float) -> None:
+        self.min_score = min_score
+        self.items = 0
+        self.scored = 0
+        self.passed = 0
+        self.errors: Counter = Counter()
+        self.issues: Counter = Counter()
+        self.score_buckets = [0] * 101  # per 0.01 of score
+        self.score_sum = 0.0
+        self.bytes = 0
+        self.cpu_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.items += 1
+        if "error" in row:
+            self.errors[row["error"].split(":", 1)[0]] += 1
+            return
+        self.scored += 1
+        score = row["score"]
+        row["passed"] = score >= self.min_score
+        self.passed += row["passed"]
+        self.score_sum += score
+        self.score_buckets[min(100, int(round(score * 100)))] += 1
+        self.issues.update(set(row["issues"]))
+        self.bytes += row["bytes"]
+        self.cpu_seconds += (row["sanitize_ms"] + row["validate_ms"]) / 1000
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Score of the q-th item, to 0.01."""
+        if not self.scored:
+            return None
+        rank, seen = q * self.scored, 0
+        for i, count in enumerate(self.score_buckets):
+            seen += count
+            if count and seen >= rank:
+                return i / 100
+        return 1.0
+
+    def histogram(self) -> Dict[str, int]:
+        """Items per score decile ("0.8" = [0.8, 0.9), "1.0" = perfect)."""
+        deciles = [0] * 11
+        for i, count in enumerate(self.score_buckets):
+            deciles[i // 10] += count
+        return {f"{i / 10:.1f}": c for i, c in enumerate(deciles)}
+
+    def to_dict(self, workers: int) -> Dict[str, Any]:
+        wall = time.perf_counter() - self.started
+        return {
+            "items": self.items,
+            "scored": self.scored,
+            "errors": sum(self.errors.values()),
+            "errors_by_kind": dict(self.errors.most_common()),
+            "min_score": self.min_score,
+            "passed": self.passed,
+            "pass_rate": round(self.passed / self.scored, 4) if self.scored else None,
+            "score": {
+                "mean": round(self.score_sum / self.scored, 4) if self.scored else None,
+                "p10": self.percentile(0.1),
+                "p50": self.percentile(0.5),
+                "p90": self.percentile(0.9),
+                "histogram": self.histogram(),
+            },
+            "issues": [
+                {"issue": issue, "items": count, "share": round(count / self.scored, 4)}
+                for issue, count in self.issues.most_common()
+            ],
+            "throughput": {
+                "workers": workers,
+                "wall_seconds": round(wall, 3),
+                "items_per_sec": round(self.items / wall, 1) if wall > 0 else None,
+                "mb_per_sec": round(self.bytes / 1e6 / wall, 3) if wall > 0 else None,
+                "cpu_seconds": round(self.cpu_seconds, 3),
+                "parallel_speedup": round(self.cpu_seconds / wall, 2) if wall > 0 else None,
+            },
+        }
+
+
+def run(items: Iterator[Item], out: TextIO, report: Report, workers: int, chunk_size: int, max_pending: int) -> None:
+    """Results are written in input order; the oldest chunk is awaited before submitting more."""
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in chunked(items, chunk_size):
+            if len(pending) >= max_pending:
+                _drain(pending.popleft(), out, report)
+            pending.append(pool.submit(score_chunk, chunk))
+        while pending:
+            _drain(pending.popleft(), out, report)
+
+
+def _drain(future: Future, out: TextIO, report: Report) -> None:
+    for row in future.result():
+        report.add(row)
+        out.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("corpus", help="JSONL file, '-' for stdin, or a directory of raw outputs")
+    ap.add_argument("-o", "--out", type=Path, default=Path("scores.jsonl"), help="per-item results (JSONL)")
+    ap.add_argument("--report", type=Path, default=None, help="also write the aggregate report here (JSON)")
+    ap.add_argument("--text-field", default="raw")
+    ap.add_argument("--id-field", default="id")
+    ap.add_argument("--glob", default="*", help="file name pattern for directory corpora")
+    ap.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE, help="pass threshold (GEN_MIN_SCORE)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk-size", type=int, default=16, help="items per task sent to a worker")
+    ap.add_argument("--max-pending", type=int, default=0, help="chunks in flight (default 4 x workers)")
+    args = ap.parse_args(argv)
+
+    workers = max(1, args.workers)
+    max_pending = args.max_pending or 4 * workers
+    report = Report(args.min_score)
+    corpus = Path(args.corpus)
+    source: Optional[TextIO] = None
+    if args.corpus == "-":
+        items = iter_jsonl(sys.stdin, args.text_field, args.id_field)
+    elif corpus.is_dir():
+        items = iter_directory(corpus, args.glob)
+    else:
+        source = corpus.open(encoding="utf-8")
+        items = iter_jsonl(source, args.text_field, args.id_field)
+    try:
+        with args.out.open("w", encoding="utf-8") as out:
+            run(items, out, report, workers, max(1, args.chunk_size), max(1, max_pending))
+    finally:
+        if source is not None:
+            source.close()
+
+    summary = report.to_dict(workers)
+    text = json.dumps(summary, indent=2)
+    if args.report:
+        args.report.write_text(text + "\n", encoding="utf-8")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# tests/test_batches.py
+import asyncio
+import time
+
+from app.routers import ai
+from app.schemas import BatchItem, GenerateRequest
+from app.services.batches import item_request, plan_batch
+from app.services.scheduler import GenerationScheduler, estimate_job_cost
+
+PAGE = "<!doctype html><html><body>" + "<p>landing copy</p>" * 200 + "</body></html>"
+
+
+def test_item_overrides_and_prefix_groups():
+    base = GenerateRequest(message="Restyle the hero section.", previous_html=PAGE, temperature=0.2)
+    items = [
+        BatchItem(append="Use a dark color scheme."),
+        BatchItem(message="Translate the page to Spanish."),
+        BatchItem(append="Use a pastel color scheme.", temperature=0.7),
+        BatchItem(previous_html="<html></html>"),
+    ]
+    req = item_request(base, items[2])
+    assert req.message == "Restyle the hero section.\nUse a pastel color scheme."
+    assert (req.previous_html, req.temperature, req.top_p) == (PAGE, 0.7, base.top_p)
+
+    plan = plan_batch(base, items)
+    assert [p.index for p in plan] == [0, 2, 1, 3]  # variants of the same prompt prefix are adjacent
+    dark, pastel, spanish, other = plan
+    assert dark.group == pastel.group and len({dark.group, spanish.group, other.group}) == 3
+    assert pastel.order == dark.order  # queued as one run
+    # only the first of a group pays for prefilling the shared page
+    assert dark.cost == estimate_job_cost(item_request(base, items[0]))
+    assert pastel.cost < estimate_job_cost(item_request(base, items[2]))
+    assert pastel.tokens < dark.tokens
+
+
+def test_batch_groups_run_back_to_back_without_starving_other_tenants():
+    ran = []
+
+    async def fake_runner(job_id, req):
+        ran.append(job_id)
+        await asyncio.sleep(0)
+
+    base = GenerateRequest(message="Landing page for a bakery.")
+    items = [BatchItem(append=f"Variant {i}.") for i in range(3)] + [
+        BatchItem(message=f"Other page {i}.", previous_html=PAGE) for i in range(3)
+    ]
+
+    async def main():
+        sched = GenerationScheduler(runner=fake_runner, workers=1, weights={})
+        plan = plan_batch(base, items)
+        for p in plan:
+            sched.submit(f"bulk-{p.index}", p.req, tenant="bulk", cost=p.cost, order=p.order)
+        sched.submit("interactive", GenerateRequest(message="Add a footer."), tenant="ui")
+        await sched.start()
+        while len(ran) < 7:
+            await asyncio.sleep(0.01)
+        await sched.stop()
+
+    asyncio.run(main())
+    assert ran.index("interactive") <= 1
+    bulk = [j for j in ran if j != "interactive"]
+    groups = ["a" if int(j.split("-")[1]) < 3 else "b" for j in bulk]
+    assert groups in (["a"] * 3 + ["b"] * 3, ["b"] * 3 + ["a"] * 3)
+
+
+def test_batch_endpoint_and_aggregated_progress(client):
+    r = client.post("/api/ai/generate/batch", json={
+        "base": {"message": "Pricing page for a gym."},
+        "items": [{"append": "Blue palette."}, {"append": "Red palette."}, {"message": "FAQ page for a gym."}],
+    })
+    assert r.status_code == 202
+    accepted = r.json()
+    assert len(accepted["job_ids"]) == 3
+
+    url = f"/api/ai/batch/{accepted['batch_id']}"
+    deadline = time.monotonic() + 15
+    while True:
+        r = client.get(url)
+        body = r.json()
+        if body["status"] == "done":
+            break
+        assert time.monotonic() < deadline
+        time.sleep(0.1)
+    assert body["total"] == 3 and body["progress"] == 1.0
+    assert [i["job_id"] for i in body["items"]] == accepted["job_ids"]
+    assert sum(body["counts"].values()) == 3
+    assert client.get(url, headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    assert client.get("/api/ai/jobs/stats").json()["batches"]["items"] >= 3
+
+
+def test_batch_validation(client, monkeypatch):
+    monkeypatch.setattr(ai, "BATCH_MAX_ITEMS", 2)
+    r = client.post("/api/ai/generate/batch", json={"base": {"message": "x"}, "items": [{}, {}, {}]})
+    assert r.status_code == 400 and r.json()["detail"]["status"] == "too_many_items"
+    r = client.post("/api/ai/generate/batch", json={"base": {"message": "x"}, "items": [{"message": " "}]})
+    assert r.status_code == 400 and r.json()["detail"] == {"status": "empty_message", "items": [0]}
+    assert client.post("/api/ai/generate/batch", json={"base": {"message": "x"}, "items": []}).status_code == 422
+    assert client.get("/api/ai/batch/unknown").status_code == 404
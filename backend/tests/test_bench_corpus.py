@@ -0,0 +1,40 @@
+# tests/test_bench_corpus.py
+# The benchmark corpus must be deterministic, otherwise baselines are meaningless.
+from benchmarks.corpus import KINDS, SIZES, generate
+
+
+def test_corpus_is_deterministic_and_sized():
+    for kind in KINDS:
+        a = generate(kind, SIZES["1k"], seed=1)
+        b = generate(kind, SIZES["1k"], seed=1)
+        assert a == b
+        assert len(a) >= SIZES["1k"]
+        assert generate(kind, SIZES["1k"], seed=2) != a
+
+
+def test_only_new_timeouts_and_regressions_fail():
+    from benchmarks.run_benchmarks import compare
+
+    fast, slow, timeout = {"ops_per_sec": 100.0}, {"ops_per_sec": 50.0}, {"timeout": True}
+    assert compare(timeout, timeout, 0.25) == ("TIMEOUT (as in baseline)", False)
+    assert compare(timeout, fast, 0.25)[1] is True
+    assert compare(timeout, None, 0.25)[1] is True
+    assert compare(slow, fast, 0.25)[1] is True
+    assert compare(fast, slow, 0.25)[1] is False
+    assert compare(fast, timeout, 0.25)[1] is False
+    # half the ops/sec on a runner half as fast (per the calibration workload) is not a regression
+    assert compare({**slow, "calibration_ops_per_sec": 5.0}, {**fast, "calibration_ops_per_sec": 10.0}, 0.25)[1] is False
+    assert compare({**slow, "calibration_ops_per_sec": 10.0}, {**fast, "calibration_ops_per_sec": 10.0}, 0.25)[1] is True
+
+
+def test_committed_baseline_covers_the_default_matrix():
+    import json
+
+    from benchmarks.run_benchmarks import DEFAULT_BASELINE, DEFAULT_SIZES, FUNCTIONS, LARGE_SIZES
+
+    baseline = json.loads(DEFAULT_BASELINE.read_text())
+    for func in FUNCTIONS:
+        for kind in KINDS:
+            for size in DEFAULT_SIZES + LARGE_SIZES:
+                case = baseline[f"{func}/{kind}/{size}"]
+                assert case.get("timeout") or case["calibration_ops_per_sec"] > 0
@@ -0,0 +1,149 @@
+# tests/test_cancel.py
+import asyncio
+import threading
+import time
+
+from app.schemas import GenerateRequest, JobStatus
+from app.services import runner
+from app.services.jobs import job_store
+from app.services.scheduler import GenerationScheduler
+
+
+def test_scheduler_cancels_queued_and_running_jobs():
+    started, finished, cancelled = [], [], []
+
+    async def fake_runner(job_id, req):
+        started.append(job_id)
+        try:
+            await asyncio.sleep(0 if job_id == "c" else 10)
+        except asyncio.CancelledError:
+            cancelled.append(job_id)
+            raise
+        finished.append(job_id)
+
+    async def main():
+        sched = GenerationScheduler(runner=fake_runner, workers=1, weights={})
+        await sched.start()
+        for job_id in ("a", "b", "c"):
+            sched.submit(job_id, GenerateRequest(message=job_id), tenant="t")
+        while not started:
+            await asyncio.sleep(0.01)
+        assert sched.cancel("b") == "queued"
+        assert sched.cancel(started[0]) == "running"
+        assert sched.cancel("nope") is None
+        while "c" not in finished:
+            await asyncio.sleep(0.01)
+        snap = sched.snapshot()
+        await sched.stop()
+        return snap
+
+    snap = asyncio.run(main())
+    assert started == ["a", "c"]  # b never ran, the worker survived a's cancellation
+    assert cancelled == ["a"]
+    assert snap["queued"] == 0 and snap["running"] == 0
+
+
+def test_delete_aborts_in_flight_llm_call(client, monkeypatch):
+    in_call = threading.Event()
+    aborted = threading.Event()
+
+    async def hanging_completion(prompt, payload, model=None):
+        in_call.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            aborted.set()  # the httpx client context would close the Ollama request here
+            raise
+
+    monkeypatch.setattr(runner, "generate_completion", hanging_completion)
+    monkeypatch.setattr(runner, "GENERATION_TIMEOUT_SECONDS", 30)
+    job_id = client.post("/api/ai/generate", json={"message": "cancel me"}).json()["job_id"]
+    assert in_call.wait(5)
+
+    r = client.delete(f"/api/ai/jobs/{job_id}")
+    assert r.status_code == 200
+    assert r.json()["status"] == "cancelled"
+    assert aborted.wait(5)
+
+    res = client.get(f"/api/ai/result/{job_id}").json()
+    assert res["status"] == "cancelled"
+    assert res["error"] == "Cancelled (client)."
+    assert client.delete(f"/api/ai/jobs/{job_id}").status_code == 409
+
+    totals = client.get("/api/ai/jobs/stats").json()["total"]
+    assert totals["cancelled"] >= 1
+
+
+def test_late_runner_writes_do_not_resurrect_cancelled_job():
+    async def main():
+        job = await job_store.create_job(GenerateRequest(message="late"))
+        assert await job_store.cancel(job.job_id, "client") == JobStatus.received
+        await job_store.set_result(job.job_id, None, "too late")
+        await job_store.set_status(job.job_id, JobStatus.failed)
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == JobStatus.cancelled
+    assert job.error == "Cancelled (client)."
+
+
+def test_cancel_while_the_worker_fails_an_expired_job():
+    started, finished = [], []
+    expiring = asyncio.Event()
+
+    async def fake_runner(job_id, req):
+        started.append(job_id)
+        await asyncio.sleep(10)
+        finished.append(job_id)
+
+    async def slow_expire(job_id):
+        expiring.set()
+        await asyncio.sleep(0.2)
+
+    async def main():
+        sched = GenerationScheduler(runner=fake_runner, workers=1, weights={}, on_expired=slow_expire)
+        req = GenerateRequest(message="same")
+        sched.submit("late", req, tenant="t", deadline=time.monotonic() - 1)
+        sched.submit("live", req, tenant="t")
+        await sched.start()
+        await asyncio.wait_for(expiring.wait(), 2)
+        stage = sched.cancel("live")  # the worker is still awaiting the expiry handler
+        await asyncio.sleep(0.3)
+        await sched.stop()
+        return stage
+
+    assert asyncio.run(main()) == "running"
+    assert finished == []
+
+
+def test_runner_does_not_start_a_cancelled_job(monkeypatch):
+    calls = []
+
+    async def fake_completion(prompt, payload, model=None):
+        calls.append(prompt)
+        raise AssertionError("must not be called")
+
+    monkeypatch.setattr(runner, "generate_completion", fake_completion)
+
+    async def main():
+        job = await job_store.create_job(GenerateRequest(message="cancel me first"))
+        await job_store.cancel(job.job_id, "client")
+        await runner.run_generation_job(job.job_id, job.request)
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == JobStatus.cancelled and calls == []
+
+
+def test_abandonment_policy_cancels_unpolled_jobs():
+    async def main():
+        stale = await job_store.create_job(GenerateRequest(message="nobody polls me"))
+        fresh = await job_store.create_job(GenerateRequest(message="watched"))
+        stale.last_polled_at = time.monotonic() - 120
+        await runner.cancel_abandoned_jobs(60)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(main())
+    assert stale.status == JobStatus.cancelled
+    assert stale.error == "Cancelled (abandoned)."
+    assert fresh.status == JobStatus.received
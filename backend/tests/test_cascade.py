@@ -0,0 +1,39 @@
+# tests/test_cascade.py
+from app.services import cascade
+from app.services.cascade import ModelLadder
+
+
+def test_ladder_starts_cheap_and_escalates():
+    ladder = ModelLadder(["small", "medium", "large"])
+    tier = ladder.start_tier()
+    assert ladder.model(tier) == "small"
+    tier = ladder.escalate(tier)
+    assert ladder.model(tier) == "medium"
+    tier = ladder.escalate(ladder.escalate(tier))
+    assert ladder.model(tier) == "large"
+    assert not ladder.can_escalate(tier)
+
+
+def test_ladder_skips_tier_with_low_pass_rate(monkeypatch):
+    monkeypatch.setattr(cascade, "CASCADE_PROBE_EVERY", 0)
+    ladder = ModelLadder(["small", "large"])
+    for _ in range(cascade.CASCADE_MIN_SAMPLES):
+        ladder.record_attempt(0, passed=False, gpu_seconds=1.0)
+    assert ladder.start_tier() == 1
+
+    # pass rate recovers after the tier starts passing again
+    for _ in range(50):
+        ladder.record_attempt(0, passed=True, gpu_seconds=1.0)
+    assert ladder.start_tier() == 0
+
+
+def test_ladder_snapshot_reports_gpu_seconds_per_finished_job():
+    ladder = ModelLadder(["only"])
+    ladder.record_attempt(0, passed=False, truncated=True, gpu_seconds=2.0)
+    ladder.record_attempt(0, passed=True, gpu_seconds=1.0)
+    ladder.record_job(finished=True, gpu_seconds=3.0)
+    ladder.record_job(finished=False, gpu_seconds=3.0)
+    snap = ladder.snapshot()
+    assert snap["tiers"][0]["truncated"] == 1
+    assert snap["tiers"][0]["passes"] == 1
+    assert snap["gpu_seconds_per_finished_job"] == 6.0
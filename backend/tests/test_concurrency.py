@@ -0,0 +1,131 @@
+# tests/test_concurrency.py
+import asyncio
+import time
+
+import httpx
+
+from app.schemas import GenerateRequest
+from app.services.concurrency import AdaptiveLimiter, WindowedMin
+from app.services.scheduler import GenerationScheduler
+from loadtest.fake_ollama import FakeOllamaConfig, create_app
+
+
+def test_windowed_min():
+    w = WindowedMin(3)
+    assert [w.add(v) for v in (5, 3, 4, 6, 7, 8)] == [5, 3, 3, 3, 4, 6]
+
+
+def test_limit_grows_while_latency_is_flat_and_shrinks_when_it_inflates():
+    limiter = AdaptiveLimiter(enabled=True, initial=2, max_limit=32)
+    for _ in range(60):
+        limiter.in_flight = limiter.capacity  # saturated: every slot in use
+        limiter.observe(0.01)
+    grown = limiter.capacity
+    assert grown >= 8
+    for _ in range(30):
+        limiter.in_flight = limiter.capacity
+        limiter.observe(0.04)  # 4x the baseline
+    assert limiter.capacity < grown / 2
+    before = limiter.limit
+    limiter.record_drop()
+    assert limiter.limit == max(limiter.min_limit, before * limiter.backoff)
+    assert limiter.history[-1][2] in ("drop", "latency")
+
+
+def test_idle_limiter_does_not_grow():
+    limiter = AdaptiveLimiter(enabled=True, initial=4)
+    limiter.in_flight = 1
+    for _ in range(20):
+        limiter.observe(0.01)
+    assert limiter.capacity == 4
+
+
+def test_cancelled_waiter_gives_its_place_back():
+    async def scenario():
+        limiter = AdaptiveLimiter(enabled=True, initial=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        return limiter.in_flight, limiter.snapshot()["waiting"]
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_cancelling_a_slot_is_not_a_drop():
+    async def scenario():
+        limiter = AdaptiveLimiter(enabled=True, initial=4)
+
+        async def hold():
+            async with limiter.slot():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return limiter.drops, limiter.in_flight
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_scheduler_dispatches_up_to_the_adaptive_limit():
+    """Jobs beyond the limit wait in the fair queue, not inside a runner (and its attempt timeout)."""
+    started = []
+
+    async def scenario():
+        gate = asyncio.Event()
+        limiter = AdaptiveLimiter(enabled=True, initial=1, max_limit=4)
+
+        async def runner(job_id, req):
+            started.append(job_id)
+            await gate.wait()
+
+        sched = GenerationScheduler(runner=runner, workers=1, weights={}, limiter=limiter, expiry_sweep=0)
+        for i in range(4):
+            sched.submit(f"job-{i}", GenerateRequest(message="same size"))
+        await sched.start()
+        await asyncio.sleep(0.05)
+        first = (len(started), sched.snapshot()["queued"])
+        limiter._set(3, "probe")  # the limit grows: more jobs leave the queue
+        await asyncio.sleep(0.05)
+        second = (len(started), sched.snapshot()["queued"], sched.snapshot()["workers"])
+        gate.set()
+        while len(started) < 4 or sched.snapshot()["running"]:
+            await asyncio.sleep(0.01)
+        await sched.stop()
+        return first, second, limiter.in_flight
+
+    first, second, in_flight = asyncio.run(scenario())
+    assert first == (1, 3)
+    assert second == (3, 1, 4)  # GEN_WORKERS is ignored: the pool is sized to the max limit
+    assert in_flight == 0  # slots are returned as jobs finish
+
+
+def test_converges_near_fake_ollama_capacity():
+    """Closed loop of 12 clients against a fake Ollama that serves 4 requests at a time."""
+
+    async def scenario():
+        app = create_app(FakeOllamaConfig(ttft_ms=20, tokens_per_sec=0, capacity=4, seed=1))
+        limiter = AdaptiveLimiter(enabled=True, initial=1, max_limit=16)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake") as client:
+
+            async def worker():
+                for _ in range(15):
+                    async with limiter.slot() as slot:
+                        t0 = time.perf_counter()
+                        r = await client.post("/api/generate", json={"prompt": "x", "stream": False})
+                        slot.sample = (time.perf_counter() - t0) / max(1, r.json()["eval_count"])
+
+            await asyncio.gather(*(worker() for _ in range(12)))
+        return limiter, app.state.fake
+
+    limiter, fake = asyncio.run(scenario())
+    assert limiter.samples == 180
+    # with the default 1.5x latency tolerance the knee is ~2x the fake's capacity,
+    # well below the 12 clients / 16 max it would otherwise run at
+    assert 3 <= limiter.capacity <= 9
+    assert max(h[1] for h in limiter.history) >= 4  # it did probe upwards
+    assert fake.max_active == 4
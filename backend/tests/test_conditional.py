@@ -0,0 +1,87 @@
+# tests/test_conditional.py
+import asyncio
+
+from app.compression import choose_encoding
+from app import conditional
+from app.conditional import etag_matches, matched_etag
+from app.schemas import GenerateRequest
+from app.services.jobs import JobStatus, job_store
+
+
+def test_etag_matching_accepts_weak_and_encoded_variants():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "zzz"', '"abc"')
+    assert etag_matches('"abc-gzip"', '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_choose_encoding_honours_q_zero():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("") is None
+
+
+def test_result_returns_304_until_job_changes(client):
+    job = asyncio.run(job_store.create_job(GenerateRequest(message="etag me")))
+    url = f"/api/ai/result/{job.job_id}"
+
+    first = client.get(url)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    asyncio.run(job_store.set_status(job.job_id, JobStatus.failed))
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_job_list_etag_follows_store_version(client):
+    etag = client.get("/api/ai/jobs").headers["etag"]
+    assert client.get("/api/ai/jobs", headers={"If-None-Match": etag}).status_code == 304
+
+    asyncio.run(job_store.create_job(GenerateRequest(message="new job")))
+    assert client.get("/api/ai/jobs", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_version_etags_do_not_survive_a_restart(client, monkeypatch):
+    etag = client.get("/api/ai/jobs").headers["etag"]
+    monkeypatch.setattr(conditional, "BOOT_ID", "next-process")  # same store version, new process
+    r = client.get("/api/ai/jobs", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+
+
+def test_large_bodies_are_gzipped_with_encoded_etag(client):
+    for i in range(12):
+        job = asyncio.run(job_store.create_job(GenerateRequest(message=f"page {i}")))
+    url = "/api/ai/jobs"
+    r = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"].endswith('-gzip"')
+    assert "accept-encoding" in r.headers["vary"].lower()
+    assert job.job_id in r.text  # httpx decodes transparently
+
+    # the encoded ETag revalidates too, and the 304 echoes that same validator
+    again = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["etag"]})
+    assert again.status_code == 304
+    assert again.headers["etag"] == r.headers["etag"]
+    assert "accept-encoding" in again.headers["vary"].lower()
+
+
+def test_matched_etag_prefers_the_negotiated_variant():
+    assert matched_etag('"abc-gzip"', '"abc"', "gzip") == '"abc-gzip"'
+    assert matched_etag('W/"abc-gzip"', '"abc"') == '"abc-gzip"'
+    assert matched_etag('"abc", "abc-gzip"', '"abc"', "gzip") == '"abc-gzip"'
+    assert matched_etag('"abc", "abc-gzip"', '"abc"', None) == '"abc"'
+    assert matched_etag("*", '"abc"', "br") == '"abc-br"'
+    assert matched_etag('"abd"', '"abc"', "gzip") is None
+
+
+def test_small_bodies_are_not_compressed(client):
+    r = client.get("/api/ai/health", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200 and r.json()["status"] == "ok"
+    assert "content-encoding" not in r.headers
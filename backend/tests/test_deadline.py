@@ -0,0 +1,147 @@
+# tests/test_deadline.py
+import asyncio
+import time
+
+from app.schemas import GenerateRequest, JobStatus
+from app.services import jobs, runner
+from app.services.jobs import job_deadline_seconds, job_store
+from app.services.llm import LLMReply
+from app.services.postprocess import PostProcessResult
+from app.services.scheduler import GenerationScheduler
+
+
+def test_client_can_only_tighten_the_deadline(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_DEADLINE_SECONDS", 300.0)
+    assert job_deadline_seconds(GenerateRequest(message="x")) == 300.0
+    assert job_deadline_seconds(GenerateRequest(message="x", deadline_seconds=20)) == 20
+    assert job_deadline_seconds(GenerateRequest(message="x", deadline_seconds=900)) == 300.0
+    monkeypatch.setattr(jobs, "JOB_DEADLINE_SECONDS", 0.0)
+    assert job_deadline_seconds(GenerateRequest(message="x")) is None
+    assert job_deadline_seconds(GenerateRequest(message="x", deadline_seconds=5)) == 5
+
+
+def test_scheduler_never_dispatches_expired_jobs():
+    ran, expired = [], []
+
+    async def fake_runner(job_id, req):
+        ran.append(job_id)
+
+    async def on_expired(job_id):
+        expired.append(job_id)
+
+    async def main():
+        sched = GenerationScheduler(runner=fake_runner, workers=1, weights={}, on_expired=on_expired)
+        now = time.monotonic()
+        sched.submit("late", GenerateRequest(message="a"), tenant="t", deadline=now - 1)
+        sched.submit("ok", GenerateRequest(message="bb"), tenant="t", deadline=now + 60)
+        await sched.start()
+        while not ran or not expired:
+            await asyncio.sleep(0.01)
+        snap = sched.snapshot()
+        await sched.stop()
+        return snap
+
+    snap = asyncio.run(main())
+    assert ran == ["ok"] and expired == ["late"]
+    assert snap["tenants"]["t"]["expired"] == 1
+    assert snap["tenants"]["t"]["dispatched"] == 1
+
+
+def test_queued_jobs_expire_while_every_worker_is_busy():
+    expired = []
+    release = asyncio.Event()
+
+    async def busy_runner(job_id, req):
+        await release.wait()
+
+    async def on_expired(job_id):
+        expired.append(job_id)
+
+    async def main():
+        sched = GenerationScheduler(runner=busy_runner, workers=1, weights={}, on_expired=on_expired, expiry_sweep=0.05)
+        sched.submit("long", GenerateRequest(message="a"), tenant="t")
+        sched.submit("late", GenerateRequest(message="bb"), tenant="t", deadline=time.monotonic() + 0.1)
+        await sched.start()
+        await asyncio.sleep(0.4)
+        snap = sched.snapshot()
+        release.set()
+        await sched.stop()
+        return snap
+
+    snap = asyncio.run(main())
+    assert expired == ["late"]
+    assert snap["queued"] == 0 and snap["tenants"]["t"]["expired"] == 1
+
+
+def test_timed_out_attempts_raise_the_attempt_estimate(monkeypatch):
+    from app.services.cascade import ModelLadder
+
+    async def hanging_completion(prompt, payload, model=None):
+        await asyncio.sleep(30)
+
+    ladder = ModelLadder(["m"])
+    ladder.record_attempt(0, passed=True, seconds=0.05)
+    monkeypatch.setattr(runner, "model_ladder", ladder)
+    monkeypatch.setattr(runner, "generate_completion", hanging_completion)
+    monkeypatch.setattr(runner, "GENERATION_TIMEOUT_SECONDS", 0.3)
+
+    async def main():
+        job = await job_store.create_job(GenerateRequest(message="slow model"))
+        await runner.run_generation_job(job.job_id, job.request)
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == JobStatus.failed
+    assert ladder.expected_attempt_seconds(0) > 0.05
+    assert ladder.snapshot()["tiers"][0]["errors"] == 1
+
+
+def test_attempt_timeout_is_clamped_to_the_deadline(monkeypatch):
+    async def hanging_completion(prompt, payload, model=None):
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(runner, "generate_completion", hanging_completion)
+    monkeypatch.setattr(runner, "GENERATION_TIMEOUT_SECONDS", 30)
+
+    async def main():
+        job = await job_store.create_job(GenerateRequest(message="slow"))
+        job.deadline = time.monotonic() + 0.2
+        t0 = time.monotonic()
+        await runner.run_generation_job(job.job_id, job.request)
+        return job, time.monotonic() - t0
+
+    job, elapsed = asyncio.run(main())
+    assert elapsed < 2
+    assert job.status == JobStatus.failed
+    assert job.error == "Job deadline exceeded during attempt 1"
+
+
+def test_retries_and_backoff_stop_when_an_attempt_cannot_fit(monkeypatch):
+    calls = []
+
+    async def quick_completion(prompt, payload, model=None):
+        calls.append(model)
+        return LLMReply(text="<!doctype html><html></html>", model=model or "m")
+
+    class LowScore:
+        async def run(self, raw, req, expected_svgs, minify_min_score=None):
+            return PostProcessResult(html=raw, score=0.1, issues=["too plain"])
+
+    monkeypatch.setattr(runner, "generate_completion", quick_completion)
+    monkeypatch.setattr(runner, "postprocessor", LowScore())
+    monkeypatch.setattr(runner, "MAX_RETRIES", 5)
+    monkeypatch.setattr(runner, "RETRY_BASE_DELAY_SECONDS", 30.0)
+    monkeypatch.setattr(runner.model_ladder, "expected_attempt_seconds", lambda tier: 5.0)
+
+    async def main():
+        job = await job_store.create_job(GenerateRequest(message="meh"))
+        job.deadline = time.monotonic() + 2
+        t0 = time.monotonic()
+        await runner.run_generation_job(job.job_id, job.request)
+        return job, time.monotonic() - t0
+
+    job, elapsed = asyncio.run(main())
+    assert len(calls) == 1
+    assert elapsed < 1  # neither the 30s backoff nor a second attempt
+    assert job.status == JobStatus.failed
+    assert job.error == "Job deadline exceeded before attempt 2: too plain"
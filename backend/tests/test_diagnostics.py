@@ -0,0 +1,164 @@
+# tests/test_diagnostics.py
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from logging.handlers import QueueHandler
+
+from app import logs
+from app.routers import admin
+from app.schemas import GenerateRequest, JobStatus
+from app.services import runner
+from app.services.diagnostics import LoopMonitor, SamplingProfiler, collapse, render_collapsed
+from app.services.jobs import job_store
+from app.services.llm import LLMError
+
+
+def _spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_collapsed_stack_format():
+    def inner():
+        return collapse(__import__("sys")._getframe(), root="MainThread")
+
+    stack = inner()
+    assert stack.startswith("MainThread;")
+    assert stack.endswith("tests/test_diagnostics.py:test_collapsed_stack_format.<locals>.inner")
+    assert render_collapsed(Counter({"a;b": 3, "a;c": 5})) == "a;c 5\na;b 3\n"
+
+
+def test_global_run_samples_every_thread():
+    async def scenario():
+        prof = SamplingProfiler(hz=200)
+        assert prof.start(5)
+        assert not prof.start(5)  # one run at a time
+        _spin(0.3)
+        prof.stop()
+        return prof
+
+    prof = asyncio.run(scenario())
+    assert not prof.running and prof.result_samples > 10
+    assert "test_diagnostics.py:_spin" in prof.result
+    assert any(line.startswith("MainThread;") for line in prof.result.splitlines())
+
+
+def test_task_watch_counts_its_own_and_spawned_tasks_only():
+    async def job():
+        _spin(0.1)
+        await asyncio.wait_for(child(), 5)  # runs in a task of its own
+
+    async def child():
+        await asyncio.sleep(0)
+        _spin(0.1)
+
+    async def bystander():
+        await asyncio.sleep(0.25)
+        _spin(0.1)
+
+    async def scenario():
+        prof = SamplingProfiler(hz=200)
+        other = asyncio.create_task(bystander())
+        task = asyncio.create_task(job())
+        prof.watch(task)
+        await task
+        await other
+        return prof.unwatch(task)
+
+    result = asyncio.run(scenario())
+    assert 5 < result["samples"] <= result["wall_samples"]
+    assert "test_diagnostics.py:test_task_watch_counts_its_own_and_spawned_tasks_only.<locals>.child" in result["collapsed"]
+    assert "bystander" not in result["collapsed"]
+
+
+def test_watchdog_reports_the_blocking_call():
+    def _block():
+        time.sleep(0.4)
+
+    async def scenario():
+        mon = LoopMonitor(interval=0.02, slow_seconds=0.1)
+        await mon.start()
+        await asyncio.sleep(0.1)
+        _block()
+        await asyncio.sleep(0.1)
+        await mon.stop()
+        return mon
+
+    mon = asyncio.run(scenario())
+    assert len(mon.stalls) == 1
+    assert mon.stalls[0]["stalled_seconds"] >= 0.1
+    assert mon.stalls[0]["stack"].endswith("_block")
+    assert mon.max_lag >= 0.3
+
+
+def test_profiled_job_keeps_its_samples(monkeypatch):
+    async def busy_completion(prompt, payload, model=None):
+        _spin(0.2)
+        raise LLMError("model unavailable")
+
+    monkeypatch.setattr(runner, "generate_completion", busy_completion)
+
+    async def main():
+        job = await job_store.create_job(GenerateRequest(message="profile me"))
+        job.profile = True
+        await runner.run_generation_job(job.job_id, job.request)
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == JobStatus.failed
+    assert job.profile_result["samples"] > 0
+    assert "busy_completion" in job.profile_result["collapsed"]
+
+
+def test_admin_endpoints_are_hidden_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    assert client.get("/api/ai/admin/loop").status_code == 404
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/api/ai/admin/loop", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+
+def test_admin_profile_run_and_download(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+    headers = {"X-Admin-Token": "s3cret"}
+    r = client.post("/api/ai/admin/profile?seconds=0.2", headers=headers)
+    assert r.status_code == 202 and r.json()["running"]
+    assert client.post("/api/ai/admin/profile?seconds=1", headers=headers).status_code == 409
+    assert client.get("/api/ai/admin/profile", headers=headers).status_code == 409
+    deadline = time.monotonic() + 5
+    while client.get("/api/ai/admin/loop", headers=headers).json()["profiler"]["running"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    r = client.get("/api/ai/admin/profile", headers={"Authorization": "Bearer s3cret"})
+    assert r.status_code == 200
+    assert r.headers["content-disposition"] == 'attachment; filename="profile.collapsed"'
+    assert int(r.headers["x-profile-samples"]) > 0
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in r.text.splitlines())
+
+
+def test_queued_logging_writes_from_a_listener_thread(monkeypatch):
+    monkeypatch.setattr(logs, "_listener", None)
+    monkeypatch.setattr(logs, "_queue_handler", None)
+    monkeypatch.setattr(logs, "_replaced", [])
+    seen = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            seen.append((record.getMessage(), threading.current_thread() is threading.main_thread()))
+
+    root = logging.getLogger()
+    saved, level = root.handlers[:], root.level
+    capture = Capture()
+    root.handlers = [capture]
+    try:
+        logs.start_queued_logging("INFO")
+        assert isinstance(root.handlers[0], QueueHandler)
+        logging.getLogger("app.services.runner").info("job %s done", "abc")
+        logs.stop_queued_logging()
+        assert seen == [("job abc done", False)]
+        assert root.handlers == [capture]
+    finally:
+        root.handlers = saved
+        root.setLevel(level)
@@ -0,0 +1,124 @@
+# tests/test_events.py
+import asyncio
+import json
+
+from app.main import app
+from app.schemas import GenerateRequest, JobStatus
+from app.services.events import JobEventHub, job_events
+from app.services.jobs import InMemoryJobStore
+
+
+def parse(chunk: bytes):
+    """[(event, data)] from a chunk of SSE frames (comments and retry skipped)."""
+    out = []
+    for block in chunk.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if line.startswith(("event:", "data:")))
+        if "event" in fields:
+            out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+def test_snapshot_then_coalesced_deltas():
+    async def scenario():
+        store = InMemoryJobStore()
+        old = await store.create_job(GenerateRequest(message="before"))
+        hub = JobEventHub(store, flush_interval=0)
+        sub = hub.subscribe()
+        stream = hub.stream(sub)
+        first = parse(await stream.__anext__())
+
+        job = await store.create_job(GenerateRequest(message="new"))
+        await store.set_status(job.job_id, JobStatus.processing)
+        await store.set_status(job.job_id, JobStatus.finished)
+        await store.set_status(old.job_id, JobStatus.processing)
+        second = parse(await asyncio.wait_for(stream.__anext__(), 1))
+        await stream.aclose()
+        return old, job, first, second, store
+
+    old, job, first, second, store = asyncio.run(scenario())
+    assert first[0][0] == "snapshot"
+    assert [j["job_id"] for j in first[0][1]["jobs"]] == [old.job_id]
+    assert first[0][1]["stats"]["live"]["received"] == 1
+
+    # three writes to the new job arrive as one job_created with its latest status
+    assert [(e, d.get("job_id"), d.get("status")) for e, d in second[:2]] == [
+        ("job_created", job.job_id, "finished"),
+        ("job_updated", old.job_id, "processing"),
+    ]
+    assert second[2][0] == "stats"
+    assert second[2][1]["live"]["finished"] == 1 and second[2][1]["total"]["created"] == 2
+    assert store._listeners == []  # detached with the last subscriber
+
+
+def test_slow_subscriber_overflow_resyncs_with_a_snapshot():
+    async def scenario():
+        store = InMemoryJobStore()
+        hub = JobEventHub(store, buffer_size=2, flush_interval=0)
+        sub = hub.subscribe()
+        stream = hub.stream(sub)
+        await stream.__anext__()
+        for i in range(5):
+            await store.create_job(GenerateRequest(message=f"job {i}"))
+        chunk = parse(await asyncio.wait_for(stream.__anext__(), 1))
+        resyncs = sub.resyncs
+        await stream.aclose()
+        return chunk, resyncs
+
+    chunk, resyncs = asyncio.run(scenario())
+    assert resyncs == 1
+    assert [e for e, _ in chunk] == ["snapshot"]
+    assert len(chunk[0][1]["jobs"]) == 5
+
+
+def test_live_counts_are_maintained_incrementally():
+    async def scenario():
+        store = InMemoryJobStore()
+        jobs = [await store.create_job(GenerateRequest(message=str(i))) for i in range(3)]
+        await store.set_status(jobs[0].job_id, JobStatus.processing)
+        await store.set_status(jobs[0].job_id, JobStatus.finished)
+        await store.cancel(jobs[1].job_id, "client")
+        return await store.stats(), jobs
+
+    live, jobs = asyncio.run(scenario())
+    assert live[JobStatus.received] == 1
+    assert live[JobStatus.processing] == 0
+    assert live[JobStatus.finished] == 1
+    assert live[JobStatus.cancelled] == 1
+
+
+def test_events_endpoint_streams_a_snapshot():
+    async def scenario():
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/api/ai/jobs/events", "raw_path": b"/api/ai/jobs/events",
+            "root_path": "", "query_string": b"", "headers": [(b"host", b"test")],
+            "client": ("127.0.0.1", 1234), "server": ("test", 80),
+        }
+        messages, got_body = [], asyncio.Event()
+
+        async def receive():
+            await got_body.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if message.get("body"):
+                got_body.set()
+
+        await asyncio.wait_for(app(scope, receive, send), 5)
+        return messages
+
+    messages = asyncio.run(scenario())
+    start, body = messages[0], messages[1]["body"]
+    assert start["status"] == 200
+    assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+    assert body.startswith(b"retry: 3000")
+    assert parse(body)[0][0] == "snapshot"
+    assert job_events.subscribers == 0
+
+
+def test_events_endpoint_limits_subscribers(client, monkeypatch):
+    monkeypatch.setattr(job_events, "max_subscribers", 0)
+    r = client.get("/api/ai/jobs/events")
+    assert r.status_code == 503
+    assert r.json()["detail"]["status"] == "too_many_subscribers"
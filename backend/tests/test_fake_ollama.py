@@ -0,0 +1,38 @@
+# tests/test_fake_ollama.py
+import json
+
+from fastapi.testclient import TestClient
+
+from app.services.validator import score_compliance
+from loadtest.fake_ollama import FakeOllamaConfig, create_app
+
+
+def _client(**kw) -> TestClient:
+    cfg = FakeOllamaConfig(ttft_ms=0, tokens_per_sec=0, seed=1, **kw)
+    return TestClient(create_app(cfg))
+
+
+def test_generate_non_streaming_returns_valid_page():
+    c = _client()
+    r = c.post("/api/generate", json={"model": "m", "prompt": "hi", "stream": False})
+    data = r.json()
+    assert r.status_code == 200 and data["done"] is True
+    assert data["done_reason"] == "stop"
+    assert data["eval_count"] > 0 and "eval_duration" in data
+    score, _ = score_compliance(data["response"])
+    assert score >= 0.8
+
+
+def test_chat_streaming_ndjson():
+    c = _client()
+    r = c.post("/api/chat", json={"model": "m", "messages": [{"role": "user", "content": "hi"}]})
+    lines = [json.loads(l) for l in r.text.splitlines() if l]
+    assert lines[-1]["done"] is True
+    assert "".join(l["message"]["content"] for l in lines).startswith("```html")
+    assert c.get("/api/ps").json()["models"][0]["name"] == "m"
+
+
+def test_injected_failures_and_truncation():
+    assert _client(failure_rate=1.0).post("/api/generate", json={"stream": False}).status_code == 500
+    data = _client(truncation_rate=1.0).post("/api/generate", json={"stream": False}).json()
+    assert data["done_reason"] == "length"
@@ -0,0 +1,62 @@
+# tests/test_idempotency.py
+import asyncio
+
+import pytest
+
+from app.schemas import GenerateRequest
+from app.services.jobs import IdempotencyConflict, IdempotencyIndex, InMemoryJobStore
+
+
+def test_same_key_replays_the_original_job(client):
+    headers = {"Idempotency-Key": "msg-1", "Authorization": "Bearer idem-tenant"}
+    first = client.post("/api/ai/generate", json={"message": "landing page"}, headers=headers)
+    again = client.post("/api/ai/generate", json={"message": "landing page"}, headers=headers)
+    assert first.status_code == again.status_code == 202
+    assert again.json()["job_id"] == first.json()["job_id"]
+    assert again.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+    # keys are scoped per client
+    other = client.post("/api/ai/generate", json={"message": "landing page"},
+                        headers={"Idempotency-Key": "msg-1", "Authorization": "Bearer someone-else"})
+    assert other.json()["job_id"] != first.json()["job_id"]
+
+
+def test_key_reused_with_different_body_is_rejected(client):
+    headers = {"Idempotency-Key": "msg-2", "Authorization": "Bearer idem-tenant"}
+    job_id = client.post("/api/ai/generate", json={"message": "one"}, headers=headers).json()["job_id"]
+    r = client.post("/api/ai/generate", json={"message": "two"}, headers=headers)
+    assert r.status_code == 422
+    assert r.json()["detail"] == {
+        "status": "idempotency_conflict",
+        "job_id": job_id,
+        "reason": "Idempotency-Key was already used with a different request body.",
+    }
+
+
+def test_concurrent_create_or_get_creates_one_job():
+    store = InMemoryJobStore()
+    req = GenerateRequest(message="race")
+
+    async def main():
+        return await asyncio.gather(*(store.create_or_get_job(req, "t", "k") for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert len({job.job_id for job, _ in results}) == 1
+    assert sum(created for _, created in results) == 1
+    assert len(store._jobs) == 1
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(store.create_or_get_job(GenerateRequest(message="other"), "t", "k"))
+
+
+def test_index_is_bounded_and_expires():
+    index = IdempotencyIndex(max_keys=2, ttl_seconds=10)
+    index.put(("t", "a"), "job-a", "fp", now=0)
+    index.put(("t", "b"), "job-b", "fp", now=1)
+    index.put(("t", "c"), "job-c", "fp", now=2)
+    assert len(index) == 2 and index.get(("t", "a"), now=3) is None
+
+    assert index.get(("t", "b"), now=11) is None  # expired on read
+    index.prune(now=12)
+    assert len(index) == 0
@@ -0,0 +1,29 @@
+# tests/test_metrics.py
+from http import HTTPStatus
+
+from app.services.metrics import Histogram, REGISTRY, render_metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("test_latency_seconds", "Test histogram.", buckets=(0.1, 1.0), labelnames=("model",))
+    try:
+        h.observe(0.05, model="m")
+        h.observe(0.1, model="m")
+        h.observe(5.0, model="m")
+        text = render_metrics()
+        assert 'test_latency_seconds_bucket{model="m",le="0.1"} 2' in text
+        assert 'test_latency_seconds_bucket{model="m",le="1"} 2' in text
+        assert 'test_latency_seconds_bucket{model="m",le="+Inf"} 3' in text
+        assert 'test_latency_seconds_count{model="m"} 3' in text
+    finally:
+        REGISTRY.remove(h)
+
+
+def test_metrics_endpoint(client):
+    resp = client.get("/metrics")
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert "# TYPE ai_queue_wait_seconds histogram" in body
+    assert "# TYPE ai_generation_attempts_total counter" in body
+    assert any(line.startswith("ai_generation_timeouts_total ") for line in body.splitlines())
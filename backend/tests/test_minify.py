@@ -0,0 +1,81 @@
+# tests/test_minify.py
+import time
+
+import pytest
+
+from app.schemas import GenerateRequest
+from app.services.llm import sanitize_model_output
+from app.services.minify import minify_css, minify_html, minify_js
+from app.services.postprocess import postprocess_output
+from loadtest.fake_ollama import CANNED_HTML
+
+
+def test_html_whitespace_comments_and_raw_text():
+    html = "<p>a   <!-- note -->  b</p>\n\n<pre>  keep\n   this </pre>  <textarea> x  y </textarea><!--[if IE]>ie<![endif]-->"
+    assert minify_html(html) == "<p>a b</p> <pre>  keep\n   this </pre> <textarea> x  y </textarea><!--[if IE]>ie<![endif]-->"
+
+
+def test_svg_numbers_are_rounded_only_inside_svg():
+    html = '<div data-x="1.23456"></div><svg viewBox="0 0 24 24"><path d="M10.12345 5.6789L1.004.5z"/></svg>'
+    assert minify_html(html) == '<div data-x="1.23456"></div><svg viewBox="0 0 24 24"><path d="M10.12 5.68L1 .5z"/></svg>'
+
+
+def test_js_comments_are_removed_without_touching_literals():
+    js = """
+      // drop me
+      const re = /a\\/b[/]c/g; // and me
+      let x = a / b / c;
+      const t = `keep // this ${ {a: 1}.a } /* and this */`;
+      /* multi
+         line */ const s = "// not a comment";
+    """
+    assert minify_js(js) == (
+        "const re = /a\\/b[/]c/g;\n"
+        "let x = a / b / c;\n"
+        "const t = `keep // this ${ {a: 1}.a } /* and this */`;\n"
+        'const s = "// not a comment";'
+    )
+
+
+def test_css_comments_and_spacing():
+    css = ' /* c */ body { margin: 0 ; font-family: "a  b", serif; }\n a:hover , b c { color: red; }'
+    assert minify_css(css) == 'body{margin: 0;font-family: "a  b",serif}a:hover,b c{color: red}'
+
+
+def test_css_strings_keep_their_punctuation():
+    css = 'a::after { content: "x ; y , z { }" ; } b::before { content: \'a ;}\' ; quotes: "{ " " }" }'
+    assert minify_css(css) == 'a::after{content: "x ; y , z { }"}b::before{content: \'a ;}\';quotes: "{ " " }"}'
+
+
+def test_minified_page_keeps_its_score():
+    req = GenerateRequest(message="x")
+    plain = postprocess_output(CANNED_HTML, req, None)
+    small = postprocess_output(CANNED_HTML, req, None, minify_min_score=0.8)
+    assert small.score == plain.score and small.issues == plain.issues
+    assert small.bytes_saved == len(plain.html.encode()) - len(small.html.encode()) > 0
+    assert not small.minify_fallback
+    # below the threshold nothing is minified
+    assert postprocess_output(CANNED_HTML, req, None, minify_min_score=1.1).html == plain.html
+
+
+def test_minification_falls_back_when_the_score_would_change():
+    # the validator sees the <img> inside the comment; stripping it would change the score
+    raw = CANNED_HTML.replace("<main>", "<main><!-- <img src='x.png'> -->")
+    req = GenerateRequest(message="x")
+    plain = postprocess_output(raw, req, None)
+    res = postprocess_output(raw, req, None, minify_min_score=0.0)
+    assert res.minify_fallback and res.bytes_saved == 0
+    assert res.html == sanitize_model_output(raw) == plain.html
+
+
+@pytest.mark.parametrize("doc", [
+    "<p>" + "<a " * 8000,
+    "<p>" + '<a "' * 8000,
+    "<p>" + "<a x='\" " * 8000,
+    "<html><body>" + "<div class=x>" * 2000 + "<b " * 10000 + "</body></html>",
+], ids=["no-gt", "unclosed-quotes", "mixed-quotes", "tail-without-gt"])
+def test_unclosed_tags_are_scanned_in_linear_time(doc):
+    start = time.perf_counter()
+    out = minify_html(doc)
+    assert time.perf_counter() - start < 0.5  # was several seconds (quadratic)
+    assert out.startswith("<")
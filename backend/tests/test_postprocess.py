@@ -0,0 +1,69 @@
+# tests/test_postprocess.py
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.schemas import GenerateRequest
+from app.services import postprocess
+from app.services.postprocess import PostProcessor, PostProcessTimeout, postprocess_output
+from benchmarks.corpus import generate
+
+
+def _run(pp: PostProcessor, raw: str):
+    async def main():
+        try:
+            return await pp.run(raw, GenerateRequest(message="x"), None)
+        finally:
+            pp.shutdown()
+    return asyncio.run(main())
+
+
+def test_small_documents_stay_inline():
+    raw = generate("svg_heavy", 1024)
+    res = _run(PostProcessor(mode="thread", inline_max_bytes=64 * 1024), raw)
+    assert res.mode == "inline" and res.wait_seconds == 0.0
+
+
+def test_executor_results_match_inline():
+    raw = generate("many_blocks", 64 * 1024)
+    expected = postprocess_output(raw, GenerateRequest(message="x"), None)
+    for mode in ("thread", "process"):
+        res = _run(PostProcessor(mode=mode, workers=1, inline_max_bytes=1024), raw)
+        assert res.mode == mode
+        assert res.html == expected.html
+        assert res.score == expected.score and res.issues == expected.issues
+        assert res.sanitize_seconds > 0 and res.wait_seconds >= 0
+
+
+def test_broken_process_pool_is_replaced():
+    raw = generate("many_blocks", 64 * 1024)
+    pp = PostProcessor(mode="process", workers=1, inline_max_bytes=1024)
+
+    async def main():
+        try:
+            broken = pp._executor()
+            crash = broken.submit(os._exit, 1)  # kills the worker, the pool is now broken
+            try:
+                crash.result(timeout=30)
+            except Exception:
+                pass
+            res = await pp.run(raw, GenerateRequest(message="x"), None)
+            return res
+        finally:
+            pp.shutdown()
+
+    res = asyncio.run(main())
+    assert pp.pool_restarts == 1
+    assert res.mode == "process" and res.score == postprocess_output(raw, GenerateRequest(message="x"), None).score
+
+
+def test_stuck_document_times_out(monkeypatch):
+    def stuck(*args):
+        time.sleep(1)
+
+    monkeypatch.setattr(postprocess, "postprocess_output", stuck)
+    pp = PostProcessor(mode="thread", workers=1, inline_max_bytes=1, timeout=0.1)
+    with pytest.raises(PostProcessTimeout):
+        _run(pp, "<html></html>")
@@ -0,0 +1,75 @@
+# tests/test_ratelimit.py
+import asyncio
+from http import HTTPStatus
+
+from app.services.ratelimit import BucketTable, RateLimits, rate_limiter
+
+
+def test_request_bucket_refills_over_time():
+    table = BucketTable()
+    limits = RateLimits(rps=2.0, burst=2.0, tokens_per_min=0, token_burst=0)
+    assert table.take("k", limits, 0, now=0.0).allowed
+    assert table.take("k", limits, 0, now=0.0).allowed
+    denied = table.take("k", limits, 0, now=0.0)
+    assert not denied.allowed and denied.reason == "rps"
+    assert denied.retry_after == 0.5
+    assert table.take("k", limits, 0, now=0.5).allowed
+
+
+def test_token_bucket_limits_large_requests():
+    table = BucketTable()
+    limits = RateLimits(rps=0, burst=1.0, tokens_per_min=600, token_burst=600)
+    assert table.take("k", limits, 500, now=0.0).allowed
+    denied = table.take("k", limits, 500, now=0.0)
+    assert not denied.allowed and denied.reason == "tokens"
+    assert denied.retry_after == 40.0
+
+
+def test_idle_buckets_are_evicted():
+    table = BucketTable(idle_seconds=10, max_keys=100)
+    limits = RateLimits(rps=1.0, burst=1.0, tokens_per_min=0, token_burst=0)
+    table.take("a", limits, 0, now=0.0)
+    table.take("b", limits, 0, now=5.0)
+    table.take("c", limits, 0, now=12.0)
+    assert len(table) == 2  # "a" went idle
+
+
+def test_generate_returns_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "limits", RateLimits(rps=0.01, burst=1.0, tokens_per_min=0, token_burst=0))
+    flooder = {"Authorization": "Bearer flooder"}
+    assert client.post("/api/ai/generate", json={"message": "hi"}, headers=flooder).status_code == 202
+    # a new X-Client-Id per request is not a new bucket
+    resp = client.post("/api/ai/generate", json={"message": "hi"}, headers={**flooder, "X-Client-Id": "fresh-1"})
+    assert resp.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(resp.headers["retry-after"]) >= 1
+    stats = client.get("/api/ai/jobs/stats").json()
+    assert stats["rate_limit"]["rejected"] >= 1
+
+
+def test_batch_is_throttled_like_the_same_single_requests(client, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "limits", RateLimits(rps=0.01, burst=3.0, tokens_per_min=0, token_burst=0))
+    singles = {"Authorization": "Bearer singles"}
+    batcher = {"Authorization": "Bearer batcher"}
+    two = {"base": {"message": "hi"}, "items": [{}, {}]}
+
+    assert [client.post("/api/ai/generate", json={"message": "hi"}, headers=singles).status_code for _ in range(3)] == [202] * 3
+    assert client.post("/api/ai/generate", json={"message": "hi"}, headers=singles).status_code == 429
+
+    # the same three jobs as a batch of two plus one: the bucket empties just as fast
+    assert client.post("/api/ai/generate/batch", json=two, headers=batcher).status_code == 202
+    assert client.post("/api/ai/generate/batch", json=two, headers=batcher).status_code == 429
+    assert client.post("/api/ai/generate", json={"message": "hi"}, headers=batcher).status_code == 202
+    assert client.post("/api/ai/generate", json={"message": "hi"}, headers=batcher).status_code == 429
+
+
+def test_batch_larger_than_the_bucket_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "limits", RateLimits(rps=1.0, burst=2.0, tokens_per_min=0, token_burst=0))
+    resp = client.post("/api/ai/generate/batch", json={"base": {"message": "hi"}, "items": [{}, {}, {}]})
+    assert resp.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    assert resp.json()["detail"] == {"status": "batch_too_large", "reason": "rps", "limit": 2.0}
+
+    monkeypatch.setattr(rate_limiter, "limits", RateLimits(rps=0, burst=1.0, tokens_per_min=600, token_burst=600))
+    items = [{"message": "a long landing page with many sections " * 20} for _ in range(10)]
+    resp = client.post("/api/ai/generate/batch", json={"base": {"message": "hi"}, "items": items})
+    assert resp.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    assert resp.json()["detail"]["reason"] == "tokens"
@@ -0,0 +1,102 @@
+# tests/test_result_cache.py
+import asyncio
+import json
+
+from app.schemas import GenerateRequest, GenerateResponse, JobStatus
+from app.services.jobs import job_store
+from app.services.serialize import dumps
+
+PAGE = "<!doctype html><html><body>" + "<p>\"quoted\" café</p>" * 200 + "</body></html>"
+
+
+def _finished_job(html: str = PAGE):
+    async def _run():
+        job = await job_store.create_job(GenerateRequest(message="cache me"))
+        await job_store.set_status(job.job_id, JobStatus.processing)
+        assert job.cached is None
+        await job_store.set_result(job.job_id, GenerateResponse(error=False, html=html), None)
+        await job_store.set_status(job.job_id, JobStatus.finished)
+        return job
+
+    return asyncio.run(_run())
+
+
+def test_dumps_is_compact_utf8():
+    assert dumps({"a": "é", "b": [1, 2]}) == '{"a":"é","b":[1,2]}'.encode("utf-8")
+
+
+def test_terminal_result_is_encoded_once_and_served_as_bytes(client):
+    job = _finished_job()
+    cached = job.cached
+    assert cached is not None and cached.version == job.version
+    assert "gzip" in cached.json._encoded  # compressed eagerly
+
+    r = client.get(f"/api/ai/result/{job.job_id}", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"].endswith('-gzip"')
+    data = r.json()
+    assert data["status"] == "finished"
+    assert data["result"]["html"] == PAGE
+    assert data["trace"] is None
+    assert job.cached is cached  # polling does not rebuild
+
+    plain = client.get(f"/api/ai/result/{job.job_id}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.content == cached.json.body
+    assert client.get(
+        f"/api/ai/result/{job.job_id}", headers={"If-None-Match": plain.headers["etag"]}
+    ).status_code == 304
+
+
+def test_failed_result_is_cached_too():
+    async def _run():
+        job = await job_store.create_job(GenerateRequest(message="fail me"))
+        await job_store.set_result(job.job_id, None, "boom")
+        await job_store.set_status(job.job_id, JobStatus.failed)
+        return job
+
+    job = asyncio.run(_run())
+    assert json.loads(job.cached.json.body)["error"] == "boom"
+    assert job.cached.html is None
+
+
+def test_html_endpoint(client):
+    job = _finished_job()
+    r = client.get(f"/api/ai/result/{job.job_id}/html")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/html")
+    assert r.text == PAGE
+    assert r.headers["content-security-policy"] == "sandbox allow-scripts"
+    assert r.headers["x-content-type-options"] == "nosniff"
+
+    again = client.get(f"/api/ai/result/{job.job_id}/html", headers={"If-None-Match": r.headers["etag"]})
+    assert again.status_code == 304
+
+    dl = client.get(f"/api/ai/result/{job.job_id}/html", params={"download": 1})
+    assert dl.headers["content-disposition"] == f'attachment; filename="{job.job_id}.html"'
+
+    pending = asyncio.run(job_store.create_job(GenerateRequest(message="not yet")))
+    r = client.get(f"/api/ai/result/{pending.job_id}/html")
+    assert r.status_code == 409
+    assert r.json()["detail"]["status"] == "received"
+
+
+def test_large_pages_are_encoded_off_the_event_loop(monkeypatch):
+    import threading
+
+    from app.services import serialize
+
+    threads = []
+    build = serialize.build_result_cache
+
+    def spy(*args):
+        threads.append(threading.current_thread() is threading.main_thread())
+        return build(*args)
+
+    monkeypatch.setattr(serialize, "build_result_cache", spy)
+    monkeypatch.setattr(serialize, "RESULT_ENCODE_INLINE_MAX_BYTES", 1024)
+    job = _finished_job()
+    assert threads == [False]  # built once, in a worker thread
+    assert job.cached.version == job.version
+    assert json.loads(job.cached.json.body)["result"]["html"] == PAGE
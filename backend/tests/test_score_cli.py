@@ -0,0 +1,60 @@
+# tests/test_score_cli.py
+import json
+
+import score
+from loadtest.fake_ollama import CANNED_HTML
+
+
+def _rows(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_jsonl_corpus_scores_in_order_with_a_report(tmp_path, capsys):
+    corpus = tmp_path / "outputs.jsonl"
+    lines = [json.dumps({"id": f"page-{i}", "raw": CANNED_HTML}) for i in range(25)]
+    lines += ["{not json", json.dumps({"id": "no-text", "output": "x"}), ""]
+    corpus.write_text("\n".join(lines) + "\n")
+    out, report_path = tmp_path / "scores.jsonl", tmp_path / "report.json"
+
+    rc = score.main([str(corpus), "-o", str(out), "--report", str(report_path),
+                     "--workers", "2", "--chunk-size", "4", "--max-pending", "2", "--min-score", "0.9"])
+    assert rc == 0
+
+    rows = _rows(out)
+    assert [r["id"] for r in rows[:25]] == [f"page-{i}" for i in range(25)]
+    assert rows[0]["score"] == 1.0 and rows[0]["passed"] is True and rows[0]["issues"] == []
+    assert rows[25] == {"id": "26", "error": "invalid_json"}
+    assert rows[26] == {"id": "no-text", "error": "missing_raw"}
+
+    report = json.loads(report_path.read_text())
+    assert report == json.loads(capsys.readouterr().out)
+    assert (report["items"], report["scored"], report["errors"]) == (27, 25, 2)
+    assert report["pass_rate"] == 1.0 and report["score"]["p50"] == 1.0
+    assert report["score"]["histogram"]["1.0"] == 25
+    assert report["throughput"]["workers"] == 2 and report["throughput"]["items_per_sec"] > 0
+
+
+def test_report_counts_issues_once_per_item():
+    report = score.Report(min_score=0.8)
+    report.add({"id": "a", "score": 0.75, "issues": ["No <title>.", "No <title>."], "bytes": 10, "sanitize_ms": 1, "validate_ms": 1})
+    report.add({"id": "b", "score": 0.95, "issues": [], "bytes": 10, "sanitize_ms": 1, "validate_ms": 1})
+    report.add({"id": "c", "error": "unreadable: Permission denied"})
+    data = report.to_dict(workers=1)
+    assert data["passed"] == 1 and data["pass_rate"] == 0.5
+    assert data["issues"] == [{"issue": "No <title>.", "items": 1, "share": 0.5}]
+    assert data["errors_by_kind"] == {"unreadable": 1}
+    assert (data["score"]["p10"], data["score"]["p90"]) == (0.75, 0.95)
+
+
+def test_directory_corpus_is_read_by_the_workers(tmp_path):
+    pages = tmp_path / "pages"
+    (pages / "nested").mkdir(parents=True)
+    (pages / "a.txt").write_text(CANNED_HTML)
+    (pages / "nested" / "b.txt").write_text(CANNED_HTML)
+    (pages / "notes.md").write_text("ignored")
+    out = tmp_path / "scores.jsonl"
+
+    assert score.main([str(pages), "--glob", "*.txt", "-o", str(out), "--workers", "1"]) == 0
+    rows = _rows(out)
+    assert [r["id"] for r in rows] == ["a.txt", "nested/b.txt"]
+    assert all(r["score"] == 1.0 for r in rows)
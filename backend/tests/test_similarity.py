@@ -0,0 +1,72 @@
+# tests/test_similarity.py
+from app.services.similarity import SimilarityCache, normalize, similarity_cache
+
+
+def test_paraphrases_normalize_to_the_same_words():
+    base = normalize("build a car landing page")
+    assert normalize("Build a car landing-page!") == base
+    assert normalize("create a landing page for cars") == base
+    assert normalize("build a bike landing page") != base
+
+
+def test_similar_instruction_hits_and_different_one_misses():
+    cache = SimilarityCache(threshold=0.8, enabled=True)
+    cache.add("Create a landing page for cars", "<html>cars</html>")
+    cache.add("Portfolio website for a photographer with dark theme", "<html>photo</html>")
+
+    hit = cache.lookup("build a car landing page")
+    assert hit is not None and hit.html == "<html>cars</html>" and hit.similarity == 1.0
+
+    near = cache.lookup("photographer portfolio site with dark theme and gallery")
+    assert near is not None and near.html == "<html>photo</html>"
+    assert 0.8 <= near.similarity < 1.0
+
+    assert cache.lookup("build a bike landing page") is None
+    snap = cache.snapshot()
+    assert snap["lookups"] == 3 and snap["hits"] == 2
+    assert snap["hit_rate"] == round(2 / 3, 4)
+
+
+def test_lru_bound_and_index_cleanup():
+    cache = SimilarityCache(max_entries=2, enabled=True)
+    cache.add("landing page for cars", "cars")
+    cache.add("landing page for bikes", "bikes")
+    assert cache.lookup("landing page for cars") is not None  # cars is now most recent
+    cache.add("landing page for boats", "boats")
+
+    assert cache.snapshot()["entries"] == 2 and cache.evictions == 1
+    assert cache.lookup("landing page for bikes") is None
+    assert all(key in cache._entries for band in cache._index for keys in band.values() for key in keys)
+
+
+def test_generate_returns_approximate_result_without_scheduling(client, monkeypatch):
+    monkeypatch.setattr(similarity_cache, "enabled", True)
+    similarity_cache.add("create a landing page for cars", "<!doctype html><html>cached</html>")
+
+    accepted = client.post("/api/ai/generate", json={"message": "Build a car landing-page!"}).json()
+    assert accepted["status"] == "finished"
+    result = client.get(f"/api/ai/result/{accepted['job_id']}").json()["result"]
+    assert result["approximate"] is True
+    assert result["similarity"] == 1.0
+    assert result["html"] == "<!doctype html><html>cached</html>"
+
+    # refinements are never answered from the cache
+    refine = client.post(
+        "/api/ai/generate",
+        json={"message": "Build a car landing-page!", "previous_html": "<html></html>"},
+    ).json()
+    assert refine["status"] == "received"
+    assert client.get("/api/ai/jobs/stats").json()["similarity_cache"]["hits"] >= 1
+
+
+def test_counts_and_negations_must_match_exactly():
+    cache = SimilarityCache(threshold=0.8, enabled=True)
+    base = "pricing page for a gym with a hero banner, testimonials, faq, footer, contact form and 10 cards"
+    cache.add(base, "<html>10</html>")
+    cache.add("landing page for a bakery with a menu, gallery, opening hours, map and newsletter form", "<html>bakery</html>")
+
+    assert cache.lookup(base.replace("10 cards", "ten cards")).html == "<html>10</html>"
+    assert cache.lookup(base.replace("10 cards", "12 cards")) is None
+    assert cache.lookup(base.replace("gym", "gym gallery")) is not None  # still near, same count
+    bakery = "landing page for a bakery with a menu, gallery, opening hours, map and no newsletter form"
+    assert cache.lookup(bakery) is None
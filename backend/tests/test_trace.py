@@ -0,0 +1,45 @@
+# tests/test_trace.py
+import asyncio
+from http import HTTPStatus
+
+from app.schemas import GenerateRequest
+from app.services.jobs import job_store
+from app.services.trace import JobTrace
+
+
+class _Reply:
+    load_duration = 1_000_000
+    prompt_eval_duration = 2_000_000
+    eval_duration = 3_000_000
+
+
+def test_trace_records_spans_and_chrome_export():
+    trace = JobTrace()
+    trace.mark("queued")
+    with trace.measure("sanitize", attempt=1) as attrs:
+        attrs["bytes"] = 10
+    trace.llm_phases(_Reply(), trace.now(), attempt=1)
+
+    data = trace.to_dict()
+    names = [e["name"] for e in data["events"]]
+    assert names == ["queued", "sanitize", "ollama.load", "ollama.prompt_eval", "ollama.eval"]
+    assert data["events"][1]["bytes"] == 10
+    assert data["events"][4]["dur_ms"] == 3.0
+
+    chrome = trace.to_chrome("job-1")
+    phases = [e["ph"] for e in chrome["traceEvents"]]
+    assert phases == ["M", "i", "X", "X", "X", "X"]
+
+
+def test_result_trace_flag(client):
+    job = asyncio.run(job_store.create_job(GenerateRequest(message="trace me")))
+
+    plain = client.get(f"/api/ai/result/{job.job_id}").json()
+    assert plain.get("trace") is None
+
+    traced = client.get(f"/api/ai/result/{job.job_id}", params={"trace": 1}).json()
+    assert traced["trace"]["events"][0]["name"] == "queued"
+
+    resp = client.get(f"/api/ai/result/{job.job_id}/trace")
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.json()["traceEvents"][1]["name"] == "queued"
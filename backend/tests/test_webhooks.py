@@ -0,0 +1,263 @@
+# tests/test_webhooks.py
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+
+from app.schemas import GenerateRequest, GenerateResponse, JobStatus
+from app.services import runner
+from app.services.jobs import InMemoryJobStore, job_store
+from app.services.webhooks import (
+    PublicAddressTransport,
+    WebhookDispatcher,
+    callback_url_error,
+    check_callback_url,
+    verify,
+)
+
+SECRET = "test-secret"
+
+
+class Receiver:
+    """Stand-in integration endpoint, reached through httpx's ASGI transport."""
+
+    def __init__(self, statuses=(), hold: asyncio.Event = None) -> None:
+        self.calls = []
+        self.statuses = list(statuses)
+        self.hold = hold
+        self.app = FastAPI()
+
+        @self.app.post("/hook")
+        async def hook(request: Request) -> Response:
+            body = await request.body()
+            self.calls.append((dict(request.headers), body))
+            if self.hold is not None:
+                await self.hold.wait()
+            code = self.statuses.pop(0) if self.statuses else 200
+            return Response(status_code=code)
+
+    def dispatcher(self, **kwargs) -> WebhookDispatcher:
+        kwargs.setdefault("backoff_base", 0.01)
+        kwargs.setdefault("secret", SECRET)
+        return WebhookDispatcher(transport=httpx.ASGITransport(app=self.app), **kwargs)
+
+
+async def _finish(store: InMemoryJobStore, message: str = "landing page", status=JobStatus.finished):
+    req = GenerateRequest(message=message, callback_url="http://receiver.test/hook")
+    job = await store.create_job(req)
+    await store.set_status(job.job_id, JobStatus.processing)
+    await store.set_result(job.job_id, GenerateResponse(error=False, html="<html></html>"), None)
+    await store.set_status(job.job_id, status)
+    return job
+
+
+async def _until(predicate, timeout: float = 2.0) -> None:
+    loop = asyncio.get_running_loop()
+    end = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < end, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_terminal_job_is_posted_and_signed():
+    async def scenario():
+        store, receiver = InMemoryJobStore(), Receiver()
+        dispatcher = receiver.dispatcher()
+        await dispatcher.start(store)
+        try:
+            job = await _finish(store)
+            await _until(lambda: dispatcher.delivered == 1)
+        finally:
+            await dispatcher.stop()
+        return job, receiver.calls
+
+    job, calls = asyncio.run(scenario())
+    assert len(calls) == 1
+    headers, body = calls[0]
+    assert body == job.cached.json.body  # same bytes GET /result serves
+    assert json.loads(body)["status"] == "finished"
+    assert headers["x-job-id"] == job.job_id
+    assert verify(SECRET, headers["x-webhook-signature"], body)
+    assert not verify("wrong", headers["x-webhook-signature"], body)
+
+
+def test_callback_jobs_are_not_abandoned_for_not_polling():
+    async def scenario():
+        receiver = Receiver()
+        dispatcher = receiver.dispatcher()
+        await dispatcher.start(job_store)
+        try:
+            job = await _finish(job_store, status=JobStatus.processing)
+            polled = await job_store.create_job(GenerateRequest(message="polled"))
+            job.last_polled_at = polled.last_polled_at = time.monotonic() - 120
+            await runner.cancel_abandoned_jobs(60)
+            assert job.status == JobStatus.processing and polled.status == JobStatus.cancelled
+            await job_store.set_status(job.job_id, JobStatus.finished)
+            await _until(lambda: dispatcher.delivered == 1)
+        finally:
+            await dispatcher.stop()
+        return receiver.calls
+
+    calls = asyncio.run(scenario())
+    assert [json.loads(body)["status"] for _, body in calls] == ["finished"]
+
+
+def test_compact_payload_on_cancel():
+    async def scenario():
+        store, receiver = InMemoryJobStore(), Receiver()
+        dispatcher = receiver.dispatcher(payload="compact")
+        await dispatcher.start(store)
+        try:
+            job = await store.create_job(GenerateRequest(message="x", callback_url="http://receiver.test/hook"))
+            await store.cancel(job.job_id, "client")
+            await _until(lambda: dispatcher.delivered == 1)
+        finally:
+            await dispatcher.stop()
+        return job, receiver.calls
+
+    job, calls = asyncio.run(scenario())
+    assert json.loads(calls[0][1]) == {
+        "job_id": job.job_id,
+        "status": "cancelled",
+        "error": "Cancelled (client).",
+        "result_url": f"/api/ai/result/{job.job_id}",
+    }
+
+
+def test_transient_errors_are_retried_with_the_same_delivery_id():
+    async def scenario():
+        store, receiver = InMemoryJobStore(), Receiver(statuses=[503, 429])
+        dispatcher = receiver.dispatcher()
+        await dispatcher.start(store)
+        try:
+            await _finish(store)
+            await _until(lambda: dispatcher.delivered == 1)
+        finally:
+            await dispatcher.stop()
+        return dispatcher, receiver.calls
+
+    dispatcher, calls = asyncio.run(scenario())
+    assert [h["x-webhook-attempt"] for h, _ in calls] == ["1", "2", "3"]
+    assert len({h["x-webhook-id"] for h, _ in calls}) == 1
+    assert dispatcher.retries == 2 and dispatcher.failed == 0
+
+
+def test_client_errors_are_not_retried():
+    async def scenario():
+        store, receiver = InMemoryJobStore(), Receiver(statuses=[404])
+        dispatcher = receiver.dispatcher()
+        await dispatcher.start(store)
+        try:
+            await _finish(store, status=JobStatus.failed)
+            await _until(lambda: dispatcher.failed == 1)
+        finally:
+            await dispatcher.stop()
+        return dispatcher, receiver.calls
+
+    dispatcher, calls = asyncio.run(scenario())
+    assert len(calls) == 1 and dispatcher.retries == 0
+
+
+def test_slow_receiver_never_blocks_status_writes():
+    async def scenario():
+        hold = asyncio.Event()
+        store, receiver = InMemoryJobStore(), Receiver(hold=hold)
+        dispatcher = receiver.dispatcher(workers=1, queue_size=1)
+        await dispatcher.start(store)
+        try:
+            await _finish(store, "one")
+            await _until(lambda: len(receiver.calls) == 1)  # worker busy
+            await asyncio.wait_for(_finish(store, "two"), 1)  # queued
+            await asyncio.wait_for(_finish(store, "three"), 1)  # dropped
+            snapshot = dispatcher.snapshot()
+            hold.set()
+            await _until(lambda: dispatcher.delivered == 2)
+        finally:
+            await dispatcher.stop()
+        return snapshot
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["in_flight"] == 1 and snapshot["queued"] == 1 and snapshot["dropped"] == 1
+
+
+def test_backoff_is_jittered_and_capped():
+    d = WebhookDispatcher(backoff_base=1, backoff_max=5)
+    delays = [d.backoff_delay(10) for _ in range(50)]
+    assert all(0 <= x <= 5 for x in delays) and len(set(delays)) > 1
+
+
+@pytest.mark.parametrize("url, ok", [
+    ("https://example.com/hook", True),
+    ("https://93.184.216.34:8443/cb?x=1", True),
+    ("ftp://example.com/hook", False),
+    ("/relative/path", False),
+    ("http://10.0.0.5:8080/cb?x=1", False),
+    ("http://169.254.169.254/latest/meta-data/", False),
+    ("http://127.0.0.1:8000/api/ai/admin/profile", False),
+    ("http://localhost:11434/api/generate", False),
+    ("http://[::1]/hook", False),
+    ("http://[::ffff:127.0.0.1]/hook", False),
+    ("http://0.0.0.0/hook", False),
+    ("http://224.0.0.1/hook", False),
+])
+def test_callback_url_validation(url, ok):
+    assert (callback_url_error(url) is None) is ok
+    assert callback_url_error("https://evil.test/x", frozenset({"example.com"})) is not None
+
+
+def _resolver(table):
+    async def resolve(host, port):
+        if host not in table:
+            raise OSError("Name or service not known")
+        return table[host]
+    return resolve
+
+
+def test_callback_host_is_resolved_before_accepting():
+    resolve = _resolver({"hooks.example.com": ["93.184.216.34"], "rebind.example.com": ["93.184.216.34", "127.0.0.1"]})
+
+    async def check(url, **kwargs):
+        return await check_callback_url(url, frozenset(), resolve=resolve, **kwargs)
+
+    assert asyncio.run(check("https://hooks.example.com/x")) is None
+    assert "private" in asyncio.run(check("https://rebind.example.com/x"))
+    assert "resolve" in asyncio.run(check("https://nowhere.example.com/x"))
+    assert asyncio.run(check("http://10.0.0.5/x", allow_private=True)) is None
+
+
+def test_transport_checks_and_pins_the_address_on_every_connect():
+    seen = []
+
+    async def handler(request):
+        seen.append(request)
+        return httpx.Response(200)
+
+    answers = {"hooks.example.com": ["93.184.216.34"]}
+    transport = PublicAddressTransport(httpx.MockTransport(handler), resolve=_resolver(answers))
+
+    async def post():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post("https://hooks.example.com/x", content=b"{}")
+
+    assert asyncio.run(post()).status_code == 200
+    request = seen[0]
+    assert request.url.host == "93.184.216.34" and request.headers["host"] == "hooks.example.com"
+    assert request.extensions["sni_hostname"] == "hooks.example.com"
+
+    answers["hooks.example.com"] = ["169.254.169.254"]  # DNS answer changed after validation
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(post())
+    assert len(seen) == 1
+
+
+def test_generate_rejects_bad_callback_url(client):
+    r = client.post("/api/ai/generate", json={"message": "x", "callback_url": "javascript:alert(1)"})
+    assert r.status_code == 400
+    assert r.json()["detail"]["status"] == "invalid_callback_url"
+    for url in ("http://169.254.169.254/latest/meta-data/", "http://localhost:11434/api/generate"):
+        r = client.post("/api/ai/generate/batch", json={"base": {"message": "x", "callback_url": url}, "items": [{}]})
+        assert r.status_code == 400 and r.json()["detail"]["status"] == "invalid_callback_url"
+    assert "webhooks" in client.get("/api/ai/jobs/stats").json()
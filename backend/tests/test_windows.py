@@ -0,0 +1,84 @@
+# tests/test_windows.py
+import asyncio
+import random
+
+from app.schemas import GenerateRequest, JobStatus
+from app.services.jobs import InMemoryJobStore
+from app.services.windows import RollingStats, WindowHistogram
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def test_histogram_percentiles_are_close_and_mergeable():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(1, 1) for _ in range(5000)]
+    a, b = WindowHistogram(), WindowHistogram()
+    for i, v in enumerate(values):
+        (a if i % 2 else b).observe(v)
+    a.merge(b)
+    values.sort()
+    assert a.count == 5000
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(a.quantile(q) - exact) / exact < 0.1
+
+
+def test_windows_only_include_recent_slots():
+    clock = Clock()
+    stats = RollingStats(slot_seconds=10, clock=clock)
+    for _ in range(6):
+        stats.incr("finished")
+        stats.observe("latency", 30.0)
+    clock.t += 120  # two minutes later
+    stats.incr("finished")
+    stats.observe("latency", 2.0)
+    stats.observe_score(0.8)
+    stats.observe_score(0.9)
+
+    snap = stats.snapshot()
+    assert snap["1m"]["finished"] == 1
+    assert snap["1m"]["latency"]["p95"] == 2.0
+    assert snap["5m"]["finished"] == 7
+    assert abs(snap["5m"]["latency"]["p50"] - 30.0) < 3  # bucket resolution
+    assert snap["5m"]["compliance_score"] == {"count": 2, "mean": 0.85}
+    assert snap["5m"]["covered_seconds"] == 120.0
+    assert snap["5m"]["finished_per_min"] == 3.5
+
+    clock.t += 3600  # everything aged out, slots are reused lazily
+    stats.incr("created")
+    snap = stats.snapshot()
+    assert snap["1h"]["finished"] == 0 and snap["1h"]["created"] == 1
+    assert snap["1h"]["latency"] == {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None}
+
+
+def test_store_events_feed_counts_and_latency():
+    async def scenario():
+        store = InMemoryJobStore()
+        stats = RollingStats()
+        stats.attach(store)
+        done = await store.create_job(GenerateRequest(message="a"))
+        failed = await store.create_job(GenerateRequest(message="b"))
+        await store.create_job(GenerateRequest(message="c"))
+        await store.set_status(done.job_id, JobStatus.processing)
+        await store.set_status(done.job_id, JobStatus.finished)
+        await store.set_status(failed.job_id, JobStatus.failed)
+        stats.detach()
+        await store.create_job(GenerateRequest(message="d"))
+        return stats.snapshot()["1m"]
+
+    w = asyncio.run(scenario())
+    assert (w["created"], w["finished"], w["failed"], w["cancelled"]) == (3, 1, 1, 0)
+    assert w["latency"]["count"] == 2
+
+
+def test_jobs_stats_exposes_windows(client):
+    data = client.get("/api/ai/jobs/stats").json()
+    assert {"live", "total"} <= data.keys()  # StatsModal fields unchanged
+    assert list(data["windows"]) == ["1m", "5m", "15m", "1h"]
+    assert {"created_per_min", "queue_wait", "llm", "latency", "compliance_score"} <= data["windows"]["5m"].keys()
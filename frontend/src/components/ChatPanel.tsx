@@ -25,6 +25,10 @@ function uid() {
   return Math.random().toString(36).slice(2);
 }
 
+// POST /generate is retried once on these, reusing the message's Idempotency-Key
+const RETRYABLE_STATUS = [502, 503, 504];
+const RETRY_DELAY_MS = 1000;
+
 const processingText = 'I am processing your message, please wait...';
 const errorText =
   'I have made a mistake, I am not pretty sure what happened but I couldnt, please try again';
@@ -94,11 +98,24 @@ const ChatPanel = forwardRef<ChatPanelHandle, Props>(
             top_p: topP,
           };
 
-          const res = await fetch(`${apiBase}/generate`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(payload),
-          });
+          const post = () =>
+            fetch(`${apiBase}/generate`, {
+              method: 'POST',
+              headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idUser },
+              body: JSON.stringify(payload),
+            });
+
+          // Retry once on a network error or gateway failure. The retry reuses
+          // the same Idempotency-Key, so if the first POST did reach the backend
+          // it returns the original job instead of queueing a second generation.
+          let res: Response;
+          try {
+            res = await post();
+            if (RETRYABLE_STATUS.includes(res.status)) throw new Error(`HTTP ${res.status}`);
+          } catch {
+            await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS));
+            res = await post();
+          }
 
           if (!res.ok) {
             setMessages((prev) =>
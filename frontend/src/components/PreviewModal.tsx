@@ -4,7 +4,7 @@ import styles from '@/styles/PreviewModal.module.css';
 
 export type ModalPhase = 'pairing' | 'success' | 'error';
 
-type JobStatus = 'received' | 'processing' | 'finished' | 'failed';
+type JobStatus = 'received' | 'processing' | 'finished' | 'failed' | 'cancelled';
 
 type FinishedArgs = { success: boolean; html?: string; error?: string };
 
@@ -103,7 +103,7 @@ export default function PreviewModal({
     const checkOnce = async () => {
       try {
         const res = await fetch(`${base}/result/${encodeURIComponent(jobId)}`, {
-          cache: 'no-store',
+          cache: 'no-cache',
         });
         if (!res.ok) return; // transient issue; try next tick
 
@@ -119,7 +119,7 @@ export default function PreviewModal({
             stop();
             window.setTimeout(() => onClose?.(), 2000); // auto-close after success
           }
-        } else if (status === 'failed') {
+        } else if (status === 'failed' || status === 'cancelled') {
           const err = data?.error ?? 'Job failed';
           if (!cancelled) {
             setErrorMsg(err);
@@ -5,7 +5,7 @@ import styles from '@/styles/StatsModal.module.css';
 type JobRowRaw = {
   id?: string;
   job_id?: string;
-  status?: 'received' | 'processing' | 'finished' | 'failed' | string;
+  status?: 'received' | 'processing' | 'finished' | 'failed' | 'cancelled' | string;
   created_at?: string;
   finished_at?: string | null;
   prompt_size?: number;
@@ -15,7 +15,7 @@ type JobRowRaw = {
 
 type JobRow = {
   id: string;
-  status: 'received' | 'processing' | 'finished' | 'failed' | 'unknown';
+  status: 'received' | 'processing' | 'finished' | 'failed' | 'cancelled' | 'unknown';
   created_at?: string;
   finished_at?: string | null;
   prompt_size?: number;
@@ -38,12 +38,14 @@ type StatsPayload = {
     processing?: number;
     finished?: number;
     failed?: number;
+    cancelled?: number;
   };
   total?: {
     received?: number;
     processing?: number;
     finished?: number;
     failed?: number;
+    cancelled?: number;
     created?: number;
   };
 };
@@ -79,14 +81,14 @@ export default function StatsModal({
     try {
       // Prefer new endpoints/shapes but be tolerant
       const [s, r1, r2] = await Promise.all([
-        fetch(`${apiBase}/jobs/stats`, { cache: 'no-store' }).then((r) =>
+        fetch(`${apiBase}/jobs/stats`, { cache: 'no-cache' }).then((r) =>
           r.ok ? r.json() : null
         ),
         fetch(`${apiBase}/jobs?status=processing&limit=20`, {
-          cache: 'no-store',
+          cache: 'no-cache',
         }).then((r) => (r.ok ? r.json() : [])),
         fetch(`${apiBase}/jobs?status=finished&limit=20`, {
-          cache: 'no-store',
+          cache: 'no-cache',
         }).then((r) => (r.ok ? r.json() : [])),
       ]);
 
@@ -113,11 +115,63 @@ export default function StatsModal({
     }
   }
 
-  useEffect(() => {
-    if (!open) return;
+  function startPolling() {
+    if (timerRef.current) return;
     fetchAll();
     timerRef.current = window.setInterval(fetchAll, 5000);
+  }
+
+  // Push updates from /jobs/events; polling is the fallback when SSE is unavailable
+  function subscribe(): EventSource | null {
+    if (typeof window === 'undefined' || typeof window.EventSource === 'undefined') {
+      return null;
+    }
+    const es = new EventSource(`${apiBase}/jobs/events`);
+    const jobs = new Map<string, JobRow>();
+    const publish = () => {
+      const rows = Array.from(jobs.values()).sort((a, b) =>
+        (b.created_at ?? '').localeCompare(a.created_at ?? '')
+      );
+      setRunning(rows.filter((r) => r.status === 'processing').slice(0, 20));
+      setRecent(rows.filter((r) => r.status === 'finished').slice(0, 20));
+    };
+    const upsert = (e: MessageEvent) => {
+      const row = normalizeRow(JSON.parse(e.data), '');
+      if (row.id) jobs.set(row.id, row);
+      publish();
+    };
+    es.addEventListener('snapshot', (e) => {
+      const data = JSON.parse((e as MessageEvent).data);
+      setStats(data.stats ?? null);
+      jobs.clear();
+      (data.jobs ?? []).forEach((r: JobRowRaw, i: number) => {
+        const row = normalizeRow(r, `job-${i}`);
+        jobs.set(row.id, row);
+      });
+      publish();
+    });
+    es.addEventListener('job_created', upsert as EventListener);
+    es.addEventListener('job_updated', upsert as EventListener);
+    es.addEventListener('job_expired', (e) => {
+      jobs.delete(JSON.parse((e as MessageEvent).data).job_id);
+      publish();
+    });
+    es.addEventListener('stats', (e) => {
+      setStats(JSON.parse((e as MessageEvent).data));
+    });
+    es.onerror = () => {
+      // EventSource reconnects by itself unless the server refused the stream
+      if (es.readyState === EventSource.CLOSED) startPolling();
+    };
+    return es;
+  }
+
+  useEffect(() => {
+    if (!open) return;
+    const es = subscribe();
+    if (!es) startPolling();
     return () => {
+      es?.close();
       if (timerRef.current) window.clearInterval(timerRef.current);
       timerRef.current = null;
     };